@@ -1,5 +1,8 @@
-import api from './api';
+import api, { API_URL } from './api';
+import { getStoredToken } from '../utils/auth';
 
+// List conversations newest first; params: organization_id, chatbot_id, per_page,
+// cursor (next_cursor from the previous page) and total ('cached', 'exact' or 'none')
 export const getConversations = async (params) => {
   try {
     const response = await api.get('/api/conversations', { params });
@@ -9,15 +12,58 @@ export const getConversations = async (params) => {
   }
 };
 
-export const getConversation = async (id) => {
+// Get a conversation with one page of messages; pass the returned next_cursor to load the next page
+export const getConversation = async (id, { cursor, limit } = {}) => {
   try {
-    const response = await api.get(`/api/conversations/${id}`);
+    const response = await api.get(`/api/conversations/${id}`, {
+      params: { cursor, limit }
+    });
     return response.data;
   } catch (error) {
     throw error.response?.data || { error: 'Failed to get conversation' };
   }
 };
 
+// Stream a whole transcript, calling onConversation once and onMessage for each message as it arrives
+export const streamConversation = async (id, { onConversation, onMessage, signal } = {}) => {
+  const token = getStoredToken();
+  const response = await fetch(`${API_URL}/api/conversations/${id}?stream=1`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+    signal
+  });
+
+  if (!response.ok) {
+    const error = await response.json().catch(() => null);
+    throw error || { error: 'Failed to get conversation' };
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+
+  const handleLine = (line) => {
+    if (!line) return;
+    const event = JSON.parse(line);
+    if (event.type === 'conversation' && onConversation) {
+      onConversation(event.conversation);
+    } else if (event.type === 'message' && onMessage) {
+      onMessage(event.message);
+    }
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split('\n');
+    buffered = lines.pop();
+    lines.forEach(handleLine);
+  }
+
+  handleLine(buffered + decoder.decode());
+};
+
 export const endConversation = async (id) => {
   try {
     const response = await api.post(`/api/conversations/${id}/end`);
@@ -26,3 +72,31 @@ export const endConversation = async (id) => {
     throw error.response?.data || { error: 'Failed to end conversation' };
   }
 };
+
+// Start a gzip transcript export; params: organization_id, format ('ndjson' or 'csv'), start_date, end_date
+export const createExport = async (params) => {
+  try {
+    const response = await api.post('/api/exports/', params);
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || { error: 'Failed to start export' };
+  }
+};
+
+export const getExport = async (id) => {
+  try {
+    const response = await api.get(`/api/exports/${id}`);
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || { error: 'Failed to get export' };
+  }
+};
+
+export const downloadExport = async (id) => {
+  try {
+    const response = await api.get(`/api/exports/${id}/download`, { responseType: 'blob' });
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || { error: 'Failed to download export' };
+  }
+};
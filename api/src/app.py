@@ -1,26 +1,53 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+from flask_jwt_extended import JWTManager
 import os
 
-app = Flask(__name__)
+from config.config import config_by_name
+from models import db
+from routes import register_routes
+from services.chatbot_cache import chatbot_cache
+from services.conversation_cache import conversation_cache
+from services.conversation_sweeper import conversation_sweeper
+from services.idempotency import idempotency_store
+from services.message_buffer import message_buffer
+from services.rate_limiter import rate_limiter
+from services.socket_queue import StoreManager
+from services.socket_replay import replay_buffer
+from services.socket_service import ROOM_EVENT, deliver_room_event, event_batcher, socketio
+from services.socket_workers import loop_lag_monitor, socket_workers
 
-# Configuration directly in app.py for simplicity
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/clai_chat')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app = Flask(__name__)
+app.config.from_object(config_by_name.get(os.environ.get('FLASK_ENV', 'production'), config_by_name['production']))
 
 # Apply CORS
 CORS(app)
 
-# Simple socketio mock
-class MockSocketIO:
-    def __init__(self):
-        pass
-    
-    def run(self, app, host='0.0.0.0', port=5000, debug=False):
-        app.run(host=host, port=port, debug=debug)
-
-socketio = MockSocketIO()
+db.init_app(app)
+JWTManager(app)
+
+# Process-wide services take their settings from the config once; everything else reads
+# config.config.setting() (the app's config, with Config's defaults) when it needs a value
+for service in (chatbot_cache, conversation_cache, conversation_sweeper, event_batcher, idempotency_store,
+                loop_lag_monitor, message_buffer, rate_limiter, replay_buffer, socket_workers):
+    service.init_app(app)
+
+register_routes(app)
+
+# Socket.IO on eventlet in production; run.py monkey-patches before this module is imported.
+# Handlers hand blocking work to services.socket_workers, so the event loop only does I/O.
+# Emits go through the shared store's pub/sub so rooms span every worker and node;
+# conversation events are published once and each node delivers them to its own rooms.
+client_manager = StoreManager(channel=app.config['SOCKETIO_CHANNEL'])
+client_manager.on_fanout(ROOM_EVENT, deliver_room_event)
+socketio.init_app(
+    app,
+    async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+    client_manager=client_manager,
+    cors_allowed_origins=app.config['SOCKETIO_CORS_ALLOWED_ORIGINS'],
+    ping_interval=app.config['SOCKETIO_PING_INTERVAL'],
+    ping_timeout=app.config['SOCKETIO_PING_TIMEOUT']
+)
 
 @app.route('/')
 def index():
@@ -31,4 +58,4 @@ def health_check():
     return jsonify({"status": "healthy"})
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    socketio.run(app, host='0.0.0.0', port=5000)
@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from flask import current_app, has_app_context
 
 load_dotenv()
 
@@ -19,12 +20,107 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
-    # Redis
+    # Redis (shared caches and pub/sub fall back to an in-process store when REDIS_URL is unset)
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis:6379/0')
+    CHATBOT_CACHE_TTL = int(os.environ.get('CHATBOT_CACHE_TTL', 300))
+    CONVERSATION_CACHE_IDLE_TTL = int(os.environ.get('CONVERSATION_CACHE_IDLE_TTL', 1800))
+    CONVERSATION_CACHE_WINDOW = int(os.environ.get('CONVERSATION_CACHE_WINDOW', 10))
+    
+    # Socket.IO server ('eventlet' in production, 'threading' for local debugging) and the
+    # bounded pool that runs message processing off the event loop
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet')
+    SOCKETIO_CORS_ALLOWED_ORIGINS = os.environ.get('SOCKETIO_CORS_ALLOWED_ORIGINS', '*')
+    SOCKETIO_PING_INTERVAL = int(os.environ.get('SOCKETIO_PING_INTERVAL', 25))
+    SOCKETIO_PING_TIMEOUT = int(os.environ.get('SOCKETIO_PING_TIMEOUT', 20))
+    SOCKETIO_CHANNEL = os.environ.get('SOCKETIO_CHANNEL', 'socketio')  # Pub/sub channel for cross-node emits
+    # Compact-protocol clients get frames coalesced per room for this many seconds (or max frames)
+    SOCKET_BATCH_WINDOW = float(os.environ.get('SOCKET_BATCH_WINDOW', 0.02))
+    SOCKET_BATCH_MAX_FRAMES = int(os.environ.get('SOCKET_BATCH_MAX_FRAMES', 50))
+    # Sequenced messages kept per conversation for replay when a socket rejoins with last_seq
+    SOCKET_REPLAY_SIZE = int(os.environ.get('SOCKET_REPLAY_SIZE', 100))
+    SOCKET_REPLAY_TTL = int(os.environ.get('SOCKET_REPLAY_TTL', 900))
+    SOCKET_WORKERS = int(os.environ.get('SOCKET_WORKERS', 64))
+    SOCKET_WORKER_QUEUE = int(os.environ.get('SOCKET_WORKER_QUEUE', 1000))
+    LOOP_LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', 0.5))  # Event loop lag sampling period (seconds)
+    
+    # Token-bucket limits on the public chat entry points (defaults in services/rate_limiter.py);
+    # RATE_LIMIT_TIERS is JSON like {"premium": {"message": {"chatbot": [6000, 1000]}}} (per minute, burst)
+    RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', 'true') == 'true'
+    RATE_LIMIT_TIERS = os.environ.get('RATE_LIMIT_TIERS')
+    
+    # Request time budget for chat entry points, and the stage thresholds used to shrink work
+    REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', 30))
+    KB_MIN_BUDGET_SECONDS = float(os.environ.get('KB_MIN_BUDGET_SECONDS', 3))
+    LLM_MIN_BUDGET_SECONDS = float(os.environ.get('LLM_MIN_BUDGET_SECONDS', 1))
+    LLM_LOW_BUDGET_SECONDS = float(os.environ.get('LLM_LOW_BUDGET_SECONDS', 5))
     
     # LLM
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
     LLM_MODEL = os.environ.get('LLM_MODEL', 'gpt-3.5-turbo')
+    LLM_CHEAP_MODEL = os.environ.get('LLM_CHEAP_MODEL')  # Used for simple messages when routing (default: the main model)
+    LLM_TIER_MODELS = os.environ.get('LLM_TIER_MODELS')  # Opt-in JSON like {"premium": {"model": "gpt-4"}}
+    LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'openai')  # 'openai' or 'mock'
+    LLM_REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT', 60))
+    
+    # LLM executor limits
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 16))
+    LLM_MAX_CONCURRENCY_PER_ORG = int(os.environ.get('LLM_MAX_CONCURRENCY_PER_ORG', 4))
+    LLM_MAX_QUEUE = int(os.environ.get('LLM_MAX_QUEUE', 64))
+    
+    # LLM resilience (per-organization overrides live in Organization.llm_settings)
+    LLM_LATENCY_BUDGET = float(os.environ['LLM_LATENCY_BUDGET']) if os.environ.get('LLM_LATENCY_BUDGET') else None  # Default: LLM_REQUEST_TIMEOUT
+    LLM_HEDGE_REQUESTS = os.environ.get('LLM_HEDGE_REQUESTS', 'false').lower() == 'true'
+    LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 50))
+    LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 10))
+    LLM_BREAKER_ERROR_RATE = float(os.environ.get('LLM_BREAKER_ERROR_RATE', 0.5))
+    LLM_BREAKER_SLOW_CALL_SECONDS = float(os.environ.get('LLM_BREAKER_SLOW_CALL_SECONDS', 10))
+    LLM_BREAKER_SLOW_RATE = float(os.environ.get('LLM_BREAKER_SLOW_RATE', 0.5))
+    LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))
+    
+    # Mock LLM provider (LLM_PROVIDER=mock) for offline load testing
+    MOCK_LLM_RESPONSE = os.environ.get('MOCK_LLM_RESPONSE', 'Thanks for your message! You said: {message}')
+    MOCK_LLM_LATENCY = os.environ.get('MOCK_LLM_LATENCY', 'fixed:0')  # e.g. 'lognormal:-0.5,0.6'
+    MOCK_LLM_TOKEN_LATENCY = os.environ.get('MOCK_LLM_TOKEN_LATENCY', 'fixed:0')
+    MOCK_LLM_ERROR_RATE = float(os.environ.get('MOCK_LLM_ERROR_RATE', 0))
+    MOCK_LLM_TIMEOUT_RATE = float(os.environ.get('MOCK_LLM_TIMEOUT_RATE', 0))
+    MOCK_LLM_TIMEOUT_SECONDS = float(os.environ.get('MOCK_LLM_TIMEOUT_SECONDS', 60))
+    MOCK_LLM_SEED = os.environ.get('MOCK_LLM_SEED')
+    
+    # Idempotency-Key results for message submission (seconds kept; claim expiry if a worker dies mid-request)
+    IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', 86400))
+    IDEMPOTENCY_PENDING_TTL = int(os.environ.get('IDEMPOTENCY_PENDING_TTL', 120))
+    
+    # Default page size for conversation transcripts (?limit=, max 1000; ?stream=1 returns everything as NDJSON)
+    TRANSCRIPT_PAGE_SIZE = int(os.environ.get('TRANSCRIPT_PAGE_SIZE', 100))
+    
+    # How long conversation list totals are cached (?total=cached, the default)
+    CONVERSATION_COUNT_TTL = int(os.environ.get('CONVERSATION_COUNT_TTL', 60))
+    
+    # Idle conversation sweeper (started by run.py unless CONVERSATION_SWEEPER_ENABLED=false)
+    CONVERSATION_SWEEPER_ENABLED = os.environ.get('CONVERSATION_SWEEPER_ENABLED', 'true') == 'true'
+    CONVERSATION_IDLE_TIMEOUT = int(os.environ.get('CONVERSATION_IDLE_TIMEOUT', 1800))
+    CONVERSATION_SWEEP_INTERVAL = int(os.environ.get('CONVERSATION_SWEEP_INTERVAL', 60))
+    CONVERSATION_SWEEP_BATCH_SIZE = int(os.environ.get('CONVERSATION_SWEEP_BATCH_SIZE', 500))
+    CONVERSATION_SWEEP_BATCH_PAUSE = float(os.environ.get('CONVERSATION_SWEEP_BATCH_PAUSE', 0.5))
+    CONVERSATION_SWEEP_MAX_BATCHES = int(os.environ.get('CONVERSATION_SWEEP_MAX_BATCHES', 20))
+    CONVERSATION_SWEEP_LOCK_TTL = int(os.environ.get('CONVERSATION_SWEEP_LOCK_TTL', 60))  # Extended before every batch
+    
+    # Cold storage for ended conversations (scripts/archive_conversations.py); zstd needs the zstandard package
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+    ARCHIVE_CODEC = os.environ.get('ARCHIVE_CODEC', 'gzip')
+    
+    # Transcript exports (/api/exports): where finished files are written and how many run at once;
+    # running jobs with no progress for EXPORT_STALE_SECONDS are failed at startup (their process died)
+    EXPORT_DIR = os.environ.get('EXPORT_DIR', '/tmp/clai_exports')
+    EXPORT_MAX_WORKERS = int(os.environ.get('EXPORT_MAX_WORKERS', 2))
+    EXPORT_STALE_SECONDS = int(os.environ.get('EXPORT_STALE_SECONDS', 900))
+    
+    # Chat message persistence: 'sync' (default) or 'write_behind' (buffered, may lose
+    # up to MESSAGE_BUFFER_FLUSH_INTERVAL seconds of messages on a crash)
+    MESSAGE_WRITE_MODE = os.environ.get('MESSAGE_WRITE_MODE', 'sync')
+    MESSAGE_BUFFER_MAX_SIZE = int(os.environ.get('MESSAGE_BUFFER_MAX_SIZE', 5000))
+    MESSAGE_BUFFER_FLUSH_SIZE = int(os.environ.get('MESSAGE_BUFFER_FLUSH_SIZE', 200))
+    MESSAGE_BUFFER_FLUSH_INTERVAL = float(os.environ.get('MESSAGE_BUFFER_FLUSH_INTERVAL', 0.5))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -36,6 +132,16 @@ class TestingConfig(Config):
 class ProductionConfig(Config):
     pass
 
+def setting(name):
+    """
+    A setting from the current app's config, or from Config outside an app
+    context (and for apps that don't load it), so every default lives here.
+    Process-wide services are configured once from app.config in app.py instead.
+    """
+    if has_app_context():
+        return current_app.config.get(name, getattr(Config, name))
+    return getattr(Config, name)
+
 config_by_name = {
     'development': DevelopmentConfig,
     'testing': TestingConfig,
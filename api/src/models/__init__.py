@@ -5,5 +5,9 @@ from .organization import Organization
 from .chatbot import ChatBot
 from .conversation import Conversation
 from .message import Message
+from .archive import ConversationArchive
+from .knowledge import KnowledgeBase, KnowledgeItem
 from .lead import Lead
 from .analytics import ConversationMetrics, DailyMetrics
+from .export import ExportJob
+from .webhook import Webhook, WebhookLog
@@ -4,6 +4,12 @@ import json
 from .db import db
 
 class ConversationMetrics(db.Model):
+    __table_args__ = (
+        # Analytics filter by organization over a created_at range
+        db.Index('ix_conversation_metrics_organization_id_created_at', 'organization_id', 'created_at'),
+        db.Index('ix_conversation_metrics_conversation_id', 'conversation_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
     chatbot_id = db.Column(db.Integer, db.ForeignKey('chat_bot.id'), nullable=False)
@@ -15,6 +21,13 @@ class ConversationMetrics(db.Model):
     lead_captured = db.Column(db.Boolean, default=False)
     completed = db.Column(db.Boolean, default=False)
     
+    # LLM usage
+    llm_call_count = db.Column(db.Integer, default=0)
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    llm_latency_ms = db.Column(db.Integer, default=0)  # Total across all LLM calls
+    canned_response_count = db.Column(db.Integer, default=0)  # Opening messages and quick replies answered from config
+    
     # User timing
     time_of_day = db.Column(db.String(20))  # 'business', 'evening', 'weekend'
     day_of_week = db.Column(db.Integer)
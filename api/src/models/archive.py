@@ -0,0 +1,16 @@
+from datetime import datetime
+
+from .db import db
+
+class ConversationArchive(db.Model):
+    """Compressed transcript of an ended conversation whose messages were moved out of the message table"""
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False, unique=True)
+    codec = db.Column(db.String(20), nullable=False)  # 'gzip' or 'zstd'
+    payload = db.Column(db.LargeBinary, nullable=False)  # Compressed JSON list of Message.to_dict() rows
+    message_count = db.Column(db.Integer, default=0)
+    original_bytes = db.Column(db.Integer)
+    compressed_bytes = db.Column(db.Integer)
+    first_message_at = db.Column(db.DateTime)
+    last_message_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -4,12 +4,20 @@ import json
 from .db import db
 
 class Conversation(db.Model):
+    __table_args__ = (
+        db.Index('ix_conversation_visitor_id', 'visitor_id'),
+        # Keyset listing per organization, newest first
+        db.Index('ix_conversation_organization_id_started_at', 'organization_id', 'started_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     chatbot_id = db.Column(db.Integer, db.ForeignKey('chat_bot.id'), nullable=False)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'))  # Denormalized from the chatbot
     visitor_id = db.Column(db.String(255))
     started_at = db.Column(db.DateTime, default=datetime.utcnow)
     ended_at = db.Column(db.DateTime)
     status = db.Column(db.String(50), default='active')
+    archived_at = db.Column(db.DateTime)  # Set once messages are moved to ConversationArchive
     
     # UTM tracking
     utm_source = db.Column(db.String(100))
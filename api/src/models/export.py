@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from .db import db
+
+class ExportJob(db.Model):
+    """Bulk transcript export for an organization, written to a gzip-compressed file"""
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    format = db.Column(db.String(10), nullable=False, default='ndjson')  # 'ndjson' or 'csv'
+    start_date = db.Column(db.DateTime)
+    end_date = db.Column(db.DateTime)
+    status = db.Column(db.String(20), default='pending')  # 'pending', 'running', 'completed', 'failed'
+    
+    # Progress
+    conversations_total = db.Column(db.Integer, default=0)
+    conversations_done = db.Column(db.Integer, default=0)
+    messages_done = db.Column(db.Integer, default=0)
+    heartbeat_at = db.Column(db.DateTime)  # Last progress while running; stale jobs are failed at startup
+    
+    # Result
+    file_path = db.Column(db.String(500))
+    file_size = db.Column(db.BigInteger)
+    error = db.Column(db.Text)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    @property
+    def progress(self):
+        if not self.conversations_total:
+            return 1.0 if self.status == 'completed' else 0.0
+        return round(self.conversations_done / self.conversations_total, 4)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'organization_id': self.organization_id,
+            'format': self.format,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'status': self.status,
+            'progress': self.progress,
+            'conversations_total': self.conversations_total,
+            'conversations_done': self.conversations_done,
+            'messages_done': self.messages_done,
+            'file_size': self.file_size,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
@@ -3,6 +3,11 @@ from datetime import datetime
 from .db import db
 
 class Message(db.Model):
+    __table_args__ = (
+        # Transcripts and history windows filter by conversation and sort by time
+        db.Index('ix_message_conversation_id_timestamp', 'conversation_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
     sender_type = db.Column(db.String(20), nullable=False)  # 'bot' or 'human'
@@ -10,8 +15,12 @@ class Message(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     # LLM metadata
-    token_count = db.Column(db.Integer)
+    token_count = db.Column(db.Integer)  # prompt_tokens + completion_tokens
+    prompt_tokens = db.Column(db.Integer)
+    completion_tokens = db.Column(db.Integer)
+    latency_ms = db.Column(db.Integer)
     llm_model_used = db.Column(db.String(100))
+    llm_route = db.Column(db.String(50))  # 'simple', 'complex', 'pinned', 'default', 'deadline', 'knowledge_base' or 'canned'
     
     def to_dict(self):
         return {
@@ -21,5 +30,9 @@ class Message(db.Model):
             'content': self.content,
             'timestamp': self.timestamp.isoformat(),
             'token_count': self.token_count,
-            'llm_model_used': self.llm_model_used
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'latency_ms': self.latency_ms,
+            'llm_model_used': self.llm_model_used,
+            'llm_route': self.llm_route
         }
@@ -10,6 +10,7 @@ from .analytics import analytics_routes
 from .widget import widget_routes
 from .knowledge import knowledge_routes
 from .webhook import webhook_routes
+from .export import export_routes
 
 def register_routes(app):
     """Register all blueprint routes with the app."""
@@ -23,3 +24,4 @@ def register_routes(app):
     app.register_blueprint(widget_routes)
     app.register_blueprint(knowledge_routes)
     app.register_blueprint(webhook_routes)
+    app.register_blueprint(export_routes)
@@ -3,8 +3,17 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from sqlalchemy import func
 
-from models import db, ConversationMetrics, DailyMetrics, User, Organization
-from utils.permissions import has_organization_access
+from models import db, ConversationMetrics, DailyMetrics, User, Organization, Message, Conversation, ChatBot
+from services.llm_executor import get_llm_executor
+from services.circuit_breaker import circuit_breaker_stats
+from services.llm_service import prompt_coalescer, hedge_stats
+from services.message_buffer import message_buffer, write_behind_enabled
+from services.chatbot_cache import chatbot_cache
+from services.conversation_cache import conversation_cache
+from services.conversation_sweeper import conversation_sweeper
+from services.rate_limiter import rate_limiter
+from services.socket_workers import loop_lag_monitor, socket_workers
+from utils.permissions import has_organization_access, role_required
 
 analytics_routes = Blueprint('analytics', __name__, url_prefix='/api/analytics')
 
@@ -420,3 +429,169 @@ def get_efficiency_analytics():
     }), 200
             
 
+
+@analytics_routes.route('/usage', methods=['GET'])
+@jwt_required()
+def get_usage_analytics():
+    """Get LLM token usage and latency, rolled up per chatbot"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    # Get organization_id from query params or use user's organization
+    organization_id = request.args.get('organization_id', type=int) or user.organization_id
+    
+    # Check permissions
+    if not has_organization_access(organization_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    # Get date range (default to last 30 days)
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=30)
+    
+    if request.args.get('start_date'):
+        try:
+            start_date = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid start_date format (use YYYY-MM-DD)'}), 400
+    
+    if request.args.get('end_date'):
+        try:
+            end_date = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'error': 'Invalid end_date format (use YYYY-MM-DD)'}), 400
+    
+    # Aggregate usage per chatbot in the database
+    usage_rows = db.session.query(
+        ConversationMetrics.chatbot_id.label('chatbot_id'),
+        func.count().label('conversations'),
+        func.coalesce(func.sum(ConversationMetrics.llm_call_count), 0).label('llm_calls'),
+        func.coalesce(func.sum(ConversationMetrics.prompt_tokens), 0).label('prompt_tokens'),
+        func.coalesce(func.sum(ConversationMetrics.completion_tokens), 0).label('completion_tokens'),
+        func.coalesce(func.sum(ConversationMetrics.llm_latency_ms), 0).label('llm_latency_ms'),
+        func.coalesce(func.sum(ConversationMetrics.canned_response_count), 0).label('canned_responses')
+    ).filter(
+        ConversationMetrics.organization_id == organization_id,
+        ConversationMetrics.created_at >= start_date,
+        ConversationMetrics.created_at <= end_date + timedelta(days=1)
+    ).group_by(
+        ConversationMetrics.chatbot_id
+    ).all()
+    
+    chatbots = [
+        {
+            'chatbot_id': row.chatbot_id,
+            'conversations': row.conversations,
+            'llm_calls': row.llm_calls,
+            'prompt_tokens': row.prompt_tokens,
+            'completion_tokens': row.completion_tokens,
+            'total_tokens': row.prompt_tokens + row.completion_tokens,
+            'avg_llm_latency_ms': row.llm_latency_ms / row.llm_calls if row.llm_calls > 0 else 0,
+            'canned_responses': row.canned_responses
+        }
+        for row in usage_rows
+    ]
+    
+    # Sort by total tokens descending so the most expensive chatbots come first
+    chatbots.sort(key=lambda x: x['total_tokens'], reverse=True)
+    
+    # Latency and tokens per routing decision and model
+    route_rows = db.session.query(
+        Message.llm_route.label('route'),
+        Message.llm_model_used.label('model'),
+        func.count().label('messages'),
+        func.avg(Message.latency_ms).label('avg_latency_ms'),
+        func.coalesce(func.sum(Message.prompt_tokens), 0).label('prompt_tokens'),
+        func.coalesce(func.sum(Message.completion_tokens), 0).label('completion_tokens')
+    ).join(
+        Conversation, Message.conversation_id == Conversation.id
+    ).join(
+        ChatBot, Conversation.chatbot_id == ChatBot.id
+    ).filter(
+        ChatBot.organization_id == organization_id,
+        Message.sender_type == 'bot',
+        Message.timestamp >= start_date,
+        Message.timestamp <= end_date + timedelta(days=1)
+    ).group_by(
+        Message.llm_route,
+        Message.llm_model_used
+    ).all()
+    
+    routes = [
+        {
+            'route': row.route,
+            'model': row.model,
+            'messages': row.messages,
+            'avg_latency_ms': float(row.avg_latency_ms) if row.avg_latency_ms is not None else None,
+            'prompt_tokens': row.prompt_tokens,
+            'completion_tokens': row.completion_tokens
+        }
+        for row in route_rows
+    ]
+    
+    total_calls = sum(c['llm_calls'] for c in chatbots)
+    total_latency = sum(row.llm_latency_ms for row in usage_rows)
+    
+    return jsonify({
+        'organization_id': organization_id,
+        'llm_calls': total_calls,
+        'prompt_tokens': sum(c['prompt_tokens'] for c in chatbots),
+        'completion_tokens': sum(c['completion_tokens'] for c in chatbots),
+        'total_tokens': sum(c['total_tokens'] for c in chatbots),
+        'avg_llm_latency_ms': total_latency / total_calls if total_calls > 0 else 0,
+        'canned_responses': sum(c['canned_responses'] for c in chatbots),
+        'chatbots': chatbots,
+        'routes': routes
+    }), 200
+
+@analytics_routes.route('/llm-runtime', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_llm_runtime_stats():
+    """Get live LLM executor stats for this worker (requires admin role)"""
+    return jsonify({
+        'executor': get_llm_executor().stats(),
+        'coalescing': prompt_coalescer.stats(),
+        'circuit_breakers': circuit_breaker_stats(),
+        'hedging': dict(hedge_stats)
+    }), 200
+
+@analytics_routes.route('/write-buffer', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_write_buffer_stats():
+    """Get write-behind message buffer stats for this worker (requires admin role)"""
+    return jsonify({
+        'enabled': write_behind_enabled(),
+        'buffer': message_buffer.stats()
+    }), 200
+
+@analytics_routes.route('/caches', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_cache_stats():
+    """Get chatbot and conversation cache stats for this worker (requires admin role)"""
+    return jsonify({
+        'chatbots': chatbot_cache.stats(),
+        'conversations': conversation_cache.stats()
+    }), 200
+
+@analytics_routes.route('/sweeper', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_sweeper_stats():
+    """Get idle conversation sweeper stats for this worker (requires admin role)"""
+    return jsonify(conversation_sweeper.stats()), 200
+
+@analytics_routes.route('/socket-workers', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_socket_worker_stats():
+    """Get Socket.IO worker pool and event loop lag stats for this worker (requires admin role)"""
+    return jsonify(dict(socket_workers.stats(), loop_lag=loop_lag_monitor.stats())), 200
+
+@analytics_routes.route('/rate-limits', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_rate_limit_stats():
+    """Get chat rate limiter stats for this worker (requires admin role)"""
+    return jsonify(rate_limiter.stats()), 200
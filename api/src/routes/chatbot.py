@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from models import db, ChatBot, Organization, User
+from services.chatbot_cache import chatbot_cache
 from utils.permissions import has_organization_access
 
 chatbot_routes = Blueprint('chatbot', __name__, url_prefix='/api/chatbots')
@@ -121,6 +122,9 @@ def update_chatbot(chatbot_id):
     
     db.session.commit()
     
+    # Drop cached snapshots on every worker
+    chatbot_cache.invalidate(chatbot.id, chatbot.updated_at)
+    
     return jsonify({
         'id': chatbot.id,
         'status': 'updated'
@@ -143,6 +147,9 @@ def delete_chatbot(chatbot_id):
     db.session.delete(chatbot)
     db.session.commit()
     
+    # Drop cached snapshots on every worker
+    chatbot_cache.invalidate(chatbot_id)
+    
     return jsonify({
         'status': 'deleted'
     }), 200
@@ -185,6 +192,9 @@ def clone_chatbot(chatbot_id):
     db.session.add(new_chatbot)
     db.session.commit()
     
+    # Drop any stale snapshot cached under the new id on every worker
+    chatbot_cache.invalidate(new_chatbot.id, new_chatbot.updated_at)
+    
     return jsonify({
         'id': new_chatbot.id,
         'name': new_chatbot.name,
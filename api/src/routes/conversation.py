@@ -1,12 +1,28 @@
-from flask import Blueprint, request, jsonify
+import logging
+import math
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
+from config.config import setting
 from models import db, Conversation, Message, ChatBot, User
+from services.chatbot_cache import chatbot_cache
+from services.conversation_cache import conversation_cache
 from services.conversation_service import ConversationService
+from services.idempotency import IdempotencyConflictError, IdempotencyKeyReusedError, idempotency_store
+from services.rate_limiter import RateLimitExceeded, rate_limiter
+from services.socket_service import send_bot_message, send_system_message
+from utils.deadline import Deadline
+from utils.pagination import before_keyset, decode_cursor, encode_cursor
 from utils.permissions import has_organization_access
+from utils.redis_store import StoreError, get_redis
 
 conversation_routes = Blueprint('conversation', __name__, url_prefix='/api/conversations')
 
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_MAX_PAGE_SIZE = 1000
+
 @conversation_routes.route('/', methods=['POST'])
 def start_conversation():
     """Start a new conversation"""
@@ -16,8 +32,15 @@ def start_conversation():
     if not data.get('chatbot_id'):
         return jsonify({'error': 'chatbot_id is required'}), 400
     
-    # Get chatbot
-    chatbot = ChatBot.query.get(data.get('chatbot_id'))
+    # Rate limit by IP before any lookup, then by visitor and chatbot
+    try:
+        rate_limiter.hit('conversation', {'ip': request.remote_addr})
+        chatbot = chatbot_cache.get(data.get('chatbot_id'))
+        if chatbot:
+            rate_limiter.hit('conversation', {'visitor': data.get('visitor_id'), 'chatbot': chatbot.id}, chatbot=chatbot)
+    except RateLimitExceeded as e:
+        return _rate_limited(e)
+    
     if not chatbot:
         return jsonify({'error': 'Chatbot not found'}), 404
     
@@ -49,19 +72,33 @@ def start_conversation():
 @conversation_routes.route('/<int:conversation_id>/messages', methods=['POST'])
 def send_message(conversation_id):
     """Send a message to a conversation"""
+    # Start the request's time budget before any other work
+    deadline = Deadline.for_request()
+    
     data = request.json
     
     # Validate required fields
     if not data.get('content'):
         return jsonify({'error': 'message content is required'}), 400
     
-    # Get conversation
-    conversation = Conversation.query.get(conversation_id)
+    # Rate limit by IP before any lookup
+    try:
+        rate_limiter.hit('message', {'ip': request.remote_addr})
+    except RateLimitExceeded as e:
+        return _rate_limited(e)
+    
+    # Get conversation (cached while the conversation is active)
+    conversation = conversation_cache.get(conversation_id)
     if not conversation:
         return jsonify({'error': 'Conversation not found'}), 404
     
     # Get chatbot
-    chatbot = ChatBot.query.get(conversation.chatbot_id)
+    chatbot = chatbot_cache.get(conversation.chatbot_id)
+    
+    try:
+        rate_limiter.hit('message', {'visitor': conversation.visitor_id, 'chatbot': chatbot.id}, chatbot=chatbot)
+    except RateLimitExceeded as e:
+        return _rate_limited(e)
     
     # Create conversation service
     conversation_service = ConversationService(
@@ -70,16 +107,43 @@ def send_message(conversation_id):
         visitor_id=conversation.visitor_id
     )
     
-    # Process message
-    result = conversation_service.process_message(
-        conversation_id=conversation_id,
-        message_content=data.get('content')
-    )
+    def process():
+        return conversation_service.process_message(
+            conversation_id=conversation_id,
+            message_content=data.get('content'),
+            deadline=deadline
+        )
     
-    if 'error' in result:
-        return jsonify(result), 400
+    # Process message; retries with the same Idempotency-Key get the first result
+    idempotency_key = request.headers.get('Idempotency-Key')
+    replayed = False
+    if idempotency_key:
+        try:
+            result, replayed = idempotency_store.run(
+                f'conversation:{conversation_id}',
+                idempotency_key,
+                process,
+                fingerprint=data.get('content'),
+                wait_timeout=deadline.remaining()
+            )
+        except IdempotencyKeyReusedError as e:
+            return jsonify({'error': str(e)}), 422
+        except IdempotencyConflictError as e:
+            return jsonify({'error': str(e)}), 409
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        result = process()
     
-    return jsonify(result), 200
+    # Sockets watching the conversation (on any node) get the reply too
+    if 'error' not in result and not replayed:
+        send_bot_message(conversation_id, result, idempotency_key=idempotency_key)
+    
+    status = 400 if 'error' in result else 200
+    response = jsonify(result)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
 
 @conversation_routes.route('/<int:conversation_id>', methods=['GET'])
 @jwt_required()
@@ -93,7 +157,7 @@ def get_conversation(conversation_id):
         return jsonify({'error': 'Conversation not found'}), 404
     
     # Get chatbot
-    chatbot = ChatBot.query.get(conversation.chatbot_id)
+    chatbot = chatbot_cache.get(conversation.chatbot_id)
     
     # Check permissions
     if not has_organization_access(chatbot.organization_id):
@@ -105,8 +169,22 @@ def get_conversation(conversation_id):
         organization_id=chatbot.organization_id
     )
     
-    # Get conversation
-    result = conversation_service.get_conversation(conversation_id)
+    # Stream the whole transcript as newline-delimited JSON
+    if request.args.get('stream', type=int):
+        lines = conversation_service.stream_conversation(conversation_id)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    # Get conversation with one page of messages
+    limit = request.args.get('limit', setting('TRANSCRIPT_PAGE_SIZE'), type=int)
+    limit = min(limit, TRANSCRIPT_MAX_PAGE_SIZE)
+    try:
+        result = conversation_service.get_conversation(
+            conversation_id,
+            limit=max(1, limit),
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     if 'error' in result:
         return jsonify(result), 404
@@ -122,7 +200,7 @@ def end_conversation(conversation_id):
         return jsonify({'error': 'Conversation not found'}), 404
     
     # Get chatbot
-    chatbot = ChatBot.query.get(conversation.chatbot_id)
+    chatbot = chatbot_cache.get(conversation.chatbot_id)
     
     # Create conversation service
     conversation_service = ConversationService(
@@ -136,43 +214,84 @@ def end_conversation(conversation_id):
     if 'error' in result:
         return jsonify(result), 400
     
+    send_system_message(conversation_id, 'This conversation has ended.')
+    
     return jsonify({'status': 'ended'}), 200
 
 @conversation_routes.route('/', methods=['GET'])
 @jwt_required()
 def list_conversations():
-    """List conversations for an organization (requires authentication)"""
+    """
+    List conversations for an organization, newest first (requires authentication).
+    
+    Pages with ?cursor=<next_cursor>. ?page=N (OFFSET paging, with an exact
+    total and pages/current_page in the response) is deprecated and kept for
+    one release; such responses carry a Deprecation header.
+    """
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     
     # Get query parameters
     organization_id = request.args.get('organization_id', type=int) or user.organization_id
     chatbot_id = request.args.get('chatbot_id', type=int)
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    cursor = request.args.get('cursor')
+    page = request.args.get('page', type=int)  # Deprecated, see above
+    total_mode = request.args.get('total', 'cached')  # 'cached', 'exact' or 'none'
     
     # Check permissions
     if not has_organization_access(organization_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
+    if total_mode not in ('cached', 'exact', 'none'):
+        return jsonify({'error': "total must be 'cached', 'exact' or 'none'"}), 400
+    
+    if page is not None:
+        if cursor:
+            return jsonify({'error': 'Pass cursor or page, not both (page is deprecated; use cursor)'}), 400
+        if page < 1:
+            return jsonify({'error': 'page must be 1 or more (page is deprecated; use cursor)'}), 400
+        total_mode = 'exact'
+    
     # Build query
     query = Conversation.query.filter_by(organization_id=organization_id)
     
     if chatbot_id:
         query = query.filter_by(chatbot_id=chatbot_id)
     
-    # Paginate
-    paginated = query.order_by(Conversation.started_at.desc()).paginate(
-        page=page, per_page=per_page
-    )
+    # Keyset pagination on (started_at, id) instead of OFFSET, so deep pages stay cheap
+    page_query = query
+    if cursor:
+        try:
+            started_at, last_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        page_query = page_query.filter(before_keyset(Conversation.started_at, Conversation.id, started_at, last_id))
     
-    return jsonify({
-        'total': paginated.total,
-        'pages': paginated.pages,
-        'current_page': page,
+    page_query = page_query.order_by(Conversation.started_at.desc(), Conversation.id.desc())
+    if page is not None:
+        page_query = page_query.offset((page - 1) * per_page)
+    conversations = page_query.limit(per_page + 1).all()
+    
+    next_cursor = None
+    if len(conversations) > per_page:
+        conversations = conversations[:per_page]
+        next_cursor = encode_cursor(conversations[-1].started_at, conversations[-1].id)
+    
+    total = None
+    if total_mode == 'exact':
+        total = query.count()
+    elif total_mode == 'cached':
+        total = _cached_conversation_count(query, organization_id, chatbot_id)
+    
+    body = {
+        'total': total,
+        'total_is_estimate': total_mode == 'cached',
         'per_page': per_page,
+        'next_cursor': next_cursor,
         'items': [{
             'id': conv.id,
+            'chatbot_id': conv.chatbot_id,
             'started_at': conv.started_at.isoformat(),
             'ended_at': conv.ended_at.isoformat() if conv.ended_at else None,
             'status': conv.status,
@@ -180,5 +299,40 @@ def list_conversations():
             'utm_source': conv.utm_source,
             'utm_medium': conv.utm_medium,
             'utm_campaign': conv.utm_campaign
-        } for conv in paginated.items]
-    }), 200
+        } for conv in conversations]
+    }
+    
+    if page is None:
+        return jsonify(body), 200
+    
+    body.update(pages=math.ceil(total / per_page), current_page=page)
+    response = jsonify(body)
+    response.headers['Deprecation'] = 'true'
+    return response, 200
+
+def _rate_limited(error):
+    response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(math.ceil(error.retry_after))
+    return response, 429
+
+def _cached_conversation_count(query, organization_id, chatbot_id=None):
+    """
+    Conversation count for a listing, recomputed at most every CONVERSATION_COUNT_TTL
+    seconds; counted every time while the store is unavailable
+    """
+    key = f"conversation_count:{organization_id}:{chatbot_id or 'all'}"
+    
+    try:
+        cached = get_redis().get(key)
+    except StoreError:
+        logger.warning('Could not read the cached conversation count %s', key, exc_info=True)
+        return query.count()
+    if cached is not None:
+        return int(cached)
+    
+    total = query.count()
+    try:
+        get_redis().set(key, total, ex=setting('CONVERSATION_COUNT_TTL'))
+    except StoreError:
+        logger.warning('Could not cache the conversation count %s', key, exc_info=True)
+    return total
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, request, jsonify, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from models import ExportJob, User
+from services.export_service import EXPORT_FORMATS, ExportService, start_export
+from utils.permissions import has_organization_access
+
+export_routes = Blueprint('export', __name__, url_prefix='/api/exports')
+
+@export_routes.route('/', methods=['POST'])
+@jwt_required()
+def create_export():
+    """Start a transcript export for an organization (requires authentication)"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    data = request.json or {}
+    
+    organization_id = data.get('organization_id') or user.organization_id
+    export_format = data.get('format', 'ndjson')
+    
+    # Check permissions
+    if not has_organization_access(organization_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    # Date range on conversation start (end_date inclusive)
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d') if data.get('start_date') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid start_date format (use YYYY-MM-DD)'}), 400
+    try:
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d') + timedelta(days=1) if data.get('end_date') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid end_date format (use YYYY-MM-DD)'}), 400
+    
+    job = ExportService().create_job(
+        organization_id=organization_id,
+        export_format=export_format,
+        start_date=start_date,
+        end_date=end_date,
+        requested_by=user_id
+    )
+    start_export(current_app._get_current_object(), job.id)
+    
+    return jsonify(job.to_dict()), 202
+
+@export_routes.route('/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_export(job_id):
+    """Get export job status and progress (requires authentication)"""
+    job = ExportJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Export not found'}), 404
+    
+    # Check permissions
+    if not has_organization_access(job.organization_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    return jsonify(job.to_dict()), 200
+
+@export_routes.route('/<int:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export(job_id):
+    """Download a finished export; supports Range requests for resuming (requires authentication)"""
+    job = ExportJob.query.get(job_id)
+    if not job:
+        return jsonify({'error': 'Export not found'}), 404
+    
+    # Check permissions
+    if not has_organization_access(job.organization_id):
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    if job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export is not ready', 'status': job.status}), 409
+    
+    # conditional=True handles Range and If-Range (206 partial responses) and ETags
+    return send_file(
+        job.file_path,
+        mimetype='application/gzip',
+        as_attachment=True,
+        download_name=os.path.basename(job.file_path),
+        conditional=True
+    )
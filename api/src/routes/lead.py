@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 
 from models import db, Lead, Conversation, User
+from utils.deadline import Deadline
 from utils.permissions import has_organization_access
 from services.webhook_service import WebhookService
 
@@ -12,6 +13,8 @@ webhook_service = WebhookService()
 @lead_routes.route('/', methods=['POST'])
 def create_lead():
     """Create a new lead from chat widget"""
+    deadline = Deadline.for_request()
+    
     data = request.json
     
     # Validate required fields
@@ -55,7 +58,8 @@ def create_lead():
     webhook_service.trigger_webhook_event(
         organization_id=lead.organization_id,
         event='lead.created',
-        payload=webhook_payload
+        payload=webhook_payload,
+        deadline=deadline
     )
     
     return jsonify({
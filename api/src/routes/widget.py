@@ -1,16 +1,34 @@
-from flask import Blueprint, send_from_directory, render_template, jsonify, request
+from flask import Blueprint, send_from_directory, render_template, jsonify, request, abort
 import os
 import json
 
 from models import ChatBot, Organization
+from services.chatbot_cache import chatbot_cache
 
 widget_routes = Blueprint('widget', __name__, url_prefix='/widget')
 
+def _reply_config(chatbot):
+    """Greeting and suggested replies; their answers stay server-side"""
+    def suggestions(key):
+        return [
+            {'label': entry.get('label') or entry.get('message'), 'message': entry.get('message') or entry.get('label')}
+            for entry in chatbot.config.get(key) or []
+            if isinstance(entry, dict) and (entry.get('label') or entry.get('message'))
+        ]
+    
+    return {
+        'greeting': chatbot.config.get('greeting'),
+        'openingMessages': suggestions('openingMessages'),
+        'quickReplies': suggestions('quickReplies')
+    }
+
 @widget_routes.route('/<int:chatbot_id>/loader.js')
 def get_widget_loader(chatbot_id):
     """Serve the widget loader script"""
     # Get chatbot
-    chatbot = ChatBot.query.get_or_404(chatbot_id)
+    chatbot = chatbot_cache.get(chatbot_id)
+    if not chatbot:
+        abort(404)
     
     # Set content type and cache headers
     headers = {
@@ -26,7 +44,8 @@ def get_widget_loader(chatbot_id):
         'chatbotId': chatbot_id,
         'organizationId': chatbot.organization_id,
         'name': chatbot.name,
-        'apiUrl': request.host_url.rstrip('/')
+        'apiUrl': request.host_url.rstrip('/'),
+        **_reply_config(chatbot)
     }
     
     # Render loader script with configuration
@@ -48,7 +67,9 @@ def get_widget_bundle(chatbot_id):
 def get_widget_styles(chatbot_id):
     """Serve the widget styles"""
     # Get chatbot
-    chatbot = ChatBot.query.get_or_404(chatbot_id)
+    chatbot = chatbot_cache.get(chatbot_id)
+    if not chatbot:
+        abort(404)
     
     # Set content type and cache headers
     headers = {
@@ -66,7 +87,9 @@ def get_widget_styles(chatbot_id):
 def get_widget_config(chatbot_id):
     """Get widget configuration"""
     # Get chatbot
-    chatbot = ChatBot.query.get_or_404(chatbot_id)
+    chatbot = chatbot_cache.get(chatbot_id)
+    if not chatbot:
+        abort(404)
     
     # Build configuration object
     config = {
@@ -77,7 +100,8 @@ def get_widget_config(chatbot_id):
         'features': {
             'leadCapture': chatbot.config.get('leadCapture', {}),
             'scheduling': chatbot.config.get('scheduling', {})
-        }
+        },
+        **_reply_config(chatbot)
     }
     
     return jsonify(config)
@@ -1,9 +1,38 @@
+import os
+
+# Green sockets and cooperative psycopg2 must be in place before anything else is imported
+if os.environ.get('SOCKETIO_ASYNC_MODE', 'eventlet') == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+    
+    from psycogreen.eventlet import patch_psycopg
+    patch_psycopg()
+
 from app import app, socketio
+from services.conversation_sweeper import conversation_sweeper
+from services.export_service import ExportService
+from services.socket_workers import loop_lag_monitor
 from utils.db_init import init_db
 
 if __name__ == '__main__':
     # Initialize database with required initial data
     init_db(app)
     
+    # Exports that were running when the previous process stopped will never finish
+    # (existing databases need `python -m utils.db_migrations schema` for the export_job table)
+    try:
+        with app.app_context():
+            ExportService().fail_stale_jobs()
+    except Exception:
+        app.logger.exception('Could not check for stale export jobs')
+    
+    # End conversations whose visitors left without closing them
+    if app.config['CONVERSATION_SWEEPER_ENABLED']:
+        conversation_sweeper.start(app)
+    
+    # Track how responsive the event loop stays (reported at /api/analytics/socket-workers)
+    socketio.start_background_task(loop_lag_monitor.run)
+    
     # Run the application with SocketIO
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    socketio.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)),
+                 debug=os.environ.get('FLASK_ENV') == 'development', use_reloader=False)
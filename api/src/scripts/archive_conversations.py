@@ -0,0 +1,29 @@
+"""
+Move ended conversations older than ARCHIVE_AFTER_DAYS into compressed
+cold storage. Intended to run from cron, e.g. nightly, from api/src:
+
+    python -m scripts.archive_conversations --days 90 --codec gzip
+"""
+import argparse
+
+from app import app
+from services.archive_service import ArchiveService, available_codecs
+
+def main():
+    parser = argparse.ArgumentParser(description='Archive ended conversations into compressed storage')
+    parser.add_argument('--days', type=int, default=None, help='archive conversations ended more than this many days ago')
+    parser.add_argument('--codec', choices=available_codecs(), default=None)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many conversations')
+    args = parser.parse_args()
+
+    with app.app_context():
+        service = ArchiveService(older_than_days=args.days, codec=args.codec, batch_size=args.batch_size)
+        totals = service.archive_ended_conversations(limit=args.limit)
+
+    ratio = totals['original_bytes'] / totals['compressed_bytes'] if totals['compressed_bytes'] else 0
+    print(f"Archived {totals['conversations']} conversations ({totals['messages']} messages), "
+          f"{totals['original_bytes']} -> {totals['compressed_bytes']} bytes ({ratio:.1f}x)")
+
+if __name__ == '__main__':
+    main()
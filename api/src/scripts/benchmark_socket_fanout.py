@@ -0,0 +1,120 @@
+"""
+Benchmark Socket.IO room delivery latency on the same node and across nodes.
+
+Starts two Socket.IO nodes in this process, each with its own StoreManager
+listener, so every room emit travels through the shared store's pub/sub just
+as it does between API workers. A subscriber joins a room on node B and a
+publisher asks node A (cross-node) or node B (same node) to emit to it.
+
+Run from api/src, e.g.:
+
+    python -m scripts.benchmark_socket_fanout
+    REDIS_URL=redis://localhost:6379/0 python -m scripts.benchmark_socket_fanout --messages 2000
+
+Without REDIS_URL the in-process LocalStore relays the emits, which measures
+the Socket.IO overhead alone.
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import statistics
+import time
+
+import eventlet.wsgi
+import socketio
+
+from services.socket_queue import StoreManager
+
+ROOM = 'benchmark_room'
+
+def start_node(port, channel):
+    server = socketio.Server(async_mode='eventlet', client_manager=StoreManager(channel=channel))
+
+    @server.on('join')
+    def join(sid, data):
+        server.enter_room(sid, data['room'])
+        return True
+
+    @server.on('ping_room')
+    def ping_room(sid, data):
+        server.emit('pong_room', data, room=data['room'])
+
+    eventlet.spawn(eventlet.wsgi.server, eventlet.listen(('127.0.0.1', port)), socketio.WSGIApp(server),
+                   log_output=False)
+    return server
+
+def connect(port):
+    client = socketio.Client()
+    client.connect(f'http://127.0.0.1:{port}', transports=['websocket'])
+    return client
+
+def measure(publisher, received, messages, timeout):
+    """
+    Emit messages one at a time and wait for each to arrive; returns latencies in ms
+    """
+    latencies = []
+    for number in range(messages):
+        received['event'] = eventlet.event.Event()
+        publisher.emit('ping_room', {'room': ROOM, 'seq': number, 'sent': time.perf_counter()})
+        try:
+            with eventlet.Timeout(timeout):
+                latencies.append(received['event'].wait())
+        except eventlet.Timeout:
+            print(f'  message {number} not delivered within {timeout}s')
+    return latencies
+
+def summarize(values):
+    ordered = sorted(values)
+    return {
+        'p50': statistics.median(ordered),
+        'p95': ordered[max(int(len(ordered) * 0.95) - 1, 0)],
+        'p99': ordered[max(int(len(ordered) * 0.99) - 1, 0)],
+        'max': ordered[-1]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Socket.IO room delivery across nodes')
+    parser.add_argument('--port', type=int, default=5101, help='node A port; node B uses port + 1')
+    parser.add_argument('--channel', default='socketio_benchmark')
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    start_node(args.port, args.channel)
+    start_node(args.port + 1, args.channel)
+    eventlet.sleep(0.2)
+
+    received = {}
+    subscriber = connect(args.port + 1)
+
+    @subscriber.on('pong_room')
+    def pong_room(data):
+        event = received.get('event')
+        if event is not None and not event.ready():
+            event.send((time.perf_counter() - data['sent']) * 1000)
+
+    subscriber.call('join', {'room': ROOM})
+    publishers = {'same_node': connect(args.port + 1), 'cross_node': connect(args.port)}
+
+    print(f'Measuring {args.messages} sequential room emits per path...')
+    results = {}
+    for path, publisher in publishers.items():
+        measure(publisher, received, args.warmup, args.timeout)
+        latencies = measure(publisher, received, args.messages, args.timeout)
+        results[path] = (summarize(latencies), args.messages - len(latencies)) if latencies else None
+
+    print(f"\n{'path':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'lost':>7}")
+    for path, result in results.items():
+        if result is None:
+            print(f'{path:<12}  no messages delivered')
+            continue
+        stats, lost = result
+        print(f"{path:<12}{stats['p50']:>8.2f}ms{stats['p95']:>8.2f}ms{stats['p99']:>8.2f}ms{stats['max']:>8.2f}ms{lost:>7}")
+
+    for client in [subscriber, *publishers.values()]:
+        client.disconnect()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""
+Websocket capacity test: ramp up simulated widget clients against the
+Socket.IO server and report what one API process can hold.
+
+By default it starts its own API process (run.py) on a scratch SQLite
+database with the mock LLM, so it runs offline. Each simulated client starts
+a conversation over HTTP, joins its room, then sends messages with a random
+think time between them and leaves at the end of each step. Per step it
+reports server memory per connection, event loop lag (round trip of a
+no-work 'join' probe, plus the server's own lag monitor when an admin token
+is given), message round-trip percentiles and failures. One warm-up message
+goes through before the first step, so one-off costs (the first database
+connection, loading the tokenizer) are not counted. A step in which no
+message got a reply ends the run with a non-zero exit status.
+
+Run from api/src, e.g.:
+
+    python -m scripts.load_test_sockets --steps 100,500,1000 --duration 30
+    python -m scripts.load_test_sockets --url http://localhost:5000 --chatbot-id 1 --server-pid 1234
+
+Against an existing server, start it with LLM_PROVIDER=mock (and MOCK_LLM_LATENCY
+to taste) unless you mean to load the real provider.
+"""
+import eventlet
+if __name__ == '__main__':
+    # Green sockets for requests and the Socket.IO client; importing the module (tests) leaves the process alone
+    eventlet.monkey_patch()
+
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import requests
+import socketio
+from sqlalchemy import create_engine
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class SimulatedClient:
+    """
+    One widget: an HTTP-started conversation and a socket in its room
+    """
+    def __init__(self, url, chatbot_id, results, reply_timeout):
+        self.url = url
+        self.chatbot_id = chatbot_id
+        self.results = results
+        self.reply_timeout = reply_timeout
+        self.conversation_id = None
+        self.socket = socketio.Client(reconnection=False)
+        self._waiting = {}
+        self._joined = None
+
+        self.socket.on('message', self._on_message)
+        self.socket.on('joined', self._on_joined)
+        self.socket.on('error', self._on_error)
+
+    def start(self):
+        response = requests.post(f'{self.url}/api/conversations/', json={
+            'chatbot_id': self.chatbot_id,
+            'visitor_id': f'load-{uuid.uuid4().hex[:12]}'
+        }, timeout=30)
+        response.raise_for_status()
+        self.conversation_id = response.json()['conversation_id']
+
+        self.socket.connect(self.url, transports=['websocket'], wait_timeout=30)
+        self.probe()
+
+    def probe(self):
+        """
+        Round trip of a join (no DB or LLM work), in ms; None on timeout
+        """
+        self._joined = eventlet.event.Event()
+        started = time.perf_counter()
+        self.socket.emit('join', {'conversation_id': self.conversation_id})
+        try:
+            with eventlet.Timeout(self.reply_timeout):
+                self._joined.wait()
+        except eventlet.Timeout:
+            return None
+        return (time.perf_counter() - started) * 1000
+
+    def send(self, content):
+        key = uuid.uuid4().hex
+        reply = self._waiting[key] = eventlet.event.Event()
+        started = time.perf_counter()
+        self.socket.emit('message', {
+            'conversation_id': self.conversation_id,
+            'content': content,
+            'idempotency_key': key
+        })
+        try:
+            with eventlet.Timeout(self.reply_timeout):
+                error = reply.wait()
+        except eventlet.Timeout:
+            self.results['timeouts'] += 1
+            return
+        finally:
+            self._waiting.pop(key, None)
+
+        if error:
+            self.results['errors'][error] = self.results['errors'].get(error, 0) + 1
+        else:
+            self.results['round_trips'].append((time.perf_counter() - started) * 1000)
+
+    def stop(self):
+        try:
+            if self.conversation_id:
+                self.socket.emit('leave', {'conversation_id': self.conversation_id})
+            self.socket.disconnect()
+        except Exception:
+            pass
+
+    def _on_message(self, data):
+        reply = self._waiting.get(data.get('idempotency_key'))
+        if reply is not None and not reply.ready():
+            reply.send(None)
+
+    def _on_joined(self, data):
+        if self._joined is not None and not self._joined.ready():
+            self._joined.send()
+
+    def _on_error(self, data):
+        reply = self._waiting.get(data.get('idempotency_key'))
+        if reply is not None and not reply.ready():
+            reply.send(data.get('message', 'error'))
+        else:
+            message = data.get('message', 'error')
+            self.results['errors'][message] = self.results['errors'].get(message, 0) + 1
+
+def run_client(client, deadline, think_time, rng):
+    while time.monotonic() < deadline:
+        eventlet.sleep(rng.expovariate(1 / think_time) if think_time > 0 else 0)
+        if time.monotonic() >= deadline:
+            break
+        client.send(f'Load test message {rng.randint(1, 10_000)}')
+
+def probe_loop(clients, deadline, results, interval=1.0):
+    while time.monotonic() < deadline:
+        eventlet.sleep(interval)
+        if clients:
+            lag = random.choice(clients).probe()
+            if lag is not None:
+                results['probes'].append(lag)
+
+def rss_kb(pid):
+    """
+    Resident memory of a process in KB (Linux /proc); None when unavailable
+    """
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+def server_loop_lag(url, token):
+    if not token:
+        return None
+    try:
+        response = requests.get(f'{url}/api/analytics/socket-workers', timeout=5,
+                                headers={'Authorization': f'Bearer {token}'})
+        return response.json().get('loop_lag') if response.ok else None
+    except requests.RequestException:
+        return None
+
+def start_server(port, database_path, mock_latency, log_path):
+    """
+    Seed a scratch SQLite database with one chatbot and start run.py against it,
+    logging to log_path. Rate limits are off: every simulated client shares one IP.
+    """
+    database_url = f'sqlite:///{database_path}'
+    sys.path.insert(0, SRC_DIR)
+    from models import db
+
+    engine = create_engine(database_url)
+    db.metadata.create_all(engine)
+    tables = db.metadata.tables
+    with engine.begin() as connection:
+        connection.execute(tables['organization'].insert(), [{'id': 1, 'name': 'Load Test Org'}])
+        connection.execute(tables['chat_bot'].insert(), [{'id': 1, 'name': 'Load Test Bot', 'organization_id': 1}])
+
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DATABASE_URL=database_url,
+        LLM_PROVIDER='mock',
+        MOCK_LLM_LATENCY=mock_latency,
+        SOCKETIO_ASYNC_MODE='eventlet',
+        CONVERSATION_SWEEPER_ENABLED='false',
+        RATE_LIMITS_ENABLED='false'
+    )
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, 'run.py'], cwd=SRC_DIR, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+
+    url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            if requests.get(f'{url}/health', timeout=1).ok:
+                return server, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError('API server did not start')
+
+def warm_up(url, chatbot_id, timeout):
+    """
+    Send one message and wait for its reply; raises if none comes
+    """
+    results = new_results()
+    client = SimulatedClient(url, chatbot_id, results, timeout)
+    try:
+        client.start()
+        client.send('Load test warm-up')
+    finally:
+        client.stop()
+    if not results['round_trips']:
+        reason = next(iter(results['errors']), None) or f'no reply within {timeout:.0f}s'
+        raise RuntimeError(f'Warm-up message failed: {reason}')
+    return results['round_trips'][0]
+
+def new_results():
+    """
+    Counters the simulated clients of one step (or the warm-up) record into
+    """
+    return {'round_trips': [], 'probes': [], 'timeouts': 0, 'errors': {}, 'connect_failures': 0}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else None
+
+def summarize_step(results, clients, connect_seconds, rss=None, baseline_rss=None, server_lag=None):
+    """
+    One report row from a step's results; memory per connection is the growth
+    over the baseline (KB) spread across the connected clients
+    """
+    round_trips = results['round_trips']
+    probes = results['probes']
+    per_connection = (rss - baseline_rss) / clients if rss and baseline_rss and clients else None
+    return {
+        'clients': clients,
+        'connect_s': connect_seconds,
+        'connect_failures': results['connect_failures'],
+        'messages': len(round_trips),
+        'rtt_p50': statistics.median(round_trips) if round_trips else None,
+        'rtt_p95': percentile(round_trips, 0.95),
+        'rtt_p99': percentile(round_trips, 0.99),
+        'lag_p50': statistics.median(probes) if probes else None,
+        'lag_p99': percentile(probes, 0.99),
+        'server_lag': server_lag,
+        'rss_mb': rss / 1024 if rss else None,
+        'kb_per_connection': per_connection,
+        'timeouts': results['timeouts'],
+        'errors': dict(results['errors'])
+    }
+
+def step_failed(row):
+    """
+    A step in which no message got a reply measured nothing but the failure
+    """
+    return row['messages'] == 0
+
+def fmt(value, unit='ms'):
+    return f'{value:.1f}{unit}' if value is not None else '-'
+
+def main():
+    parser = argparse.ArgumentParser(description='Ramp simulated widget sockets against the API')
+    parser.add_argument('--url', help='existing API to test; default starts one with the mock LLM')
+    parser.add_argument('--chatbot-id', type=int, default=1)
+    parser.add_argument('--server-pid', type=int, help='PID of an existing server, for memory readings')
+    parser.add_argument('--admin-token', help='JWT for /api/analytics/socket-workers (server-side loop lag)')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--mock-latency', default='lognormal:-0.7,0.5', help='MOCK_LLM_LATENCY for the started server')
+    parser.add_argument('--steps', default='50,200,500,1000', help='client counts to ramp through')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic per step')
+    parser.add_argument('--think-time', type=float, default=5, help='mean seconds between a client\'s messages')
+    parser.add_argument('--connect-concurrency', type=int, default=50)
+    parser.add_argument('--reply-timeout', type=float, default=30)
+    parser.add_argument('--warm-up-timeout', type=float, default=120, help='seconds to wait for the warm-up reply')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    server = None
+    log_path = None
+    url = args.url
+    pid = args.server_pid
+    if not url:
+        scratch = tempfile.mkdtemp(prefix='clai_load_')
+        log_path = os.path.join(scratch, 'server.log')
+        server, url = start_server(args.port, os.path.join(scratch, 'load.db'), args.mock_latency, log_path)
+        pid = server.pid
+        print(f'Started API on {url} (pid {pid}, mock LLM {args.mock_latency}, log {log_path})')
+
+    rng = random.Random(args.seed)
+    clients = []
+    rows = []
+    failed_step = None
+
+    try:
+        print(f'Warm-up reply in {warm_up(url, args.chatbot_id, args.warm_up_timeout):.0f}ms')
+        baseline_rss = rss_kb(pid) if pid else None
+
+        for target in [int(step) for step in args.steps.split(',')]:
+            results = new_results()
+
+            # Connect up to the target, a bounded number at a time
+            pool = eventlet.GreenPool(args.connect_concurrency)
+            connect_started = time.monotonic()
+
+            def connect_one(_):
+                client = SimulatedClient(url, args.chatbot_id, results, args.reply_timeout)
+                try:
+                    client.start()
+                    clients.append(client)
+                except Exception:
+                    results['connect_failures'] += 1
+                    client.stop()
+
+            list(pool.imap(connect_one, range(max(0, target - len(clients)))))
+            connect_seconds = time.monotonic() - connect_started
+
+            # Drive traffic for the step
+            deadline = time.monotonic() + args.duration
+            traffic = eventlet.GreenPool(len(clients) + 1)
+            for client in list(clients):
+                traffic.spawn(run_client, client, deadline, args.think_time, random.Random(rng.random()))
+            traffic.spawn(probe_loop, clients, deadline, results)
+            traffic.waitall()
+
+            row = summarize_step(results, len(clients), connect_seconds, rss=rss_kb(pid) if pid else None,
+                                 baseline_rss=baseline_rss, server_lag=server_loop_lag(url, args.admin_token))
+            rows.append(row)
+            print(f"step {target}: {row['clients']} connected, {row['messages']} replies, "
+                  f"{row['timeouts']} timeouts, {sum(row['errors'].values())} errors")
+            if step_failed(row):
+                failed_step = target
+                break
+    finally:
+        for client in clients:
+            client.stop()
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    print(f"\n{'clients':>8}{'conn s':>8}{'fail':>6}{'msgs':>7}{'rtt p50':>10}{'rtt p95':>10}{'rtt p99':>10}"
+          f"{'lag p50':>10}{'lag p99':>10}{'rss':>9}{'KB/conn':>9}{'timeout':>9}{'errors':>8}")
+    for row in rows:
+        print(f"{row['clients']:>8}{row['connect_s']:>8.1f}{row['connect_failures']:>6}{row['messages']:>7}"
+              f"{fmt(row['rtt_p50']):>10}{fmt(row['rtt_p95']):>10}{fmt(row['rtt_p99']):>10}"
+              f"{fmt(row['lag_p50']):>10}{fmt(row['lag_p99']):>10}{fmt(row['rss_mb'], 'MB'):>9}"
+              f"{fmt(row['kb_per_connection'], ''):>9}{row['timeouts']:>9}{sum(row['errors'].values()):>8}")
+        if row['server_lag']:
+            print(f"{'':>8}server loop lag: {row['server_lag']}")
+        for message, count in row['errors'].items():
+            print(f"{'':>8}{count} x {message}")
+
+    if failed_step is not None:
+        log_hint = f'; see the server log at {log_path}' if log_path else ''
+        sys.exit(f'\nStep {failed_step}: no message got a reply, so the results are meaningless{log_hint}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+End idle conversations once (e.g. from cron instead of the in-process
+sweeper started by run.py). Run from api/src:
+
+    python -m scripts.sweep_idle_conversations --idle-timeout 1800
+"""
+import argparse
+
+from app import app
+from services.conversation_sweeper import ConversationSweeper
+
+def main():
+    parser = argparse.ArgumentParser(description='End conversations with no recent messages')
+    parser.add_argument('--idle-timeout', type=int, default=1800, help='seconds without a message before a conversation ends')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--batch-pause', type=float, default=0.5)
+    parser.add_argument('--max-batches', type=int, default=1000)
+    args = parser.parse_args()
+
+    sweeper = ConversationSweeper(
+        idle_timeout=args.idle_timeout,
+        batch_size=args.batch_size,
+        batch_pause=args.batch_pause,
+        max_batches=args.max_batches
+    )
+
+    with app.app_context():
+        ended = sweeper.sweep()
+
+    if ended is None:
+        print('Another worker is sweeping; nothing done')
+    else:
+        print(f'Ended {ended} idle conversations')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+from config.config import setting
+from models import db, Conversation, ConversationArchive, Message
+
+logger = logging.getLogger(__name__)
+
+def available_codecs():
+    return ['gzip', 'zstd'] if zstandard is not None else ['gzip']
+
+def compress(data, codec='gzip'):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd archives need the zstandard package')
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f'Unknown archive codec: {codec}')
+
+def decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError('zstd archives need the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'gzip':
+        return gzip.decompress(data)
+    raise ValueError(f'Unknown archive codec: {codec}')
+
+class ArchiveService:
+    """
+    Moves the messages of long-ended conversations out of the message table
+    into one compressed blob per conversation (ConversationArchive). The
+    conversation row and its metrics stay, so analytics rollups and leads are
+    unaffected; transcripts are read back through load_transcript().
+    """
+    def __init__(self, older_than_days=None, codec=None, batch_size=100):
+        self.older_than_days = older_than_days if older_than_days is not None else setting('ARCHIVE_AFTER_DAYS')
+        self.codec = codec or setting('ARCHIVE_CODEC')
+        self.batch_size = batch_size
+
+        if self.codec not in available_codecs():
+            logger.warning('Archive codec %s unavailable, using gzip', self.codec)
+            self.codec = 'gzip'
+
+    def archive_ended_conversations(self, limit=None):
+        """
+        Archive conversations that ended more than older_than_days ago, one
+        transaction per batch. Returns counts of conversations and messages archived.
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.older_than_days)
+        totals = {'conversations': 0, 'messages': 0, 'original_bytes': 0, 'compressed_bytes': 0}
+        last_id = 0
+
+        while limit is None or totals['conversations'] < limit:
+            batch_size = self.batch_size if limit is None else min(self.batch_size, limit - totals['conversations'])
+            conversation_ids = [row.id for row in db.session.query(Conversation.id).filter(
+                Conversation.status == 'ended',
+                Conversation.ended_at < cutoff,
+                Conversation.archived_at.is_(None),
+                Conversation.id > last_id
+            ).order_by(Conversation.id).limit(batch_size)]
+
+            if not conversation_ids:
+                break
+
+            for key, value in self._archive_batch(conversation_ids).items():
+                totals[key] += value
+            last_id = conversation_ids[-1]
+
+        return totals
+
+    def load_transcript(self, conversation_id):
+        """
+        Message dicts (as Message.to_dict()) for an archived conversation, oldest first
+        """
+        archive = ConversationArchive.query.filter_by(conversation_id=conversation_id).first()
+        if not archive:
+            return []
+
+        return json.loads(decompress(archive.payload, archive.codec))
+
+    def _archive_batch(self, conversation_ids):
+        totals = {'conversations': 0, 'messages': 0, 'original_bytes': 0, 'compressed_bytes': 0}
+
+        messages_by_conversation = {conversation_id: [] for conversation_id in conversation_ids}
+        for message in Message.query.filter(Message.conversation_id.in_(conversation_ids)).order_by(
+            Message.conversation_id, Message.timestamp, Message.id
+        ):
+            messages_by_conversation[message.conversation_id].append(message)
+
+        archived_at = datetime.utcnow()
+        for conversation_id, messages in messages_by_conversation.items():
+            data = json.dumps([message.to_dict() for message in messages], separators=(',', ':')).encode('utf-8')
+            payload = compress(data, self.codec)
+
+            db.session.add(ConversationArchive(
+                conversation_id=conversation_id,
+                codec=self.codec,
+                payload=payload,
+                message_count=len(messages),
+                original_bytes=len(data),
+                compressed_bytes=len(payload),
+                first_message_at=messages[0].timestamp if messages else None,
+                last_message_at=messages[-1].timestamp if messages else None,
+                archived_at=archived_at
+            ))
+
+            totals['conversations'] += 1
+            totals['messages'] += len(messages)
+            totals['original_bytes'] += len(data)
+            totals['compressed_bytes'] += len(payload)
+
+        # Set-based delete and flag update; the archive rows land in the same transaction
+        Message.query.filter(Message.conversation_id.in_(conversation_ids)).delete(synchronize_session=False)
+        Conversation.query.filter(Conversation.id.in_(conversation_ids)).update(
+            {Conversation.archived_at: archived_at}, synchronize_session=False
+        )
+        db.session.commit()
+        db.session.expunge_all()
+
+        logger.info('Archived %d conversations (%d messages, %d -> %d bytes)', totals['conversations'],
+                    totals['messages'], totals['original_bytes'], totals['compressed_bytes'])
+        return totals
@@ -0,0 +1,257 @@
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+from models import ChatBot
+from utils.redis_store import get_redis
+
+INVALIDATION_CHANNEL = 'chatbot_cache:invalidate'
+
+logger = logging.getLogger(__name__)
+
+class FrozenDict(dict):
+    """
+    dict that refuses changes; still serializes with json and jsonify
+    """
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('ChatBotSnapshot config is read-only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    __ior__ = _read_only
+
+def freeze(value):
+    """
+    Deep read-only copy of decoded JSON: dicts become FrozenDicts, lists tuples
+    """
+    if isinstance(value, dict):
+        frozen = FrozenDict()
+        for key, item in value.items():
+            dict.__setitem__(frozen, key, freeze(item))
+        return frozen
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    """
+    Mutable deep copy of a frozen value
+    """
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+def normalize_message(content):
+    """
+    Key for matching canned responses: lowercase, single spaces, no trailing punctuation
+    """
+    return re.sub(r'\s+', ' ', (content or '').strip().lower()).rstrip('.!?,;: ')
+
+def build_canned_responses(config):
+    """
+    Precompute {normalized message: (response, kind)} from a chatbot config's
+    openingMessages (first turn only) and quickReplies (any turn)
+    """
+    responses = {}
+    for kind, key in (('opening', 'openingMessages'), ('quick_reply', 'quickReplies')):
+        for entry in config.get(key) or []:
+            if not isinstance(entry, dict) or not entry.get('response'):
+                continue
+            message = entry.get('message') or entry.get('label')
+            if message:
+                responses[normalize_message(message)] = (entry['response'], kind)
+    return responses
+
+class ChatBotSnapshot:
+    """
+    Read-only copy of a chatbot with its config already decoded (and deeply
+    frozen, so a caller cannot change the copy other requests share).
+
+    Exposes the same attributes the chat path reads from ChatBot, so it can
+    be passed to ConversationService in place of the model.
+    """
+    __slots__ = ('id', 'name', 'organization_id', 'allowed_responses', 'forbidden_responses',
+                 'config', 'canned_responses', 'subscription_tier', 'created_at', 'updated_at')
+
+    def __init__(self, chatbot):
+        values = {
+            'id': chatbot.id,
+            'name': chatbot.name,
+            'organization_id': chatbot.organization_id,
+            'allowed_responses': chatbot.allowed_responses,
+            'forbidden_responses': chatbot.forbidden_responses,
+            'config': freeze(chatbot.config),
+            'canned_responses': MappingProxyType(build_canned_responses(chatbot.config)),
+            'subscription_tier': chatbot.organization.subscription_tier if getattr(chatbot, 'organization', None) else None,
+            'created_at': chatbot.created_at,
+            'updated_at': chatbot.updated_at
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ChatBotSnapshot is read-only')
+
+    def canned_response(self, content, first_turn=False):
+        """
+        Precomputed (response, kind) for an opening message or quick reply, or None
+        """
+        match = self.canned_responses.get(normalize_message(content))
+        if match and (match[1] != 'opening' or first_turn):
+            return match
+        return None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'organization_id': self.organization_id,
+            'config': thaw(self.config),
+            'allowed_responses': self.allowed_responses,
+            'forbidden_responses': self.forbidden_responses,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class ChatBotCache:
+    """
+    Per-process read-through cache of chatbot snapshots keyed by id and updated_at.
+
+    Updates publish an invalidation on a Redis channel so every worker drops
+    its copy; a TTL bounds staleness if an invalidation is ever missed. Lookups
+    never touch Redis: the listener thread resubscribes after a dropped
+    connection (clearing the cache, since invalidations may have been lost)
+    and a failed publish only logs, so a Redis outage degrades to TTL expiry.
+    """
+    def __init__(self, ttl_seconds=300, retry_delay=1.0):
+        self.ttl_seconds = ttl_seconds
+        self.retry_delay = retry_delay
+        self._entries = {}  # chatbot_id -> (snapshot, cached_at)
+        self._invalidated = {}  # chatbot_id -> updated_at from the last invalidation
+        self._lock = threading.Lock()
+        self._listener = None
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'publish_errors': 0,
+            'listener_errors': 0
+        }
+
+    def init_app(self, app):
+        self.ttl_seconds = app.config['CHATBOT_CACHE_TTL']
+
+    def get(self, chatbot_id):
+        """
+        Get a snapshot of a chatbot, loading it from the database on a miss
+        """
+        self._ensure_listener()
+
+        with self._lock:
+            entry = self._entries.get(chatbot_id)
+            if entry and time.monotonic() - entry[1] < self.ttl_seconds:
+                self._stats['hits'] += 1
+                return entry[0]
+            self._stats['misses'] += 1
+
+        chatbot = ChatBot.query.get(chatbot_id)
+        if not chatbot:
+            return None
+
+        snapshot = ChatBotSnapshot(chatbot)
+        with self._lock:
+            # Don't cache a row read before an invalidation we've already seen
+            invalidated_at = self._invalidated.get(chatbot_id)
+            if invalidated_at is None or (snapshot.updated_at and snapshot.updated_at >= invalidated_at):
+                self._entries[chatbot_id] = (snapshot, time.monotonic())
+
+        return snapshot
+
+    def invalidate(self, chatbot_id, updated_at=None):
+        """
+        Drop a chatbot from this worker's cache and tell every other worker to do the same
+        """
+        self._drop(chatbot_id, updated_at)
+        try:
+            get_redis().publish(INVALIDATION_CHANNEL, json.dumps({
+                'chatbot_id': chatbot_id,
+                'updated_at': updated_at.isoformat() if updated_at else None
+            }))
+        except Exception:
+            # Other workers pick the change up when their copy's TTL runs out
+            logger.exception('Could not publish chatbot cache invalidation for %s', chatbot_id)
+            with self._lock:
+                self._stats['publish_errors'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+    def _drop(self, chatbot_id, updated_at=None):
+        with self._lock:
+            self._entries.pop(chatbot_id, None)
+            if updated_at is not None:
+                self._invalidated[chatbot_id] = updated_at
+            self._stats['invalidations'] += 1
+
+    def _ensure_listener(self):
+        """
+        Start the background thread that applies invalidations from other workers
+        """
+        if self._listener is not None:
+            return
+
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name='chatbot-cache-invalidation', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        """
+        Apply invalidations forever, resubscribing whenever the connection drops
+        """
+        subscribed_before = False
+        while True:
+            pubsub = None
+            try:
+                pubsub = get_redis().pubsub()
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                if subscribed_before:
+                    # Invalidations sent while we were away are lost; start clean
+                    self._drop_all()
+                subscribed_before = True
+
+                for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._apply(message['data'])
+            except Exception:
+                logger.exception('Chatbot cache invalidation listener failed, resubscribing')
+                with self._lock:
+                    self._stats['listener_errors'] += 1
+                time.sleep(self.retry_delay)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _apply(self, payload):
+        try:
+            data = json.loads(payload)
+            updated_at = datetime.fromisoformat(data['updated_at']) if data.get('updated_at') else None
+            self._drop(data['chatbot_id'], updated_at)
+        except (ValueError, KeyError, TypeError):
+            pass
+
+    def _drop_all(self):
+        with self._lock:
+            self._entries.clear()
+
+chatbot_cache = ChatBotCache()
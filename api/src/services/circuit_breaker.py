@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+from config.config import setting
+
+class CircuitOpenError(Exception):
+    """Raised when a model is skipped because its circuit is open"""
+    def __init__(self, model_name):
+        super().__init__(f'Circuit open for {model_name}')
+        self.model_name = model_name
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker driven by error rate and slow-call rate over a
+    rolling window of recent calls.
+
+    closed -> open when either rate crosses its threshold, open -> half_open
+    after the cooldown, and half_open lets a single probe through to decide
+    whether to close again.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, window_size=50, min_calls=10, error_rate_threshold=0.5,
+                 slow_call_seconds=10.0, slow_rate_threshold=0.5, cooldown_seconds=30.0):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        self._calls = deque(maxlen=window_size)  # (success, latency_seconds)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def allow_request(self):
+        """
+        Check whether a call may be sent to this model right now
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def cancel_request(self):
+        """
+        Give back an allowed request that never reached the model
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self, latency):
+        """
+        Record a completed call
+        """
+        self._record(True, latency)
+
+    def record_failure(self, latency):
+        """
+        Record a failed or timed out call
+        """
+        self._record(False, latency)
+
+    def latency_percentile(self, percentile=0.95):
+        """
+        Latency percentile of recent successful calls, or None without enough data
+        """
+        with self._lock:
+            latencies = sorted(latency for success, latency in self._calls if success)
+
+        if len(latencies) < self.min_calls:
+            return None
+
+        index = min(len(latencies) - 1, int(percentile * len(latencies)))
+        return latencies[index]
+
+    def stats(self):
+        """
+        Snapshot of the breaker state for monitoring
+        """
+        with self._lock:
+            calls = list(self._calls)
+            state = self._current_state()
+
+        return {
+            'state': state,
+            'calls': len(calls),
+            'error_rate': self._rate(calls, lambda success, latency: not success),
+            'slow_rate': self._rate(calls, lambda success, latency: latency >= self.slow_call_seconds)
+        }
+
+    def _record(self, success, latency):
+        with self._lock:
+            state = self._current_state()
+            self._calls.append((success, latency))
+            slow = latency >= self.slow_call_seconds
+
+            if state == self.HALF_OPEN:
+                self._probe_in_flight = False
+                if success and not slow:
+                    self._state = self.CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+
+            if state == self.CLOSED and len(self._calls) >= self.min_calls:
+                calls = list(self._calls)
+                error_rate = self._rate(calls, lambda s, l: not s)
+                slow_rate = self._rate(calls, lambda s, l: l >= self.slow_call_seconds)
+                if error_rate >= self.error_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                    self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def _current_state(self):
+        """
+        Current state, moving open -> half_open once the cooldown has passed (lock held)
+        """
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @staticmethod
+    def _rate(calls, predicate):
+        if not calls:
+            return 0.0
+        return sum(1 for success, latency in calls if predicate(success, latency)) / len(calls)
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(model_name):
+    """
+    Get the process-wide circuit breaker for a model, configured from the app config when first used
+    """
+    with _breakers_lock:
+        if model_name not in _breakers:
+            _breakers[model_name] = CircuitBreaker(
+                model_name,
+                window_size=setting('LLM_BREAKER_WINDOW'),
+                min_calls=setting('LLM_BREAKER_MIN_CALLS'),
+                error_rate_threshold=setting('LLM_BREAKER_ERROR_RATE'),
+                slow_call_seconds=setting('LLM_BREAKER_SLOW_CALL_SECONDS'),
+                slow_rate_threshold=setting('LLM_BREAKER_SLOW_RATE'),
+                cooldown_seconds=setting('LLM_BREAKER_COOLDOWN')
+            )
+        return _breakers[model_name]
+
+def circuit_breaker_stats():
+    """
+    Stats for every model that has a breaker in this process
+    """
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.stats() for name, breaker in breakers.items()}
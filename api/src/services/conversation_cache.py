@@ -0,0 +1,257 @@
+import json
+import logging
+import threading
+from datetime import datetime
+
+from models import Conversation, Message
+from utils.redis_store import StoreError, get_redis
+from .chatbot_cache import chatbot_cache
+from .message_buffer import message_buffer
+
+KEY_PREFIX = 'conversation_state'
+
+logger = logging.getLogger(__name__)
+
+class ConversationState:
+    """
+    Read-only view of an active conversation: the fields the chat path needs
+    and the most recent messages, oldest first.
+    """
+    __slots__ = ('id', 'chatbot_id', 'organization_id', 'visitor_id', 'status', 'messages')
+
+    def __init__(self, id, chatbot_id, organization_id, visitor_id, status, messages=()):
+        values = {
+            'id': id,
+            'chatbot_id': chatbot_id,
+            'organization_id': organization_id,
+            'visitor_id': visitor_id,
+            'status': status,
+            'messages': tuple(messages)
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('ConversationState is read-only')
+
+    @property
+    def is_active(self):
+        return self.status == 'active'
+
+    def history(self):
+        """
+        Recent messages as transient Message objects, for code that expects the model
+        """
+        return [
+            Message(
+                conversation_id=self.id,
+                sender_type=message['sender_type'],
+                content=message['content'],
+                timestamp=datetime.fromisoformat(message['timestamp']) if message.get('timestamp') else None
+            )
+            for message in self.messages
+        ]
+
+    def to_json(self):
+        return json.dumps({
+            'id': self.id,
+            'chatbot_id': self.chatbot_id,
+            'organization_id': self.organization_id,
+            'visitor_id': self.visitor_id,
+            'status': self.status
+        })
+
+class ConversationCache:
+    """
+    Write-through cache of active conversation state in Redis (or the local store).
+
+    Each conversation has a small JSON record and a capped list holding the
+    recent message window. Messages are appended after they are written, so a
+    turn on a warm conversation needs no Conversation or Message reads. Entries
+    are removed when the conversation ends and expire after idle_ttl seconds
+    without a message.
+
+    The cache is an optimisation only: when the store fails, reads fall back
+    to the database and writes (put, append, evict) are skipped and logged.
+    """
+    def __init__(self, idle_ttl=1800, window=10):
+        self.idle_ttl = idle_ttl
+        self.window = window
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'appends': 0,
+            'evictions': 0,
+            'store_errors': 0
+        }
+
+    def init_app(self, app):
+        self.idle_ttl = app.config['CONVERSATION_CACHE_IDLE_TTL']
+        self.window = app.config['CONVERSATION_CACHE_WINDOW']
+
+    def get(self, conversation_id):
+        """
+        Get the state of a conversation, loading it from the database on a miss.
+        Returns None if the conversation does not exist.
+        """
+        try:
+            store = get_redis()
+            raw = store.get(self._key(conversation_id))
+            if raw is not None:
+                messages = store.lrange(self._messages_key(conversation_id), -self.window, -1)
+        except StoreError:
+            self._store_error('read', conversation_id)
+            return self._load(conversation_id)
+
+        if raw is not None:
+            self._count('hits')
+            return ConversationState(
+                messages=[json.loads(message) for message in messages],
+                **json.loads(raw)
+            )
+
+        self._count('misses')
+        return self._load(conversation_id)
+
+    def put(self, conversation, organization_id, messages=()):
+        """
+        Cache a conversation's state, e.g. right after it is started
+        """
+        state = ConversationState(
+            id=conversation.id,
+            chatbot_id=conversation.chatbot_id,
+            organization_id=organization_id,
+            visitor_id=conversation.visitor_id,
+            status=conversation.status or 'active',
+            messages=[self._message_fields(message) for message in messages]
+        )
+        if state.is_active:
+            self._write(state)
+        return state
+
+    def append_message(self, conversation_id, sender_type, content, timestamp=None):
+        """
+        Add a written message to the cached window and refresh the idle timeout.
+        A cold conversation is left alone; the next read loads it from the database.
+        Returns whether the message was added.
+        """
+        key = self._key(conversation_id)
+        messages_key = self._messages_key(conversation_id)
+        try:
+            store = get_redis()
+            if not store.exists(key):
+                return False
+
+            store.rpush(messages_key, json.dumps({
+                'sender_type': sender_type,
+                'content': content,
+                'timestamp': timestamp.isoformat() if timestamp else None
+            }))
+            store.ltrim(messages_key, -self.window, -1)
+            store.expire(messages_key, self.idle_ttl)
+            store.expire(key, self.idle_ttl)
+        except StoreError:
+            self._store_error('append to', conversation_id)
+            # The window may now be missing this message; have the next read reload it if the store allows
+            self.evict(conversation_id)
+            return False
+
+        self._count('appends')
+        return True
+
+    def evict(self, conversation_id):
+        """
+        Drop a conversation, e.g. when it ends. If the store is unavailable the
+        entry is left to expire after idle_ttl.
+        """
+        try:
+            get_redis().delete(self._key(conversation_id), self._messages_key(conversation_id))
+        except StoreError:
+            self._store_error('evict', conversation_id)
+            return
+        self._count('evictions')
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle_ttl=self.idle_ttl, window=self.window)
+
+    def _load(self, conversation_id):
+        conversation = Conversation.query.get(conversation_id)
+        if not conversation:
+            return None
+
+        organization_id = conversation.organization_id
+        if organization_id is None:
+            # Not backfilled yet
+            chatbot = chatbot_cache.get(conversation.chatbot_id)
+            organization_id = chatbot.organization_id if chatbot else None
+
+        messages = Message.query.filter_by(conversation_id=conversation_id).order_by(
+            Message.timestamp.desc()
+        ).limit(self.window).all()
+        messages.reverse()
+
+        # Include messages still waiting in the write-behind buffer
+        messages = [self._message_fields(message) for message in messages]
+        messages += [
+            {
+                'sender_type': row['sender_type'],
+                'content': row['content'],
+                'timestamp': self._isoformat(row['timestamp'])
+            }
+            for row in message_buffer.pending_for(conversation_id)
+        ]
+
+        state = ConversationState(
+            id=conversation.id,
+            chatbot_id=conversation.chatbot_id,
+            organization_id=organization_id,
+            visitor_id=conversation.visitor_id,
+            status=conversation.status,
+            messages=messages[-self.window:]
+        )
+        if state.is_active:
+            self._write(state)
+        return state
+
+    def _write(self, state):
+        messages_key = self._messages_key(state.id)
+        try:
+            store = get_redis()
+            store.delete(messages_key)
+            if state.messages:
+                store.rpush(messages_key, *[json.dumps(message) for message in state.messages])
+                store.expire(messages_key, self.idle_ttl)
+            store.set(self._key(state.id), state.to_json(), ex=self.idle_ttl)
+        except StoreError:
+            self._store_error('cache', state.id)
+
+    def _store_error(self, action, conversation_id):
+        logger.warning('Could not %s conversation %s in the cache store', action, conversation_id, exc_info=True)
+        self._count('store_errors')
+
+    def _message_fields(self, message):
+        """
+        A message as kept in the window, with the ISO timestamp a cached read returns
+        """
+        return {
+            'sender_type': message.sender_type,
+            'content': message.content,
+            'timestamp': self._isoformat(message.timestamp)
+        }
+
+    def _isoformat(self, timestamp):
+        return timestamp.isoformat() if hasattr(timestamp, 'isoformat') else timestamp
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _key(self, conversation_id):
+        return f'{KEY_PREFIX}:{conversation_id}'
+
+    def _messages_key(self, conversation_id):
+        return f'{KEY_PREFIX}:{conversation_id}:messages'
+
+conversation_cache = ConversationCache()
@@ -2,9 +2,21 @@ import json
 import time
 from datetime import datetime
 
-from models import db, Conversation, Message, ConversationMetrics, ChatBot, KnowledgeBase
+from flask import current_app
+from sqlalchemy import func, insert
+
+from config.config import setting
+from models import db, Conversation, Message, ConversationMetrics, ChatBot, KnowledgeBase, Organization
 from .llm_service import LLMService
+from .model_router import ModelRouter
 from .knowledge_service import KnowledgeService
+from .conversation_cache import conversation_cache
+from .chatbot_cache import ChatBotSnapshot, build_canned_responses, normalize_message
+from .archive_service import ArchiveService
+from .message_buffer import message_buffer, write_behind_enabled
+from utils.deadline import Deadline, apply_statement_timeout
+from utils.pagination import after_keyset, decode_cursor, encode_cursor
+from utils.tokens import count_text_tokens
 
 class ConversationService:
     def __init__(self, chatbot, organization_id, visitor_id=None):
@@ -14,8 +26,25 @@ class ConversationService:
         self.chatbot = chatbot
         self.organization_id = organization_id
         self.visitor_id = visitor_id
-        self.llm_service = LLMService()
+        
+        organization = Organization.query.get(organization_id)
+        self.llm_settings = organization.llm_settings if organization else {}
+        self.model_router = ModelRouter(
+            subscription_tier=organization.subscription_tier if organization else None,
+            llm_settings=self.llm_settings
+        )
+        self.llm_service = LLMService(
+            model_name=self.model_router.model,
+            organization_id=organization_id,
+            llm_settings=self.llm_settings
+        )
         self.knowledge_service = KnowledgeService()
+        self.archive_service = ArchiveService()
+        
+        # Budget thresholds (seconds) for shrinking work as the request deadline approaches
+        self.kb_min_budget = setting('KB_MIN_BUDGET_SECONDS')
+        self.llm_min_budget = setting('LLM_MIN_BUDGET_SECONDS')
+        self.llm_low_budget = setting('LLM_LOW_BUDGET_SECONDS')
     
     def start_conversation(self, utm_params=None, referrer=None):
         """
@@ -24,6 +53,7 @@ class ConversationService:
         # Create conversation
         conversation = Conversation(
             chatbot_id=self.chatbot.id,
+            organization_id=self.organization_id,
             visitor_id=self.visitor_id,
             status='active',
             utm_source=utm_params.get('source') if utm_params else None,
@@ -33,43 +63,42 @@ class ConversationService:
         )
         
         db.session.add(conversation)
-        db.session.commit()
+        db.session.flush()
         
-        # Create metrics entry
+        # Create metrics entry in the same transaction
         metrics = self._create_metrics_entry(conversation)
         
+        db.session.commit()
+        
+        conversation_cache.put(conversation, self.organization_id)
+        
         return conversation
     
-    def process_message(self, conversation_id, message_content):
-        """
-        Process a user message and generate a response
+    def process_message(self, conversation_id, message_content, deadline=None):
         """
-        # Get conversation
-        conversation = Conversation.query.get(conversation_id)
-        if not conversation or conversation.status != 'active':
-            return {'error': 'Conversation not found or inactive'}
+        Process a user message and generate a response.
         
-        # Save user message
-        user_message = Message(
-            conversation_id=conversation_id,
-            sender_type='human',
-            content=message_content
-        )
-        db.session.add(user_message)
-        db.session.commit()
+        deadline is the request's Deadline; knowledge base search is skipped and
+        the cheaper model used as the remaining budget runs low.
         
-        # Get conversation history
-        history = self._get_conversation_history(conversation_id)
+        The user message is written with a single-statement insert and committed
+        before the LLM call so it is durable; the bot message and metrics are
+        then written in one transaction, whose statement timeout is set from
+        the budget left at that point. In write-behind mode both messages and
+        the metric increments are queued instead (see MessageBuffer).
+        """
+        if deadline is None:
+            deadline = Deadline.for_request()
         
-        # Check knowledge base first
-        kb_response = self._check_knowledge_base(message_content)
+        apply_statement_timeout(db.session, deadline)
         
-        if kb_response:
-            response_content = kb_response
-            model_used = "knowledge_base"
-        else:
-            # Generate bot response using LLM
-            system_template = f"""
+        # Get conversation state (cached while the conversation is active)
+        state = conversation_cache.get(conversation_id)
+        if not state or not state.is_active:
+            return {'error': 'Conversation not found or inactive'}
+        
+        # Read chatbot settings now; committing below expires loaded ORM objects
+        system_template = f"""
             You are a helpful assistant for {self.chatbot.name}.
             
             DO SAY:
@@ -78,38 +107,158 @@ class ConversationService:
             DO NOT SAY:
             {self.chatbot.forbidden_responses}
             """
-            
+        
+        # Save user message (lightweight insert, durable before the LLM call)
+        user_token_count = count_text_tokens(message_content, self.llm_service.model_name)
+        user_timestamp = datetime.utcnow()
+        if not self._buffer_message(conversation_id, 'human', message_content,
+                                    token_count=user_token_count, timestamp=user_timestamp):
+            db.session.execute(
+                insert(Message).values(
+                    conversation_id=conversation_id,
+                    sender_type='human',
+                    content=message_content,
+                    timestamp=user_timestamp,
+                    token_count=user_token_count
+                )
+            )
+            db.session.commit()
+        conversation_cache.append_message(conversation_id, 'human', message_content, user_timestamp)
+        
+        # Get conversation history: the cached window was read before the new message, so add it
+        history = state.history() + [
+            Message(conversation_id=conversation_id, sender_type='human', content=message_content, timestamp=user_timestamp)
+        ]
+        
+        # Configured opening messages and quick replies are answered from memory
+        first_turn = not any(message['sender_type'] == 'human' for message in state.messages)
+        canned = self._canned_response(message_content, first_turn=first_turn)
+        
+        # Check knowledge base first, keeping enough budget back for the LLM
+        kb_response = None
+        if not canned and deadline.has_at_least(self.kb_min_budget):
+            kb_deadline = Deadline(deadline.remaining() - self.llm_min_budget)
+            kb_response = self._check_knowledge_base(message_content, deadline=kb_deadline)
+        
+        if canned:
+            response = {
+                'content': canned[0],
+                'model': "canned",
+                'route': "canned",
+                'canned': canned[1]
+            }
+        elif kb_response:
+            response = {
+                'content': kb_response,
+                'model': "knowledge_base",
+                'route': "knowledge_base"
+            }
+        elif not deadline.has_at_least(self.llm_min_budget):
+            # Not enough time left for a model call
+            response = {
+                'content': "Sorry, that took longer than expected. Please try again in a moment.",
+                'model': self.llm_service.model_name,
+                'route': "deadline",
+                'error': 'Request deadline exceeded'
+            }
+        else:
+            # Generate bot response using LLM
             human_template = "{message}"
             
-            prompt = self.llm_service.create_prompt_template(system_template, human_template)
-            response = self.llm_service.get_chat_response(prompt, message=message_content)
+            # Pick a model for this message, falling back to the faster one when time is short
+            route = self.model_router.route(message_content, history_length=len(history))
+            if not deadline.has_at_least(self.llm_low_budget) and route.model != self.model_router.cheap_model:
+                route = route._replace(model=self.model_router.cheap_model, route='deadline')
+            llm_service = self._get_llm_service(route.model)
             
-            response_content = response['content']
-            model_used = response['model']
+            prompt = llm_service.create_prompt_template(system_template, human_template)
+            response = llm_service.get_chat_response(prompt, deadline=deadline, message=message_content)
+            response['route'] = route.route
+        
+        bot_fields = {
+            'token_count': response.get('total_tokens'),
+            'prompt_tokens': response.get('prompt_tokens'),
+            'completion_tokens': response.get('completion_tokens'),
+            'latency_ms': response.get('latency_ms'),
+            'llm_model_used': response['model'],
+            'llm_route': response.get('route'),
+            'timestamp': datetime.utcnow()
+        }
+        
+        # Write-behind: queue the bot message and metric increments, no DB write in the request
+        if self._buffer_message(conversation_id, 'bot', response['content'],
+                                metrics=self._metric_deltas(response, messages_added=2), **bot_fields):
+            conversation_cache.append_message(conversation_id, 'bot', response['content'], bot_fields['timestamp'])
+            return {
+                'message_id': None,
+                'content': response['content'],
+                'persisted': False
+            }
         
-        # Save bot response
+        # Save bot response and metrics in a single transaction, bounded by the budget left after the LLM call
+        apply_statement_timeout(db.session, deadline)
         bot_message = Message(
             conversation_id=conversation_id,
             sender_type='bot',
-            content=response_content,
-            token_count=len(response_content.split()) * 1.3,  # Rough estimate
-            llm_model_used=model_used
+            content=response['content'],
+            **bot_fields
         )
         db.session.add(bot_message)
         
         # Update metrics
-        self._update_metrics(conversation)
+        self._update_metrics(conversation_id, response, messages_added=2)
         
-        db.session.commit()
-        
-        return {
+        db.session.flush()
+        result = {
             'message_id': bot_message.id,
-            'content': bot_message.content
+            'content': response['content']
         }
+        db.session.commit()
+        conversation_cache.append_message(conversation_id, 'bot', response['content'], bot_fields['timestamp'])
+        
+        return result
     
-    def _check_knowledge_base(self, query):
+    def _buffer_message(self, conversation_id, sender_type, content, metrics=None, **fields):
         """
-        Check if the query can be answered from the knowledge base
+        Queue a message (and the metric increments to apply once it is written)
+        in the write-behind buffer if that mode is enabled.
+        Returns False when the caller should write it synchronously instead.
+        """
+        if not write_behind_enabled():
+            return False
+        
+        message_buffer.start(current_app._get_current_object())
+        return message_buffer.enqueue(conversation_id, sender_type, content, metrics=metrics, **fields) is not None
+    
+    def _canned_response(self, message_content, first_turn=False):
+        """
+        Precomputed (response, kind) for a configured opening message or quick reply, or None
+        """
+        if isinstance(self.chatbot, ChatBotSnapshot):
+            return self.chatbot.canned_response(message_content, first_turn=first_turn)
+        
+        # A plain ChatBot model: build the lookup on the fly
+        match = build_canned_responses(self.chatbot.config).get(normalize_message(message_content))
+        if match and (match[1] != 'opening' or first_turn):
+            return match
+        return None
+    
+    def _get_llm_service(self, model_name):
+        """
+        Get an LLM service for the routed model, reusing the default one when it matches
+        """
+        if model_name == self.llm_service.model_name:
+            return self.llm_service
+        
+        return LLMService(
+            model_name=model_name,
+            organization_id=self.organization_id,
+            llm_settings=self.llm_settings
+        )
+    
+    def _check_knowledge_base(self, query, deadline=None):
+        """
+        Check if the query can be answered from the knowledge base before the deadline
         """
         # Get knowledge bases for this chatbot
         knowledge_bases = KnowledgeBase.query.filter_by(chatbot_id=self.chatbot.id).all()
@@ -119,10 +268,14 @@ class ConversationService:
         
         # Search all knowledge bases for this chatbot
         for kb in knowledge_bases:
+            if deadline is not None and deadline.expired():
+                break
+            
             results = self.knowledge_service.search_knowledge_base(
                 knowledge_base_id=kb.id,
                 query=query,
-                threshold=0.8  # Higher threshold for more confident matches
+                threshold=0.8,  # Higher threshold for more confident matches
+                deadline=deadline
             )
             
             if results:
@@ -150,42 +303,119 @@ class ConversationService:
             metrics.completed = True
         
         db.session.commit()
+        conversation_cache.evict(conversation_id)
         
         return {'success': True}
     
-    def get_conversation(self, conversation_id):
+    def get_conversation(self, conversation_id, limit=None, cursor=None):
         """
-        Get a conversation and its messages
+        Get a conversation and a page of its messages in (timestamp, id) order.
+        
+        cursor is the next_cursor from the previous page; limit=None returns
+        every remaining message. Raises ValueError for a malformed cursor.
+        Messages still in the write-behind buffer (id None) follow the written
+        ones, on a page of their own when they don't fit on the last one.
         """
         conversation = Conversation.query.get(conversation_id)
         if not conversation:
             return {'error': 'Conversation not found'}
         
-        messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.timestamp).all()
+        after = decode_cursor(cursor) if cursor else None
+        
+        if conversation.archived_at:
+            # Messages were moved to compressed cold storage
+            messages = self.archive_service.load_transcript(conversation_id)
+            if after:
+                messages = [m for m in messages if self._transcript_key(m) > after]
+            more = bool(limit) and len(messages) > limit
+            messages = messages[:limit] if limit else messages
+        else:
+            query = Message.query.filter_by(conversation_id=conversation_id)
+            if after:
+                query = query.filter(after_keyset(Message.timestamp, Message.id, *after))
+            query = query.order_by(Message.timestamp, Message.id)
+            
+            # Fetch one extra row to know whether another page follows
+            messages = [message.to_dict() for message in (query.limit(limit + 1) if limit else query)]
+            more = bool(limit) and len(messages) > limit
+            messages = messages[:limit] if limit else messages
+            
+            if not more:
+                # Messages still waiting in the write-behind buffer come after the written ones.
+                # They have no id to page from, so they go on a page of their own if they don't fit.
+                pending = [Message(**row).to_dict() for row in message_buffer.pending_for(conversation_id)]
+                if not limit or len(messages) + len(pending) <= limit:
+                    messages += pending
+                elif messages:
+                    more = True
+                else:
+                    messages = pending[:limit]
+        
+        next_cursor = None
+        if more:
+            last = messages[-1]
+            next_cursor = encode_cursor(datetime.fromisoformat(last['timestamp']), last['id'])
         
         return {
-            'conversation': {
-                'id': conversation.id,
-                'started_at': conversation.started_at.isoformat(),
-                'ended_at': conversation.ended_at.isoformat() if conversation.ended_at else None,
-                'status': conversation.status,
-                'visitor_id': conversation.visitor_id,
-                'utm_source': conversation.utm_source,
-                'utm_medium': conversation.utm_medium,
-                'utm_campaign': conversation.utm_campaign,
-                'referrer_url': conversation.referrer_url
-            },
-            'messages': [message.to_dict() for message in messages]
+            'conversation': self._conversation_dict(conversation),
+            'messages': messages,
+            'next_cursor': next_cursor
         }
     
-    def _get_conversation_history(self, conversation_id, limit=10):
+    def stream_conversation(self, conversation_id, batch_size=500):
         """
-        Get the recent message history for a conversation
+        Generate a conversation as newline-delimited JSON: one conversation line,
+        then one line per message written as it is read from a server-side cursor.
+        Returns None if the conversation does not exist.
         """
-        messages = Message.query.filter_by(conversation_id=conversation_id).order_by(Message.timestamp.desc()).limit(limit).all()
-        messages.reverse()  # Get in chronological order
+        conversation = Conversation.query.get(conversation_id)
+        if not conversation:
+            return None
+        
+        header = self._conversation_dict(conversation)
+        archived = conversation.archived_at is not None
         
-        return messages
+        def generate():
+            yield json.dumps({'type': 'conversation', 'conversation': header}) + '\n'
+            
+            if archived:
+                messages = iter(self.archive_service.load_transcript(conversation_id))
+            else:
+                query = Message.query.filter_by(conversation_id=conversation_id).order_by(
+                    Message.timestamp, Message.id
+                ).execution_options(stream_results=True).yield_per(batch_size)
+                messages = (message.to_dict() for message in query)
+            
+            for message in messages:
+                yield json.dumps({'type': 'message', 'message': message}) + '\n'
+            
+            if not archived:
+                for row in message_buffer.pending_for(conversation_id):
+                    yield json.dumps({'type': 'message', 'message': Message(**row).to_dict()}) + '\n'
+            
+            yield json.dumps({'type': 'end'}) + '\n'
+        
+        return generate()
+    
+    def _conversation_dict(self, conversation):
+        return {
+            'id': conversation.id,
+            'started_at': conversation.started_at.isoformat(),
+            'ended_at': conversation.ended_at.isoformat() if conversation.ended_at else None,
+            'status': conversation.status,
+            'visitor_id': conversation.visitor_id,
+            'utm_source': conversation.utm_source,
+            'utm_medium': conversation.utm_medium,
+            'utm_campaign': conversation.utm_campaign,
+            'referrer_url': conversation.referrer_url,
+            'archived': conversation.archived_at is not None
+        }
+    
+    def _transcript_key(self, message):
+        """
+        (timestamp, id) of an archived message dict, comparable with a decoded cursor
+        """
+        return (datetime.fromisoformat(message['timestamp']), message['id'])
     
     def _create_metrics_entry(self, conversation):
         """
@@ -223,18 +453,38 @@ class ConversationService:
         )
         
         db.session.add(metrics)
-        db.session.commit()
         
         return metrics
     
-    def _update_metrics(self, conversation):
+    def _metric_deltas(self, response=None, messages_added=0):
         """
-        Update metrics for a conversation
+        Metric increments for a turn, rolling up LLM usage from the response
         """
-        metrics = ConversationMetrics.query.filter_by(conversation_id=conversation.id).first()
-        if metrics:
-            message_count = Message.query.filter_by(conversation_id=conversation.id).count()
-            metrics.message_count = message_count
-            
-            # Update in database
-            db.session.add(metrics)
+        deltas = {'message_count': messages_added}
+        
+        if response and response.get('route') == 'canned':
+            deltas['canned_response_count'] = 1
+        
+        if response and response.get('total_tokens') is not None:
+            deltas.update({
+                'llm_call_count': 1,
+                'prompt_tokens': response['prompt_tokens'],
+                'completion_tokens': response['completion_tokens'],
+                'llm_latency_ms': response.get('latency_ms') or 0
+            })
+        
+        return deltas
+    
+    def _update_metrics(self, conversation_id, response=None, messages_added=0):
+        """
+        Update metrics for a conversation with a single atomic UPDATE,
+        rolling up LLM usage from the response
+        """
+        values = {
+            getattr(ConversationMetrics, column): func.coalesce(getattr(ConversationMetrics, column), 0) + delta
+            for column, delta in self._metric_deltas(response, messages_added).items()
+        }
+        
+        ConversationMetrics.query.filter_by(conversation_id=conversation_id).update(
+            values, synchronize_session=False
+        )
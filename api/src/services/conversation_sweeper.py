@@ -0,0 +1,283 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, exists, func, or_, select, update
+
+from models import db, Conversation, ConversationMetrics, Message
+from utils.redis_store import LocalStore, get_redis
+from .conversation_cache import conversation_cache
+from .message_buffer import message_buffer
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = 'conversation_sweeper:lock'
+RESUME_KEY = 'conversation_sweeper:resume_after'
+
+# Extends the lock to ARGV[2] ms, or deletes it when that is 0, if ARGV[1] still
+# holds it. Returns 1 if it did, 0 if the lock expired or changed hands.
+HOLD_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+if tonumber(ARGV[2]) > 0 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+else
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+class ConversationSweeper:
+    """
+    Ends conversations with no messages for idle_timeout seconds and fills in
+    their metrics (completed, duration_seconds).
+
+    Active conversations are scanned in id order in batches of batch_size.
+    Each batch is ended with one UPDATE and one metrics UPDATE, in a short
+    transaction of its own. To stay out of the way of live traffic it pauses
+    between batches, stops after max_batches per run (the next run resumes
+    from there), and uses a Redis lock so only one worker sweeps at a time.
+    The lock is taken for lock_ttl seconds and extended before every batch,
+    so a long run keeps it while a crashed one loses it; a run that finds it
+    has lost the lock stops. When the run ends the lock is released, though
+    not before interval seconds after the run started, so workers still take
+    turns once per interval.
+    """
+    def __init__(self, idle_timeout=1800, interval=60, batch_size=500, batch_pause=0.5, max_batches=20,
+                 lock_ttl=60):
+        self.idle_timeout = idle_timeout
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_batches = max_batches
+        self.lock_ttl = lock_ttl
+
+        self._scripts = {}  # id(client) -> registered script
+        self._app = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'skipped_locked': 0,
+            'lost_lock': 0,
+            'scanned': 0,
+            'ended': 0,
+            'errors': 0,
+            'last_run_at': None,
+            'last_run_ms': None
+        }
+
+    def init_app(self, app):
+        self.idle_timeout = app.config['CONVERSATION_IDLE_TIMEOUT']
+        self.interval = app.config['CONVERSATION_SWEEP_INTERVAL']
+        self.batch_size = app.config['CONVERSATION_SWEEP_BATCH_SIZE']
+        self.batch_pause = app.config['CONVERSATION_SWEEP_BATCH_PAUSE']
+        self.max_batches = app.config['CONVERSATION_SWEEP_MAX_BATCHES']
+        self.lock_ttl = app.config['CONVERSATION_SWEEP_LOCK_TTL']
+
+    def start(self, app):
+        """
+        Start sweeping every interval seconds in a background thread; safe to call more than once
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name='conversation-sweeper', daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def sweep(self, now=None):
+        """
+        Run one sweep (requires an app context). Returns the number of conversations ended,
+        or None if another worker holds the sweep lock.
+        """
+        store = get_redis()
+        owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        if not store.set(LOCK_KEY, owner, nx=True, px=int(self.lock_ttl * 1000)):
+            self._count('skipped_locked')
+            return None
+
+        started = time.monotonic()
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.idle_timeout)
+        ended = 0
+        # Continue where the last run stopped, so a long tail of active rows is eventually covered
+        last_id = int(store.get(RESUME_KEY) or 0)
+        lost_lock = False
+
+        try:
+            for batch_number in range(self.max_batches):
+                if batch_number:
+                    if self.batch_pause:
+                        time.sleep(self.batch_pause)
+                    if not self._hold_lock(store, owner, self.lock_ttl):
+                        # Another worker may be sweeping now; leave the resume point to it
+                        logger.warning('Lost the conversation sweep lock after %d batches, stopping', batch_number)
+                        self._count('lost_lock')
+                        lost_lock = True
+                        break
+
+                candidates = db.session.execute(
+                    select(Conversation.id, Conversation.started_at).where(
+                        Conversation.status == 'active',
+                        Conversation.id > last_id,
+                        Conversation.started_at < cutoff
+                    ).order_by(Conversation.id).limit(self.batch_size)
+                ).all()
+                if not candidates:
+                    last_id = 0
+                    break
+
+                last_id = candidates[-1].id
+                self._count('scanned', len(candidates))
+                ended += self._end_batch(candidates, cutoff)
+
+            if not lost_lock:
+                store.set(RESUME_KEY, last_id)
+        except Exception:
+            db.session.rollback()
+            self._count('errors')
+            logger.exception('Conversation sweep failed')
+            raise
+        finally:
+            with self._lock:
+                self._stats['runs'] += 1
+                self._stats['ended'] += ended
+                self._stats['last_run_at'] = now.isoformat()
+                self._stats['last_run_ms'] = int((time.monotonic() - started) * 1000)
+            self._release_lock(store, owner, started)
+
+        if ended:
+            logger.info('Ended %d idle conversations', ended)
+        return ended
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                idle_timeout=self.idle_timeout,
+                interval=self.interval,
+                batch_size=self.batch_size,
+                running=self._thread is not None and self._thread.is_alive()
+            )
+
+    def _end_batch(self, candidates, cutoff):
+        """
+        End the idle conversations in a batch of (id, started_at) rows; returns how many were ended
+        """
+        ids = [row.id for row in candidates]
+
+        # Last activity per conversation, from the (conversation_id, timestamp) index
+        last_activity = dict(db.session.execute(
+            select(Message.conversation_id, func.max(Message.timestamp)).where(
+                Message.conversation_id.in_(ids)
+            ).group_by(Message.conversation_id)
+        ).all())
+
+        rows = []
+        for conversation_id, started_at in candidates:
+            ended_at = last_activity.get(conversation_id) or started_at
+            if ended_at >= cutoff or message_buffer.pending_for(conversation_id):
+                continue
+            rows.append({
+                'b_id': conversation_id,
+                'b_ended_at': ended_at,
+                'b_duration': int((ended_at - started_at).total_seconds()) if started_at else None
+            })
+
+        if not rows:
+            return 0
+
+        conversation = Conversation.__table__
+        message = Message.__table__
+        metrics = ConversationMetrics.__table__
+
+        # Guarded so a conversation that got a message (or was ended) since we looked is left alone
+        result = db.session.execute(
+            update(conversation).where(and_(
+                conversation.c.id == bindparam('b_id'),
+                conversation.c.status == 'active',
+                ~exists().where(and_(
+                    message.c.conversation_id == conversation.c.id,
+                    message.c.timestamp >= cutoff
+                ))
+            )).values(status='ended', ended_at=bindparam('b_ended_at')),
+            rows
+        )
+
+        db.session.execute(
+            update(metrics).where(and_(
+                metrics.c.conversation_id == bindparam('b_id'),
+                or_(metrics.c.completed.is_(None), metrics.c.completed.is_(False)),
+                exists().where(and_(
+                    conversation.c.id == metrics.c.conversation_id,
+                    conversation.c.status == 'ended',
+                    conversation.c.ended_at == bindparam('b_ended_at')
+                ))
+            )).values(completed=True, duration_seconds=bindparam('b_duration')),
+            rows
+        )
+        db.session.commit()
+
+        for row in rows:
+            conversation_cache.evict(row['b_id'])
+
+        return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(rows)
+
+    def _hold_lock(self, store, owner, seconds):
+        """
+        Extend the sweep lock to seconds from now, or release it when seconds is 0,
+        if owner still holds it. Returns whether it did.
+        """
+        if isinstance(store, LocalStore):
+            with store._lock:
+                if store.get(LOCK_KEY) != owner:
+                    return False
+                if seconds > 0:
+                    store.expire(LOCK_KEY, seconds)
+                else:
+                    store.delete(LOCK_KEY)
+                return True
+
+        script = self._scripts.get(id(store))
+        if script is None:
+            script = self._scripts[id(store)] = store.register_script(HOLD_LOCK_SCRIPT)
+        return bool(script(keys=[LOCK_KEY], args=[owner, max(0, int(seconds * 1000))]))
+
+    def _release_lock(self, store, owner, started):
+        """
+        Release the lock at the end of a run, keeping it until interval seconds after the run started
+        """
+        try:
+            self._hold_lock(store, owner, max(0.0, self.interval - (time.monotonic() - started)))
+        except Exception:
+            # It expires lock_ttl seconds after the last batch
+            logger.exception('Could not release the conversation sweep lock')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self._app.app_context():
+                    self.sweep()
+            except Exception:
+                # Logged in sweep(); try again next interval
+                continue
+
+conversation_sweeper = ConversationSweeper()
@@ -0,0 +1,241 @@
+import csv
+import gzip
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, Conversation, ExportJob, Message
+from utils.pagination import after_keyset
+from .archive_service import ArchiveService
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CSV_COLUMNS = [
+    'conversation_id', 'chatbot_id', 'visitor_id', 'conversation_started_at', 'conversation_ended_at',
+    'conversation_status', 'message_id', 'sender_type', 'timestamp', 'content', 'llm_model_used'
+]
+
+class ExportService:
+    """
+    Writes every conversation and message of an organization in a date range
+    to a gzip-compressed NDJSON (one conversation per line) or CSV (one
+    message per row) file.
+
+    Conversations are read in (started_at, id) keyset chunks and their
+    messages through a server-side cursor, so memory stays bounded by one
+    chunk. Progress (and a heartbeat) is committed on the job row after each
+    chunk, so jobs left running by a process that died can be found and failed.
+    """
+    def __init__(self, export_dir=None, chunk_size=200):
+        self.export_dir = export_dir or current_app.config['EXPORT_DIR']
+        self.chunk_size = chunk_size
+        self.archive_service = ArchiveService()
+
+    def create_job(self, organization_id, export_format='ndjson', start_date=None, end_date=None, requested_by=None):
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+
+        job = ExportJob(
+            organization_id=organization_id,
+            requested_by=requested_by,
+            format=export_format,
+            start_date=start_date,
+            end_date=end_date,
+            status='pending'
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def run(self, job_id):
+        """
+        Run an export job to completion (requires an app context)
+        """
+        job = ExportJob.query.get(job_id)
+        if not job or job.status != 'pending':
+            return
+
+        # Plain values; the job row is expired and detached as chunks are committed
+        export_format = job.format
+        filters = {
+            'organization_id': job.organization_id,
+            'start_date': job.start_date,
+            'end_date': job.end_date
+        }
+
+        path = os.path.join(self.export_dir, f"export_{job_id}_org{filters['organization_id']}.{export_format}.gz")
+        partial_path = path + '.part'
+
+        try:
+            job.status = 'running'
+            job.started_at = job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+            ExportJob.query.filter_by(id=job_id).update({
+                ExportJob.conversations_total: self._conversation_query(**filters).count()
+            }, synchronize_session=False)
+            db.session.commit()
+
+            os.makedirs(self.export_dir, exist_ok=True)
+            with gzip.open(partial_path, 'wt', encoding='utf-8', newline='') as output:
+                writer = self._csv_writer(output) if export_format == 'csv' else None
+                for conversations, messages_by_conversation in self._chunks(filters):
+                    message_count = 0
+                    for conversation in conversations:
+                        messages = messages_by_conversation.get(conversation['id'], [])
+                        message_count += len(messages)
+                        if writer:
+                            self._write_csv(writer, conversation, messages)
+                        else:
+                            output.write(json.dumps(dict(conversation, messages=messages)) + '\n')
+
+                    self._record_progress(job_id, len(conversations), message_count)
+
+            os.replace(partial_path, path)
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Export job %s failed', job_id)
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            ExportJob.query.filter_by(id=job_id).update({
+                ExportJob.status: 'failed',
+                ExportJob.error: str(e),
+                ExportJob.completed_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            return
+
+        ExportJob.query.filter_by(id=job_id).update({
+            ExportJob.status: 'completed',
+            ExportJob.file_path: path,
+            ExportJob.file_size: os.path.getsize(path),
+            ExportJob.completed_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def fail_stale_jobs(self, stale_after=None):
+        """
+        Fail running jobs whose progress stopped more than stale_after seconds
+        ago (the process running them died). Call at startup. Returns the count.
+        """
+        stale_after = stale_after if stale_after is not None else current_app.config['EXPORT_STALE_SECONDS']
+        cutoff = datetime.utcnow() - timedelta(seconds=stale_after)
+        count = ExportJob.query.filter(
+            ExportJob.status == 'running',
+            db.func.coalesce(ExportJob.heartbeat_at, ExportJob.started_at) < cutoff
+        ).update({
+            ExportJob.status: 'failed',
+            ExportJob.error: 'Export was interrupted (no progress since its process stopped)',
+            ExportJob.completed_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if count:
+            logger.warning('Failed %d stale export jobs', count)
+        return count
+
+    def _conversation_query(self, organization_id, start_date=None, end_date=None):
+        query = Conversation.query.filter(Conversation.organization_id == organization_id)
+        if start_date:
+            query = query.filter(Conversation.started_at >= start_date)
+        if end_date:
+            query = query.filter(Conversation.started_at < end_date)
+        return query
+
+    def _chunks(self, filters):
+        """
+        Yield (conversation dicts, {conversation_id: [message dicts]}) chunk by chunk
+        """
+        last = None
+        while True:
+            query = self._conversation_query(**filters)
+            if last:
+                query = query.filter(after_keyset(Conversation.started_at, Conversation.id, *last))
+            conversations = query.order_by(Conversation.started_at, Conversation.id).limit(self.chunk_size).all()
+            if not conversations:
+                return
+
+            last = (conversations[-1].started_at, conversations[-1].id)
+            rows = [self._conversation_row(conversation) for conversation in conversations]
+            live_ids = [c.id for c in conversations if not c.archived_at]
+
+            messages_by_conversation = {c.id: self.archive_service.load_transcript(c.id)
+                                        for c in conversations if c.archived_at}
+            if live_ids:
+                query = Message.query.filter(Message.conversation_id.in_(live_ids)).order_by(
+                    Message.conversation_id, Message.timestamp, Message.id
+                ).execution_options(stream_results=True).yield_per(1000)
+                for message in query:
+                    messages_by_conversation.setdefault(message.conversation_id, []).append(message.to_dict())
+
+            # Release the chunk's ORM objects before the next one
+            db.session.expunge_all()
+            yield rows, messages_by_conversation
+
+    def _record_progress(self, job_id, conversations, messages):
+        ExportJob.query.filter_by(id=job_id).update({
+            ExportJob.conversations_done: ExportJob.conversations_done + conversations,
+            ExportJob.messages_done: ExportJob.messages_done + messages,
+            ExportJob.heartbeat_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+
+    def _conversation_row(self, conversation):
+        return {
+            'id': conversation.id,
+            'chatbot_id': conversation.chatbot_id,
+            'visitor_id': conversation.visitor_id,
+            'started_at': conversation.started_at.isoformat() if conversation.started_at else None,
+            'ended_at': conversation.ended_at.isoformat() if conversation.ended_at else None,
+            'status': conversation.status,
+            'utm_source': conversation.utm_source,
+            'utm_medium': conversation.utm_medium,
+            'utm_campaign': conversation.utm_campaign,
+            'referrer_url': conversation.referrer_url
+        }
+
+    def _csv_writer(self, output):
+        writer = csv.DictWriter(output, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        return writer
+
+    def _write_csv(self, writer, conversation, messages):
+        for message in messages:
+            writer.writerow({
+                'conversation_id': conversation['id'],
+                'chatbot_id': conversation['chatbot_id'],
+                'visitor_id': conversation['visitor_id'],
+                'conversation_started_at': conversation['started_at'],
+                'conversation_ended_at': conversation['ended_at'],
+                'conversation_status': conversation['status'],
+                'message_id': message.get('id'),
+                'sender_type': message.get('sender_type'),
+                'timestamp': message.get('timestamp'),
+                'content': message.get('content'),
+                'llm_model_used': message.get('llm_model_used')
+            })
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def start_export(app, job_id):
+    """
+    Run an export job in the background export pool (EXPORT_MAX_WORKERS threads, created on first use)
+    """
+    global _executor
+
+    def run():
+        with app.app_context():
+            ExportService().run(job_id)
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config['EXPORT_MAX_WORKERS'], thread_name_prefix='export')
+
+    return _executor.submit(run)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import time
+
+from utils.redis_store import get_redis
+
+KEY_PREFIX = 'idempotency'
+MAX_KEY_LENGTH = 255
+
+class IdempotencyConflictError(Exception):
+    """The first request with this key is still running and didn't finish in time"""
+
+class IdempotencyKeyReusedError(Exception):
+    """The key was already used for a request with a different payload"""
+
+class IdempotencyStore:
+    """
+    Remembers the results of recent requests by client-supplied idempotency key.
+
+    The first request with a key claims it (SET NX) and runs; its result is
+    stored for ttl seconds and returned to any retry. Duplicates that arrive
+    while the first is still running poll until it finishes. If the first
+    request fails with an exception the claim is released, so a retry runs
+    again. Backed by Redis, so it works across workers.
+    """
+    def __init__(self, ttl=86400, pending_ttl=120, poll_interval=0.05, max_poll_interval=0.5):
+        self.ttl = ttl
+        self.pending_ttl = pending_ttl
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+
+    def init_app(self, app):
+        self.ttl = app.config['IDEMPOTENCY_TTL']
+        self.pending_ttl = app.config['IDEMPOTENCY_PENDING_TTL']
+
+    def run(self, scope, key, fn, fingerprint=None, wait_timeout=30):
+        """
+        Run fn once per (scope, key) and return (result, replayed). result must be JSON-serializable.
+
+        Raises ValueError for an invalid key, IdempotencyKeyReusedError when the
+        fingerprint differs from the original request, and IdempotencyConflictError
+        when a duplicate gives up waiting for the first request.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValueError(f'Idempotency key must be 1-{MAX_KEY_LENGTH} characters')
+
+        store = get_redis()
+        store_key = f'{KEY_PREFIX}:{scope}:{key}'
+        digest = self._digest(fingerprint)
+        give_up_at = time.monotonic() + wait_timeout
+        interval = self.poll_interval
+
+        while True:
+            claim = json.dumps({'status': 'pending', 'fingerprint': digest})
+            if store.set(store_key, claim, nx=True, ex=self.pending_ttl):
+                return self._run_claimed(store, store_key, digest, fn), False
+
+            raw = store.get(store_key)
+            if raw is not None:
+                entry = json.loads(raw)
+                if entry.get('fingerprint') != digest:
+                    raise IdempotencyKeyReusedError('Idempotency key was already used with a different request')
+                if entry['status'] == 'done':
+                    return entry['result'], True
+
+            # Still running elsewhere (or released after a failure; the next loop claims it)
+            if time.monotonic() >= give_up_at:
+                raise IdempotencyConflictError('A request with this idempotency key is still in progress')
+            time.sleep(min(interval, max(0.0, give_up_at - time.monotonic())))
+            interval = min(interval * 2, self.max_poll_interval)
+
+    def _run_claimed(self, store, store_key, digest, fn):
+        try:
+            result = fn()
+        except Exception:
+            store.delete(store_key)
+            raise
+
+        store.set(store_key, json.dumps({'status': 'done', 'fingerprint': digest, 'result': result}), ex=self.ttl)
+        return result
+
+    def _digest(self, fingerprint):
+        if fingerprint is None:
+            return None
+        return hashlib.sha256(str(fingerprint).encode('utf-8')).hexdigest()
+
+idempotency_store = IdempotencyStore()
@@ -57,10 +57,15 @@ class KnowledgeService:
         
         db.session.commit()
     
-    def search_knowledge_base(self, knowledge_base_id, query, threshold=0.7):
-        """Search knowledge base for relevant items"""
+    def search_knowledge_base(self, knowledge_base_id, query, threshold=0.7, deadline=None):
+        """Search knowledge base for relevant items, giving up if the request deadline passes"""
+        if deadline is not None and deadline.expired():
+            return []
+        
         # Generate embedding for the query
-        query_embedding = self._generate_embedding(query)
+        query_embedding = self._generate_embedding(query, deadline=deadline)
+        if deadline is not None and deadline.expired():
+            return []
         
         # Get knowledge items
         items = KnowledgeItem.query.filter_by(knowledge_base_id=knowledge_base_id).all()
@@ -92,13 +97,13 @@ class KnowledgeService:
         
         return results
     
-    def _generate_embedding(self, text):
+    def _generate_embedding(self, text, deadline=None):
         """Generate embedding for text using OpenAI API"""
         try:
             # This is a simplified version. In a real implementation, 
             # you would use OpenAI's Embedding API or similar
             prompt = "Generate an embedding representation of the following text:\n\n" + text
-            result = self.llm_service.get_completion(prompt)
+            result = self.llm_service.get_completion(prompt, deadline=deadline)
             
             # For now, let's just return a simplified mock embedding
             # This would be replaced with actual embedding API calls
@@ -0,0 +1,235 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from config.config import setting
+
+class LLMCapacityError(Exception):
+    """Raised when an LLM request is rejected before reaching the provider"""
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class LLMTimeoutError(Exception):
+    """Raised when an accepted LLM request does not finish before its deadline"""
+    pass
+
+class LLMExecutor:
+    """
+    Runs LLM calls on a bounded thread pool with a global concurrency cap,
+    per-organization caps and a bounded wait queue.
+
+    Callers block for at most their deadline; requests that cannot start in
+    time are rejected up front instead of holding the calling worker.
+    """
+    def __init__(self, max_concurrency=16, max_per_organization=4, max_queue=64):
+        self.max_concurrency = max_concurrency
+        self.max_per_organization = max_per_organization
+        self.max_queue = max_queue
+
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._global_slots = threading.BoundedSemaphore(max_concurrency)
+        self._org_slots = {}
+        self._lock = threading.Lock()
+
+        self._waiting = 0
+        self._in_flight = 0
+        self._avg_latency = None
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'timed_out': 0,
+            'rejected': {}
+        }
+
+    def run(self, fn, organization_id=None, deadline=None, max_per_organization=None):
+        """
+        Run fn on the pool and return its result.
+
+        deadline is an absolute time.monotonic() value. Raises LLMCapacityError
+        if the request is rejected and LLMTimeoutError if it runs past the deadline.
+        """
+        future = self.submit(fn, organization_id, deadline, max_per_organization)
+
+        try:
+            return future.result(timeout=self._remaining(deadline))
+        except FutureTimeoutError:
+            self.record_timeout()
+            raise LLMTimeoutError('LLM request exceeded its deadline')
+
+    def submit(self, fn, organization_id=None, deadline=None, max_per_organization=None):
+        """
+        Wait for admission and start fn on the pool, returning its Future.
+
+        Only admission blocks; the caller decides how long to wait for the
+        result. Raises LLMCapacityError if the request is rejected.
+        """
+        with self._lock:
+            self._stats['submitted'] += 1
+
+            # Reject if we can't possibly finish before the deadline
+            if deadline is not None and not self._can_meet_deadline(deadline):
+                self._reject('deadline_unreachable')
+
+            if self._waiting >= self.max_queue:
+                self._reject('queue_full')
+
+            self._waiting += 1
+            org_slots = self._get_org_slots(organization_id, max_per_organization)
+
+        # Wait for a per-organization slot, then a global slot
+        acquired_org = False
+        acquired_global = False
+        try:
+            acquired_org = org_slots is None or org_slots.acquire(timeout=self._remaining(deadline))
+            if not acquired_org:
+                with self._lock:
+                    self._reject('organization_limit')
+
+            acquired_global = self._global_slots.acquire(timeout=self._remaining(deadline))
+            if not acquired_global:
+                with self._lock:
+                    self._reject('global_limit')
+        except LLMCapacityError:
+            if acquired_org and org_slots is not None:
+                org_slots.release()
+            raise
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        with self._lock:
+            self._in_flight += 1
+
+        started = time.monotonic()
+        try:
+            future = self._pool.submit(fn)
+        except Exception:
+            self._global_slots.release()
+            if org_slots is not None:
+                org_slots.release()
+            with self._lock:
+                self._in_flight -= 1
+            raise
+        future.add_done_callback(lambda f: self._release(org_slots, started, f))
+
+        return future
+
+    def record_timeout(self):
+        """
+        Count a caller that gave up waiting; the call keeps its slot until the provider returns
+        """
+        with self._lock:
+            self._stats['timed_out'] += 1
+
+    def stats(self):
+        """
+        Snapshot of executor counters for monitoring
+        """
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_per_organization': self.max_per_organization,
+                'max_queue': self.max_queue,
+                'waiting': self._waiting,
+                'in_flight': self._in_flight,
+                'avg_latency_seconds': self._avg_latency,
+                'submitted': self._stats['submitted'],
+                'completed': self._stats['completed'],
+                'failed': self._stats['failed'],
+                'timed_out': self._stats['timed_out'],
+                'rejected': dict(self._stats['rejected'])
+            }
+
+    def _release(self, org_slots, started, future):
+        """
+        Free the slots held by a finished call and record its latency
+        """
+        self._global_slots.release()
+        if org_slots is not None:
+            org_slots.release()
+
+        latency = time.monotonic() - started
+        with self._lock:
+            self._in_flight -= 1
+            if future.exception() is None:
+                self._stats['completed'] += 1
+            else:
+                self._stats['failed'] += 1
+
+            # Exponentially weighted moving average of call latency
+            if self._avg_latency is None:
+                self._avg_latency = latency
+            else:
+                self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+    def _can_meet_deadline(self, deadline):
+        """
+        Estimate whether a new request could start before the deadline (lock held).
+
+        Only the expected queue wait counts: a request that can take a free
+        slot is always admitted, so calls keep completing and a latency
+        average raised by one slow period comes back down. Callers still stop
+        waiting at their deadline if the call itself runs long.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+
+        ahead = self._in_flight + self._waiting - self.max_concurrency
+        if self._avg_latency is None or ahead < 0:
+            return True
+
+        # Requests ahead of us drain at max_concurrency per average call latency
+        expected_wait = ((ahead + 1) / self.max_concurrency) * self._avg_latency
+
+        return expected_wait < remaining
+
+    def _get_org_slots(self, organization_id, max_per_organization=None):
+        """
+        Get the semaphore capping concurrent calls for an organization (lock held)
+        """
+        if organization_id is None:
+            return None
+
+        if organization_id not in self._org_slots:
+            limit = max_per_organization or self.max_per_organization
+            self._org_slots[organization_id] = threading.BoundedSemaphore(limit)
+
+        return self._org_slots[organization_id]
+
+    def _reject(self, reason):
+        """
+        Count and raise a rejection (lock held)
+        """
+        self._stats['rejected'][reason] = self._stats['rejected'].get(reason, 0) + 1
+        raise LLMCapacityError(reason)
+
+    @staticmethod
+    def _remaining(deadline):
+        """
+        Seconds left until the deadline, or None to wait indefinitely
+        """
+        if deadline is None:
+            return None
+        return max(0, deadline - time.monotonic())
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_llm_executor():
+    """
+    Get the process-wide LLM executor, sized from the app config when first used
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = LLMExecutor(
+                    max_concurrency=setting('LLM_MAX_CONCURRENCY'),
+                    max_per_organization=setting('LLM_MAX_CONCURRENCY_PER_ORG'),
+                    max_queue=setting('LLM_MAX_QUEUE')
+                )
+
+    return _executor
@@ -1,22 +1,78 @@
-import os
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
 from langchain.llms import OpenAI
 from langchain.chat_models import ChatOpenAI
 from langchain.prompts.chat import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 
+from config.config import setting
+from utils.tokens import count_message_tokens, count_text_tokens, tokenizer_name
+from .circuit_breaker import get_circuit_breaker, CircuitOpenError
+from .llm_executor import get_llm_executor, LLMCapacityError, LLMTimeoutError
+from .mock_llm_provider import get_mock_chat_model
+from .single_flight import SingleFlight
+
+# Shared across LLMService instances so identical in-flight prompts are coalesced per process
+prompt_coalescer = SingleFlight()
+
+# Hedged request counters for this process
+hedge_stats = {
+    'launched': 0,
+    'won': 0
+}
+_hedge_stats_lock = threading.Lock()
+
 class LLMService:
-    def __init__(self, api_key=None, model_name=None):
+    def __init__(self, api_key=None, model_name=None, organization_id=None, llm_settings=None):
         """
-        Initialize the LLM service with API key and model name
-        """
-        self.api_key = api_key or os.environ.get('OPENAI_API_KEY')
-        self.model_name = model_name or os.environ.get('LLM_MODEL', 'gpt-3.5-turbo')
+        Initialize the LLM service with API key and model name.
         
-        self.chat_model = ChatOpenAI(
-            model_name=self.model_name,
-            temperature=0.7,
-            api_key=self.api_key,
-            request_timeout=60
+        llm_settings are the organization's LLM settings; provider,
+        fallback_models, hedge_requests and latency_budget_seconds are read from them.
+        """
+        self.api_key = api_key or setting('OPENAI_API_KEY')
+        self.model_name = model_name or setting('LLM_MODEL')
+        self.organization_id = organization_id
+        self.llm_settings = llm_settings or {}
+        self.provider = self.llm_settings.get('provider') or setting('LLM_PROVIDER')
+        self.request_timeout = float(setting('LLM_REQUEST_TIMEOUT'))
+        self.latency_budget = float(
+            self.llm_settings.get('latency_budget_seconds')
+            or setting('LLM_LATENCY_BUDGET')
+            or self.request_timeout
         )
+        self.hedge_requests = bool(self.llm_settings.get('hedge_requests', setting('LLM_HEDGE_REQUESTS')))
+        self.executor = get_llm_executor()
+        self.temperature = 0.7
+        
+        self._chat_models = {}  # Created on first use, so building a service never needs an API key
+    
+    def _get_chat_model(self, model_name):
+        """
+        Get the chat model client for a model name
+        """
+        if model_name not in self._chat_models and self.provider == 'mock':
+            self._chat_models[model_name] = get_mock_chat_model(model_name)
+        elif model_name not in self._chat_models:
+            self._chat_models[model_name] = ChatOpenAI(
+                model_name=model_name,
+                temperature=self.temperature,
+                api_key=self.api_key,
+                request_timeout=self.request_timeout
+            )
+        return self._chat_models[model_name]
+    
+    def _model_chain(self):
+        """
+        Ordered list of models to try: the primary model, then the organization's fallbacks
+        """
+        chain = [self.model_name]
+        for model_name in self.llm_settings.get('fallback_models', []):
+            if model_name not in chain:
+                chain.append(model_name)
+        return chain
     
     def create_prompt_template(self, system_template, human_template):
         """
@@ -27,25 +83,207 @@ class LLMService:
         
         return ChatPromptTemplate.from_messages([system_message, human_message])
     
-    def get_chat_response(self, prompt, **kwargs):
+    def get_chat_response(self, prompt, deadline=None, **kwargs):
         """
-        Get a response from the chat model using the provided prompt and variables
+        Get a response from the chat model using the provided prompt and variables.
+        
+        The call runs on the shared LLM executor and must finish within both the
+        request's Deadline (if given) and the latency budget.
+        Concurrent requests from one organization with an identical rendered
+        prompt share one call; each is given the call's token usage, since the
+        answer it got cost that much ('coalesced' marks the ones that didn't pay).
         """
+        messages = []
+        started = time.monotonic()
+        deadline_at = started + self.latency_budget
+        if deadline is not None:
+            deadline_at = min(deadline_at, deadline.expires_at)
+        
         try:
-            formatted_prompt = prompt.format_prompt(**kwargs)
-            response = self.chat_model(formatted_prompt.to_messages())
+            messages = prompt.format_prompt(**kwargs).to_messages()
+            (model_name, result), coalesced = prompt_coalescer.do(
+                self._prompt_key(messages),
+                lambda: self._generate(messages, deadline_at),
+                timeout=max(0, deadline_at - time.monotonic())
+            )
+            content = result.generations[0][0].text
+            usage = self._get_token_usage(result, messages, content, model_name)
+            
             return {
-                'content': response.content,
-                'model': self.model_name,
-                'success': True
+                'content': content,
+                'model': model_name,
+                'success': True,
+                'coalesced': coalesced,
+                'fallback': model_name != self.model_name,
+                'latency_ms': int((time.monotonic() - started) * 1000),
+                **usage
             }
+        except LLMCapacityError as e:
+            # Rejected before reaching the provider, so nothing was billed
+            response = self._error_response(
+                "We're getting a lot of messages right now. Please try again in a moment.",
+                e, [], started
+            )
+            response['rejected'] = e.reason
+            return response
         except Exception as e:
-            return {
-                'content': f"I'm having trouble connecting right now. Please try again in a moment.",
-                'model': self.model_name,
-                'error': str(e),
-                'success': False
-            }
+            return self._error_response(
+                "I'm having trouble connecting right now. Please try again in a moment.",
+                e, messages, started
+            )
+    
+    def _generate(self, messages, deadline):
+        """
+        Try each model in the chain, skipping open circuits, until one answers before the deadline.
+        Returns (model_name, result).
+        """
+        chain = self._model_chain()
+        last_error = None
+        
+        for index, model_name in enumerate(chain):
+            breaker = get_circuit_breaker(model_name)
+            if not breaker.allow_request():
+                last_error = CircuitOpenError(model_name)
+                continue
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            # Leave part of the budget for the fallbacks after this model
+            attempt_deadline = deadline
+            if index < len(chain) - 1:
+                attempt_deadline = time.monotonic() + remaining * 0.6
+            
+            try:
+                return model_name, self._call_model(model_name, messages, attempt_deadline, breaker)
+            except LLMCapacityError:
+                # Local overload; another model won't help
+                raise
+            except Exception as e:
+                last_error = e
+        
+        raise last_error or LLMTimeoutError('Latency budget exhausted')
+    
+    def _call_model(self, model_name, messages, deadline, breaker):
+        """
+        Call a single model, hedging with a second request once the first
+        runs past the model's recent p95 latency
+        """
+        chat_model = self._get_chat_model(model_name)
+        call = lambda: chat_model.generate([messages])
+        started = time.monotonic()
+        
+        try:
+            futures = [self.executor.submit(call, organization_id=self.organization_id, deadline=deadline)]
+        except LLMCapacityError:
+            breaker.cancel_request()
+            raise
+        
+        try:
+            hedge_delay = breaker.latency_percentile(0.95) if self.hedge_requests else None
+            if hedge_delay is not None and hedge_delay < deadline - time.monotonic():
+                done, _ = wait(futures, timeout=hedge_delay)
+                if not done:
+                    try:
+                        futures.append(self.executor.submit(call, organization_id=self.organization_id, deadline=deadline))
+                        with _hedge_stats_lock:
+                            hedge_stats['launched'] += 1
+                    except LLMCapacityError:
+                        # No spare capacity for a hedge; keep waiting on the original
+                        pass
+            
+            result, winner = self._wait_first(futures, deadline)
+        except Exception:
+            breaker.record_failure(time.monotonic() - started)
+            raise
+        
+        breaker.record_success(time.monotonic() - started)
+        if winner > 0:
+            with _hedge_stats_lock:
+                hedge_stats['won'] += 1
+        
+        return result
+    
+    def _wait_first(self, futures, deadline):
+        """
+        Wait for the first future to succeed before the deadline. Returns (result, index).
+        """
+        pending = set(futures)
+        last_error = None
+        
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), futures.index(future)
+                last_error = future.exception()
+        
+        if not pending and last_error is not None:
+            raise last_error
+        
+        self.executor.record_timeout()
+        raise LLMTimeoutError('LLM request exceeded its deadline')
+    
+    def _error_response(self, content, error, messages, started):
+        """
+        Build the fallback response returned when the LLM call fails or is rejected
+        """
+        prompt_tokens = count_message_tokens(messages, self.model_name) if messages else 0
+        
+        return {
+            'content': content,
+            'model': self.model_name,
+            'error': str(error),
+            'success': False,
+            'latency_ms': int((time.monotonic() - started) * 1000),
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': 0,
+            'total_tokens': prompt_tokens,
+            'token_source': tokenizer_name(self.model_name)
+        }
+    
+    def _prompt_key(self, messages):
+        """
+        Key identifying a fully rendered prompt for request coalescing, scoped to
+        the organization so usage is never shared across tenants
+        """
+        payload = json.dumps({
+            'organization_id': self.organization_id,
+            'models': self._model_chain(),
+            'temperature': self.temperature,
+            'messages': [[message.type, message.content] for message in messages]
+        })
+        return hashlib.sha256(payload.encode()).hexdigest()
+    
+    def _get_token_usage(self, result, messages, content, model_name):
+        """
+        Get token usage from the provider response, counting locally when it is missing
+        """
+        token_usage = (result.llm_output or {}).get('token_usage') or {}
+        
+        if token_usage.get('prompt_tokens') is not None:
+            prompt_tokens = token_usage['prompt_tokens']
+            completion_tokens = token_usage.get('completion_tokens', 0)
+            source = 'provider'
+        else:
+            prompt_tokens = count_message_tokens(messages, model_name)
+            completion_tokens = count_text_tokens(content, model_name)
+            source = tokenizer_name(model_name)
+        
+        return {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'token_source': source
+        }
     
     def get_completion(self, prompt, **kwargs):
         """
@@ -0,0 +1,320 @@
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, update
+from sqlalchemy.exc import DataError, DisconnectionError, IntegrityError, OperationalError
+
+from config.config import setting
+from models import db, Message, ConversationMetrics
+
+logger = logging.getLogger(__name__)
+
+# Optional Message columns; every queued row carries all of them so batches insert with one statement
+MESSAGE_FIELDS = ('token_count', 'prompt_tokens', 'completion_tokens', 'latency_ms', 'llm_model_used', 'llm_route')
+METRIC_COLUMNS = ('message_count', 'llm_call_count', 'prompt_tokens', 'completion_tokens', 'llm_latency_ms',
+                  'canned_response_count')
+
+class MessageBuffer:
+    """
+    Opt-in write-behind buffer for chat messages (MESSAGE_WRITE_MODE=write_behind).
+
+    Messages and metric increments are queued in memory and written by a
+    background thread with multi-row inserts and batched updates, whenever
+    flush_size messages are pending or flush_interval seconds have passed.
+
+    Durability: a message is acknowledged before it reaches the database.
+    Pending writes are flushed on graceful shutdown, but a crash loses up to
+    flush_interval seconds of messages. When the buffer is full, enqueue()
+    returns None and the caller must write synchronously, so nothing is
+    dropped under back-pressure. When a batch fails its rows are retried one
+    at a time, so a bad row cannot take the rest of the batch with it; a row
+    the database rejects (integrity or data error) max_retries times is
+    logged and dropped. Any other failure, e.g. the database being
+    unreachable, keeps every row queued without counting an attempt, and the
+    flusher backs off (doubling up to max_backoff seconds) until a flush
+    succeeds. A message's metric increments are only applied once the
+    message itself is written.
+    """
+    def __init__(self, max_size=5000, flush_size=200, flush_interval=0.5, max_retries=3, max_backoff=30):
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_backoff = max_backoff
+
+        self._messages = deque()  # {'row': Message columns, 'metrics': {column: delta}, 'attempts': n}
+        self._metrics = {}  # conversation_id -> {column: delta}
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self._stopping = False
+        self._failed_flushes = 0  # consecutive flushes that wrote nothing, for the backoff
+        self._stats = {
+            'enqueued': 0,
+            'flushed': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'unavailable': 0,
+            'row_errors': 0,
+            'dropped': 0,
+            'rejected_full': 0,
+            'last_flush_ms': None,
+            'last_flush_size': 0
+        }
+
+    def init_app(self, app):
+        self.max_size = app.config['MESSAGE_BUFFER_MAX_SIZE']
+        self.flush_size = app.config['MESSAGE_BUFFER_FLUSH_SIZE']
+        self.flush_interval = app.config['MESSAGE_BUFFER_FLUSH_INTERVAL']
+
+    def start(self, app):
+        """
+        Start the background flusher for an app; safe to call more than once
+        """
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name='message-write-behind', daemon=True)
+            self._thread.start()
+        atexit.register(self.shutdown)
+
+    def enqueue(self, conversation_id, sender_type, content, metrics=None, **fields):
+        """
+        Queue a message for insertion, with the metric increments (column: delta)
+        to apply to its conversation once it is written. Returns the queued row,
+        or None if the buffer is full and the caller should write synchronously.
+        """
+        row = dict.fromkeys(MESSAGE_FIELDS)
+        row.update(fields)
+        row.update({
+            'conversation_id': conversation_id,
+            'sender_type': sender_type,
+            'content': content,
+            'timestamp': fields.get('timestamp') or datetime.utcnow()
+        })
+
+        with self._condition:
+            if len(self._messages) >= self.max_size:
+                self._stats['rejected_full'] += 1
+                return None
+
+            self._messages.append({'row': row, 'metrics': metrics or {}, 'attempts': 0})
+            self._stats['enqueued'] += 1
+            if len(self._messages) >= self.flush_size:
+                self._condition.notify()
+
+        return row
+
+    def add_metrics(self, conversation_id, **deltas):
+        """
+        Accumulate metric increments for a conversation until the next flush
+        """
+        with self._condition:
+            pending = self._metrics.setdefault(conversation_id, dict.fromkeys(METRIC_COLUMNS, 0))
+            for column, delta in deltas.items():
+                pending[column] += delta or 0
+
+    def pending_for(self, conversation_id):
+        """
+        Queued (not yet written) messages for a conversation, oldest first, for read-your-writes
+        """
+        with self._condition:
+            return [dict(entry['row']) for entry in self._messages if entry['row']['conversation_id'] == conversation_id]
+
+    def flush(self):
+        """
+        Write everything currently queued. Returns the number of messages written.
+        Requires an app context.
+        """
+        with self._flush_lock:
+            with self._condition:
+                entries = list(self._messages)
+                metrics = self._metrics
+                self._metrics = {}
+
+            if not entries and not metrics:
+                return 0
+
+            started = time.monotonic()
+            written = []
+            try:
+                try:
+                    if entries:
+                        db.session.execute(insert(Message), [entry['row'] for entry in entries])
+                    self._apply_metrics(self._merge_metrics(metrics, entries))
+                    db.session.commit()
+                    written = entries
+                except (OperationalError, DisconnectionError):
+                    raise
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Write-behind flush of %d messages failed, writing them one by one', len(entries))
+                    with self._condition:
+                        self._stats['flush_errors'] += 1
+                    written = self._flush_each(entries, metrics)
+            except Exception:
+                # Not a problem with particular rows: keep everything queued, uncounted, and back off
+                db.session.rollback()
+                self._requeue_metrics(metrics)
+                with self._condition:
+                    self._stats['unavailable'] += 1
+                    self._failed_flushes += 1
+                logger.exception('Write-behind flush of %d messages failed, retrying in %.1fs',
+                                 len(entries), self.retry_delay())
+                raise
+            else:
+                with self._condition:
+                    self._failed_flushes = 0
+            finally:
+                done = {id(entry) for entry in written}
+                retained = [entry for entry in entries
+                            if id(entry) not in done and entry['attempts'] <= self.max_retries]
+                with self._condition:
+                    # Rows appended during the flush stay queued for the next one; failed rows go back in front
+                    for _ in range(len(entries)):
+                        self._messages.popleft()
+                    self._messages.extendleft(reversed(retained))
+                    if written:
+                        self._stats['flushed'] += len(written)
+                        self._stats['flushes'] += 1
+                        self._stats['last_flush_size'] = len(written)
+                        self._stats['last_flush_ms'] = int((time.monotonic() - started) * 1000)
+
+            return len(written)
+
+    def shutdown(self):
+        """
+        Stop the flusher and write whatever is still queued
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+
+    def stats(self):
+        with self._condition:
+            return dict(
+                self._stats,
+                pending=len(self._messages),
+                pending_metric_rows=len(self._metrics),
+                max_size=self.max_size,
+                flush_size=self.flush_size,
+                flush_interval=self.flush_interval,
+                retry_delay=self.retry_delay()
+            )
+
+    def retry_delay(self):
+        """
+        Seconds the flusher waits after a failed flush: flush_interval, doubled
+        for each consecutive failure, capped at max_backoff
+        """
+        with self._condition:
+            failures = self._failed_flushes
+        return min(self.flush_interval * 2 ** max(0, failures - 1), self.max_backoff)
+
+    def _apply_metrics(self, metrics):
+        """
+        Apply accumulated metric increments with one executemany UPDATE
+        """
+        if not metrics:
+            return
+        table = ConversationMetrics.__table__
+        statement = update(table).where(table.c.conversation_id == bindparam('b_conversation_id')).values({
+            column: func.coalesce(table.c[column], 0) + bindparam(f'b_{column}')
+            for column in METRIC_COLUMNS
+        })
+        params = [
+            dict({f'b_{column}': deltas[column] for column in METRIC_COLUMNS}, b_conversation_id=conversation_id)
+            for conversation_id, deltas in metrics.items()
+        ]
+        db.session.execute(statement, params)
+
+    def _flush_each(self, entries, metrics):
+        """
+        Insert entries one at a time (each in a savepoint) after a failed batch,
+        then apply the metrics of the ones written, and return those. Rows the
+        database rejects count an attempt; any other error is raised without
+        counting one, and flush() keeps every row queued.
+        """
+        written, failed = [], []
+        for entry in entries:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(Message), [entry['row']])
+                written.append(entry)
+            except (IntegrityError, DataError):
+                logger.exception('Write-behind insert of a message for conversation %s failed',
+                                 entry['row']['conversation_id'])
+                failed.append(entry)
+        self._apply_metrics(self._merge_metrics(metrics, written))
+        db.session.commit()
+
+        self._count_attempts(failed)
+        return written
+
+    def _count_attempts(self, failed):
+        """
+        Count a failed attempt for each entry, logging the ones that are out of retries
+        """
+        dropped = 0
+        for entry in failed:
+            entry['attempts'] += 1
+            if entry['attempts'] > self.max_retries:
+                row = entry['row']
+                logger.error('Dropping write-behind message for conversation %s (%s at %s) after %d attempts',
+                             row['conversation_id'], row['sender_type'], row['timestamp'], entry['attempts'])
+                dropped += 1
+
+        with self._condition:
+            self._stats['row_errors'] += len(failed)
+            self._stats['dropped'] += dropped
+
+    @staticmethod
+    def _merge_metrics(metrics, entries):
+        """
+        Pending standalone increments plus those of the given entries, per conversation
+        """
+        merged = {conversation_id: dict(deltas) for conversation_id, deltas in metrics.items()}
+        for entry in entries:
+            if entry['metrics']:
+                pending = merged.setdefault(entry['row']['conversation_id'], dict.fromkeys(METRIC_COLUMNS, 0))
+                for column, delta in entry['metrics'].items():
+                    pending[column] += delta or 0
+        return merged
+
+    def _requeue_metrics(self, metrics):
+        for conversation_id, deltas in metrics.items():
+            self.add_metrics(conversation_id, **deltas)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._messages) < self.flush_size:
+                    self._condition.wait(self.flush_interval)
+                stopping = self._stopping
+
+            try:
+                with self._app.app_context():
+                    self.flush()
+            except Exception:
+                # Already logged and counted; back off for longer the longer the database stays unavailable
+                if not stopping:
+                    time.sleep(self.retry_delay())
+
+            if stopping:
+                return
+
+def write_behind_enabled():
+    """
+    Whether chat messages should go through the write-behind buffer
+    """
+    return setting('MESSAGE_WRITE_MODE') == 'write_behind'
+
+message_buffer = MessageBuffer()
@@ -0,0 +1,174 @@
+import random
+import threading
+import time
+
+from langchain.schema import AIMessage, ChatGeneration, LLMResult
+
+from utils.tokens import count_message_tokens, count_text_tokens
+from config.config import setting
+
+class MockLLMError(Exception):
+    """Error injected by the mock provider"""
+    pass
+
+class LatencyDistribution:
+    """
+    Samples latencies in seconds from a distribution given as a spec string:
+
+        fixed:0.5
+        uniform:0.2,1.5
+        normal:0.8,0.2
+        lognormal:-0.5,0.6     (mu, sigma of the underlying normal)
+        exponential:0.7        (mean)
+    """
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+    def __init__(self, spec='fixed:0', rng=None):
+        kind, _, params = spec.partition(':')
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown latency distribution: {kind}')
+
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',') if p.strip()]
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        """
+        Draw a latency, never negative
+        """
+        if self.kind == 'fixed':
+            value = self.params[0] if self.params else 0
+        elif self.kind == 'uniform':
+            value = self.rng.uniform(self.params[0], self.params[1])
+        elif self.kind == 'normal':
+            value = self.rng.gauss(self.params[0], self.params[1])
+        elif self.kind == 'lognormal':
+            value = self.rng.lognormvariate(self.params[0], self.params[1])
+        else:
+            value = self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0
+
+        return max(0.0, value)
+
+class MockChatModel:
+    """
+    Offline stand-in for ChatOpenAI used for load and performance testing.
+
+    Implements the generate() interface LLMService relies on, plus stream()
+    for token-by-token output. Responses come from a template, latency from
+    a LatencyDistribution (time to first token, then per token), and errors
+    and timeouts are injected at the configured rates.
+    """
+    DEFAULT_TEMPLATE = 'Thanks for your message! You said: {message}'
+
+    def __init__(self, model_name='mock', response_template=None, latency=None, token_latency=None,
+                 error_rate=None, timeout_rate=None, timeout_seconds=None, seed=None):
+        seed = seed if seed is not None else setting('MOCK_LLM_SEED')
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.model_name = model_name
+        self.response_template = response_template or setting('MOCK_LLM_RESPONSE')
+        self.latency = LatencyDistribution(latency or setting('MOCK_LLM_LATENCY'), self._rng)
+        self.token_latency = LatencyDistribution(
+            token_latency or setting('MOCK_LLM_TOKEN_LATENCY'), self._rng
+        )
+        self.error_rate = float(error_rate if error_rate is not None else setting('MOCK_LLM_ERROR_RATE'))
+        self.timeout_rate = float(timeout_rate if timeout_rate is not None else setting('MOCK_LLM_TIMEOUT_RATE'))
+        self.timeout_seconds = float(
+            timeout_seconds if timeout_seconds is not None else setting('MOCK_LLM_TIMEOUT_SECONDS')
+        )
+        self.call_count = 0
+
+    def generate(self, messages_batch):
+        """
+        Generate one response per message list, mirroring BaseChatModel.generate
+        """
+        generations = []
+        prompt_tokens = 0
+        completion_tokens = 0
+
+        for messages in messages_batch:
+            self._inject_failures()
+            content = self._render(messages)
+
+            # A complete response costs what streaming all of it would
+            delay = self._sample(self.latency)
+            delay += sum(self._sample(self.token_latency) for _ in content.split(' '))
+            time.sleep(delay)
+
+            prompt_tokens += count_message_tokens(messages, self.model_name)
+            completion_tokens += count_text_tokens(content, self.model_name)
+            generations.append([ChatGeneration(message=AIMessage(content=content))])
+
+        return LLMResult(
+            generations=generations,
+            llm_output={
+                'token_usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens
+                },
+                'model_name': self.model_name
+            }
+        )
+
+    def __call__(self, messages):
+        """
+        Single-message interface matching ChatOpenAI.__call__
+        """
+        return self.generate([messages]).generations[0][0].message
+
+    def stream(self, messages):
+        """
+        Yield the response token by token (whitespace-delimited) with per-token latency
+        """
+        self._inject_failures()
+        time.sleep(self._sample(self.latency))
+
+        words = self._render(messages).split(' ')
+        for index, word in enumerate(words):
+            time.sleep(self._sample(self.token_latency))
+            yield word if index == 0 else ' ' + word
+
+    def _render(self, messages):
+        """
+        Fill the response template from the last human message
+        """
+        with self._lock:
+            self.call_count += 1
+            count = self.call_count
+
+        message = messages[-1].content if messages else ''
+        return self.response_template.format(message=message, model=self.model_name, n=count)
+
+    def _inject_failures(self):
+        """
+        Raise an error or hang until the timeout at the configured rates
+        """
+        roll = self._sample_random()
+        if roll < self.error_rate:
+            raise MockLLMError('Injected mock LLM error')
+        if roll < self.error_rate + self.timeout_rate:
+            time.sleep(self.timeout_seconds)
+            raise TimeoutError('Injected mock LLM timeout')
+
+    def _sample(self, distribution):
+        with self._lock:
+            return distribution.sample()
+
+    def _sample_random(self):
+        with self._lock:
+            return self._rng.random()
+
+_models = {}
+_models_lock = threading.Lock()
+
+def get_mock_chat_model(model_name):
+    """
+    Get the process-wide mock model for a model name so latency sampling and
+    call counts are shared across requests
+    """
+    with _models_lock:
+        if model_name not in _models:
+            _models[model_name] = MockChatModel(model_name=model_name)
+        return _models[model_name]
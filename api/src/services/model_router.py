@@ -0,0 +1,80 @@
+import json
+import re
+from collections import namedtuple
+
+from config.config import setting
+
+RouteDecision = namedtuple('RouteDecision', ['model', 'route', 'reason'])
+
+# Words that usually signal a question needing reasoning rather than a quick answer
+COMPLEX_KEYWORDS = re.compile(
+    r'\b(why|explain|compare|difference|versus|vs|troubleshoot|analy[sz]e|recommend|'
+    r'calculate|step[- ]by[- ]step|how (do|does|can|should|would))\b',
+    re.IGNORECASE
+)
+
+def tier_model_overrides():
+    """
+    Per-tier model overrides from LLM_TIER_MODELS, e.g. {"premium": {"model": "gpt-4"}}.
+    Tiers not listed (all of them by default) use LLM_MODEL and LLM_CHEAP_MODEL;
+    organizations can override either in llm_settings.
+    """
+    tier_models = setting('LLM_TIER_MODELS')
+    return (json.loads(tier_models) if isinstance(tier_models, str) else tier_models) or {}
+
+class ModelRouter:
+    """
+    Picks a model per request from organization settings, subscription tier,
+    message length and a simple complexity heuristic. Short, simple questions
+    go to the cheaper model.
+    """
+    def __init__(self, subscription_tier=None, llm_settings=None, tier_models=None):
+        self.llm_settings = llm_settings or {}
+        tier = (tier_models if tier_models is not None else tier_model_overrides()).get(subscription_tier) or {}
+
+        # Organization settings, then tier overrides, then the deployment-wide models
+        tier_model = tier.get('model') or setting('LLM_MODEL')
+        tier_cheap_model = tier.get('cheap_model') or setting('LLM_CHEAP_MODEL') or tier_model
+
+        self.model = self.llm_settings.get('model') or tier_model
+        self.cheap_model = self.llm_settings.get('cheap_model') or tier_cheap_model
+        self.routing_enabled = self.llm_settings.get('routing_enabled', True)
+        self.simple_max_chars = int(self.llm_settings.get('simple_max_chars', 200))
+
+    def route(self, message_content, history_length=0):
+        """
+        Choose the model for a message and return a RouteDecision
+        """
+        if self.llm_settings.get('model') and not self.llm_settings.get('cheap_model'):
+            return RouteDecision(self.model, 'pinned', 'organization model setting')
+
+        if not self.routing_enabled or self.model == self.cheap_model:
+            return RouteDecision(self.model, 'default', 'routing disabled')
+
+        score = self.complexity_score(message_content, history_length)
+        if score == 0:
+            return RouteDecision(self.cheap_model, 'simple', 'short simple message')
+
+        return RouteDecision(self.model, 'complex', f'complexity score {score}')
+
+    def complexity_score(self, message_content, history_length=0):
+        """
+        Rough complexity score; 0 means the message looks simple
+        """
+        content = message_content or ''
+        score = 0
+
+        if len(content) > self.simple_max_chars:
+            score += 1
+        if COMPLEX_KEYWORDS.search(content):
+            score += 1
+        if content.count('?') > 1:
+            score += 1
+        if len(re.findall(r'[.!?]\s', content)) >= 2:
+            score += 1
+        if '```' in content or re.search(r'\d+\s*[-+*/^%]\s*\d+', content):
+            score += 1
+        if history_length > 10:
+            score += 1
+
+        return score
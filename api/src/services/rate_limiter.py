@@ -0,0 +1,204 @@
+import json
+import math
+import threading
+import time
+
+from utils.redis_store import LocalStore, get_redis
+
+KEY_PREFIX = 'ratelimit'
+
+# (requests per minute, burst) per action and key scope
+DEFAULT_LIMITS = {
+    'conversation': {'ip': (30, 10), 'visitor': (10, 5), 'chatbot': (600, 100)},
+    'message': {'sid': (30, 10), 'ip': (120, 30), 'visitor': (30, 10), 'chatbot': (1200, 200)}
+}
+
+# Overrides by Organization.subscription_tier
+TIER_LIMITS = {
+    'premium': {'conversation': {'chatbot': (3000, 500)}, 'message': {'chatbot': (6000, 1000)}}
+}
+
+# Takes one token from every bucket, or none if any bucket is empty. A bucket is
+# stored as "tokens:updated_at" and expires once it would have refilled.
+# KEYS: buckets; ARGV: now, then rate (tokens/second) and burst for each bucket.
+# Returns {index of the first empty bucket or 0, seconds until it has a token}.
+TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local levels = {}
+local blocked = 0
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    local level = burst
+    local state = redis.call('GET', key)
+    if state then
+        local sep = string.find(state, ':')
+        local updated = tonumber(string.sub(state, sep + 1))
+        level = math.min(burst, tonumber(string.sub(state, 1, sep - 1)) + math.max(0, now - updated) * rate)
+    end
+    levels[i] = level
+    if level < 1 and (1 - level) / rate > wait then
+        blocked = i
+        wait = (1 - level) / rate
+    end
+end
+if blocked > 0 then
+    return {blocked, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 2])
+    local burst = tonumber(ARGV[i * 2 + 1])
+    redis.call('SET', key, tostring(levels[i] - 1) .. ':' .. tostring(now), 'PX', math.ceil(burst / rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+class RateLimitExceeded(Exception):
+    """Raised when a request is over one of its token-bucket limits"""
+    def __init__(self, scope, retry_after):
+        super().__init__(f'Too many requests, please retry in {math.ceil(retry_after)}s')
+        self.scope = scope
+        self.retry_after = retry_after
+
+class RateLimiter:
+    """
+    Token-bucket rate limits for the public chat entry points, keyed by
+    socket sid, IP, visitor and chatbot.
+
+    Buckets live in the shared store (one atomic Lua script per check on
+    Redis, the same logic under the LocalStore lock otherwise), so limits hold
+    across workers. A request takes a token from each of its buckets or from
+    none. Keys that were just rejected are remembered in-process until their
+    bucket refills, so a client hammering the API is turned away without a
+    store round trip. Limits come from DEFAULT_LIMITS, then the chatbot's
+    organization tier, then the chatbot's rateLimits config.
+    """
+    def __init__(self, enabled=True, tiers=None, max_blocked=10000):
+        self.enabled = enabled
+        self.tiers = tiers if tiers is not None else TIER_LIMITS
+        self.max_blocked = max_blocked
+
+        self._blocked = {}  # (action, scope, value) -> monotonic time the bucket has a token again
+        self._scripts = {}  # id(client) -> registered script
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'rejected': {}, 'fast_rejected': 0}
+
+    def init_app(self, app):
+        """
+        Apply RATE_LIMITS_ENABLED and RATE_LIMIT_TIERS (a dict, or JSON as read from the environment)
+        """
+        tiers = app.config['RATE_LIMIT_TIERS']
+        self.enabled = app.config['RATE_LIMITS_ENABLED']
+        self.tiers = (json.loads(tiers) if isinstance(tiers, str) else tiers) or TIER_LIMITS
+        with self._lock:
+            self._blocked.clear()
+
+    def limits_for(self, action, chatbot=None):
+        """
+        {scope: (per_minute, burst)} for an action, with tier and chatbot overrides applied
+        """
+        limits = dict(DEFAULT_LIMITS.get(action, {}))
+        if chatbot is not None:
+            limits.update(self.tiers.get(getattr(chatbot, 'subscription_tier', None), {}).get(action, {}))
+            overrides = (chatbot.config.get('rateLimits') or {}).get(action) or {}
+            for scope, limit in overrides.items():
+                if isinstance(limit, dict) and limit.get('perMinute'):
+                    limits[scope] = (limit['perMinute'], limit.get('burst') or limit['perMinute'])
+        return limits
+
+    def hit(self, action, keys, chatbot=None):
+        """
+        Take a token for each {scope: value} in keys (None values are skipped).
+        Raises RateLimitExceeded if any bucket is empty.
+        """
+        if not self.enabled:
+            return
+
+        limits = self.limits_for(action, chatbot)
+        buckets = [(scope, str(value)) for scope, value in keys.items() if value is not None and scope in limits]
+        if not buckets:
+            return
+
+        # Cheap path: reject keys we already know are empty without asking the store
+        now = time.monotonic()
+        with self._lock:
+            for scope, value in buckets:
+                retry_at = self._blocked.get((action, scope, value))
+                if retry_at is not None and retry_at > now:
+                    self._stats['fast_rejected'] += 1
+                    self._reject(scope)
+                    raise RateLimitExceeded(scope, retry_at - now)
+
+        rates = [(limits[scope][0] / 60.0, limits[scope][1]) for scope, _ in buckets]
+        store_keys = [f'{KEY_PREFIX}:{action}:{scope}:{value}' for scope, value in buckets]
+        blocked, wait = self._take(store_keys, rates)
+
+        with self._lock:
+            if not blocked:
+                self._stats['allowed'] += 1
+                return
+            scope, value = buckets[blocked - 1]
+            self._remember(action, scope, value, now + wait)
+            self._reject(scope)
+        raise RateLimitExceeded(scope, wait)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, rejected=dict(self._stats['rejected']), blocked_keys=len(self._blocked))
+
+    def _take(self, store_keys, rates):
+        store = get_redis()
+        args = [time.time()] + [value for rate in rates for value in rate]
+
+        if isinstance(store, LocalStore):
+            with store._lock:
+                return self._take_local(store, store_keys, args)
+
+        script = self._scripts.get(id(store))
+        if script is None:
+            script = self._scripts[id(store)] = store.register_script(TAKE_SCRIPT)
+        blocked, wait = script(keys=store_keys, args=args)
+        return int(blocked), float(wait)
+
+    def _take_local(self, store, store_keys, args):
+        """
+        TAKE_SCRIPT for the LocalStore (store lock held)
+        """
+        now = args[0]
+        levels = []
+        blocked, wait = 0, 0.0
+        for index, key in enumerate(store_keys, start=1):
+            rate, burst = args[index * 2 - 1], args[index * 2]
+            level = burst
+            state = store.get(key)
+            if state:
+                tokens, _, updated = state.partition(':')
+                level = min(burst, float(tokens) + max(0.0, now - float(updated)) * rate)
+            levels.append(level)
+            if level < 1 and (1 - level) / rate > wait:
+                blocked, wait = index, (1 - level) / rate
+
+        if blocked:
+            return blocked, wait
+
+        for index, key in enumerate(store_keys, start=1):
+            rate, burst = args[index * 2 - 1], args[index * 2]
+            store.set(key, f'{levels[index - 1] - 1}:{now}', px=math.ceil(burst / rate * 1000) + 1000)
+        return 0, 0.0
+
+    def _remember(self, action, scope, value, retry_at):
+        """
+        Remember an empty bucket until it refills (lock held)
+        """
+        if len(self._blocked) >= self.max_blocked:
+            now = time.monotonic()
+            self._blocked = {key: until for key, until in self._blocked.items() if until > now}
+            if len(self._blocked) >= self.max_blocked:
+                self._blocked.clear()
+        self._blocked[(action, scope, value)] = retry_at
+
+    def _reject(self, scope):
+        self._stats['rejected'][scope] = self._stats['rejected'].get(scope, 0) + 1
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; clients fall back to compact JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 2
+
+def available_encodings():
+    return ['json', 'msgpack'] if msgpack is not None else ['json']
+
+def negotiate(auth):
+    """
+    Encoding for a client's connect auth ({'protocol': 2, 'encoding': ...}), or
+    None for clients that speak the original one-event-per-emit protocol
+    """
+    if not isinstance(auth, dict) or auth.get('protocol') != PROTOCOL_VERSION:
+        return None
+    encoding = auth.get('encoding')
+    return encoding if encoding in available_encodings() else 'json'
+
+def timestamp_ms():
+    return int(time.time() * 1000)
+
+def message_frame(message_id, content, idempotency_key=None, replayed=False, timestamp=None):
+    """
+    Compact bot message; also tells the client the bot stopped typing
+    """
+    frame = {'e': 'm', 'id': message_id, 'c': content, 'ts': timestamp or timestamp_ms()}
+    if idempotency_key:
+        frame['k'] = idempotency_key
+    if replayed:
+        frame['r'] = 1
+    return frame
+
+def typing_frame(status):
+    return {'e': 't', 's': 1 if status == 'started' else 0}
+
+def system_frame(content, timestamp=None):
+    return {'e': 's', 'c': content, 'ts': timestamp or timestamp_ms()}
+
+def legacy_event(frame):
+    """
+    (event, payload) in the original protocol for a message or system frame
+    """
+    timestamp = json.dumps({"$date": {"$numberLong": str(frame['ts'])}})
+    if frame['e'] == 'm':
+        event, payload = 'message', {
+            'id': frame['id'],
+            'content': frame['c'],
+            'sender': 'bot',
+            'timestamp': timestamp,
+            'idempotency_key': frame.get('k'),
+            'replayed': bool(frame.get('r'))
+        }
+    else:
+        event, payload = 'system', {'content': frame['c'], 'timestamp': timestamp}
+
+    if 'q' in frame:
+        payload['seq'] = frame['q']
+    return event, payload
+
+def encode_batch(frames, encoding):
+    """
+    Payload of one 'batch' event: a list of frames, or its MessagePack bytes
+    """
+    if encoding == 'msgpack':
+        return msgpack.packb(frames, use_bin_type=True)
+    return frames
+
+class EventBatcher:
+    """
+    Coalesces compact frames per room and sends them as one 'batch' event.
+
+    The first frame for a room starts a window of window seconds; every frame
+    added during it goes out in the same emit (one websocket frame per
+    client). A room with max_frames pending is flushed at once. One flusher
+    thread, started on first use, sends the rooms whose window has ended.
+    """
+    def __init__(self, emit, window=0.02, max_frames=50):
+        self.emit = emit
+        self.window = window
+        self.max_frames = max_frames
+
+        self._pending = {}  # (room, encoding) -> [frame, ...]
+        self._due = deque()  # (monotonic time the window ends, key), oldest first
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher = None
+        self._stats = {'frames': 0, 'batches': 0, 'emit_errors': 0}
+
+    def init_app(self, app):
+        self.window = app.config['SOCKET_BATCH_WINDOW']
+        self.max_frames = app.config['SOCKET_BATCH_MAX_FRAMES']
+
+    def add(self, room, frame, encoding='json'):
+        key = (room, encoding)
+        with self._lock:
+            self._stats['frames'] += 1
+            frames = self._pending.setdefault(key, [])
+            frames.append(frame)
+            full = len(frames) >= self.max_frames
+            if len(frames) == 1 and not full:
+                self._due.append((time.monotonic() + self.window, key))
+                self._start_flusher()
+                self._wakeup.notify()
+
+        if full:
+            self.flush(key)
+
+    def flush(self, key):
+        with self._lock:
+            frames = self._pending.pop(key, None)
+            if not frames:
+                return
+            self._stats['batches'] += 1
+
+        room, encoding = key
+        try:
+            self.emit(room, encode_batch(frames, encoding))
+        except Exception:
+            with self._lock:
+                self._stats['emit_errors'] += 1
+            raise
+
+    def flush_all(self):
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self.flush(key)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending_rooms=len(self._pending), window=self.window)
+
+    def _start_flusher(self):
+        """
+        Start the flusher thread if it isn't running (lock held)
+        """
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name='socket-batch-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._due:
+                    self._wakeup.wait()
+                due_at, key = self._due[0]
+                delay = due_at - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+                self._due.popleft()
+
+            # A room flushed early for being full may have started a new window; it goes out a little sooner
+            try:
+                self.flush(key)
+            except Exception:
+                logger.exception('Socket batch emit to %s failed', key[0])
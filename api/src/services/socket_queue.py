@@ -0,0 +1,90 @@
+import base64
+import json
+import logging
+import time
+
+from socketio import PubSubManager
+
+from utils.redis_store import get_redis
+
+logger = logging.getLogger(__name__)
+
+def _encode_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return {'__bytes__': base64.b64encode(value).decode('ascii')}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _decode_bytes(value):
+    if len(value) == 1 and '__bytes__' in value:
+        return base64.b64decode(value['__bytes__'])
+    return value
+
+class StoreManager(PubSubManager):
+    """
+    Socket.IO client manager that relays emits through the shared store's
+    pub/sub (Redis, or the in-process LocalStore when REDIS_URL is unset).
+
+    Every emit is published on channel and delivered by each node's listener
+    to the clients connected there, so room broadcasts, typing indicators and
+    emits made from HTTP routes reach sockets on every worker and node.
+    Messages travel as JSON; binary payloads (MessagePack batches) are
+    base64-wrapped on the way and restored before they reach the clients.
+
+    fanout() publishes a payload once for a handler that runs on every node,
+    for events each node delivers itself (e.g. to whichever of a
+    conversation's rooms have members there) instead of one emit per room.
+    """
+    name = 'store'
+
+    def __init__(self, channel='socketio', write_only=False, retry_delay=1.0, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.retry_delay = retry_delay
+        self._fanout_handlers = {}
+
+    def on_fanout(self, name, handler):
+        """
+        Register handler(payload) to run on this node for every fanout(name, payload)
+        """
+        self._fanout_handlers[name] = handler
+
+    def fanout(self, name, payload):
+        """
+        Run name's handler with payload here and on every other node, with one publish
+        """
+        message = {'method': 'fanout', 'name': name, 'payload': payload, 'host_id': self.host_id}
+        self._handle_fanout(message)
+        self._publish(message)
+
+    def _handle_fanout(self, message):
+        handler = self._fanout_handlers.get(message.get('name'))
+        if handler is None:
+            return
+        try:
+            handler(message['payload'])
+        except Exception:
+            logger.exception('Socket.IO fanout handler %s failed', message.get('name'))
+
+    def _publish(self, data):
+        return get_redis().publish(self.channel, json.dumps(data, separators=(',', ':'), default=_encode_bytes))
+
+    def _listen(self):
+        while True:
+            pubsub = get_redis().pubsub()
+            try:
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    data = json.loads(message['data'], object_hook=_decode_bytes)
+                    if data.get('method') == 'fanout':
+                        # Handled here rather than by PubSubManager, which only knows its own methods
+                        if data.get('host_id') != self.host_id:
+                            self._handle_fanout(data)
+                        continue
+                    yield data
+            except Exception:
+                # Connection lost; resubscribe after a pause (emits published meanwhile are missed)
+                logger.exception('Socket.IO queue listener failed, resubscribing')
+                time.sleep(self.retry_delay)
+            finally:
+                pubsub.close()
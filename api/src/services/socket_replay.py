@@ -0,0 +1,66 @@
+import json
+
+from utils.redis_store import get_redis
+
+class ReplayBuffer:
+    """
+    Per-conversation sequence numbers for emitted messages, and the last size
+    sequenced frames so a reconnecting client can catch up on what it missed.
+
+    Kept in the shared store (a capped list per conversation, like the
+    conversation cache window), so a client that reconnects to a different
+    worker or node can still replay. Frames expire ttl seconds after the last
+    emit; the sequence counter is kept for seq_ttl so numbers don't restart
+    while a conversation may still be open.
+    """
+    def __init__(self, size=100, ttl=900, seq_ttl=86400):
+        self.size = size
+        self.ttl = ttl
+        self.seq_ttl = seq_ttl
+
+    def init_app(self, app):
+        self.size = app.config['SOCKET_REPLAY_SIZE']
+        self.ttl = app.config['SOCKET_REPLAY_TTL']
+
+    def record(self, conversation_id, frame):
+        """
+        Number a compact frame with the conversation's next sequence ('q') and keep it for replay
+        """
+        store = get_redis()
+        seq_key = f'socket_seq:{conversation_id}'
+        seq = store.incr(seq_key)
+        store.expire(seq_key, self.seq_ttl)
+
+        frame = dict(frame, q=seq)
+        key = f'socket_replay:{conversation_id}'
+        store.rpush(key, json.dumps(frame, separators=(',', ':')))
+        store.ltrim(key, -self.size, -1)
+        store.expire(key, self.ttl)
+        return frame
+
+    def current(self, conversation_id):
+        return int(get_redis().get(f'socket_seq:{conversation_id}') or 0)
+
+    def since(self, conversation_id, last_seq):
+        """
+        Frames after last_seq, oldest first, and the current sequence. Frames is
+        None when the gap can't be replayed (it fell out of the buffer, or the
+        client is ahead of the server); the client gets 'resync' and carries on
+        from the current sequence, telling the visitor messages may be missing.
+        """
+        current = self.current(conversation_id)
+        if last_seq == current:
+            return [], current
+        if last_seq > current:
+            return None, current
+
+        frames = sorted(
+            (json.loads(entry) for entry in get_redis().lrange(f'socket_replay:{conversation_id}', 0, -1)),
+            key=lambda frame: frame['q']
+        )
+        missed = [frame for frame in frames if frame['q'] > last_seq]
+        if not missed or missed[0]['q'] != last_seq + 1:
+            return None, current
+        return missed, current
+
+replay_buffer = ReplayBuffer()
@@ -1,41 +1,94 @@
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask import request
-import json
+from flask import current_app, request
+import logging
 
-from models import ChatBot, Conversation
+from services.chatbot_cache import chatbot_cache
+from services.conversation_cache import conversation_cache
 from services.conversation_service import ConversationService
+from services.idempotency import IdempotencyConflictError, IdempotencyKeyReusedError, idempotency_store
+from services.rate_limiter import RateLimitExceeded, rate_limiter
+from services.socket_events import (
+    PROTOCOL_VERSION, EventBatcher, available_encodings, encode_batch, legacy_event, message_frame, negotiate,
+    system_frame, typing_frame
+)
+from services.socket_replay import replay_buffer
+from services.socket_workers import socket_workers
+from utils.deadline import Deadline
+
+logger = logging.getLogger(__name__)
 
 socketio = SocketIO()
 
+# Negotiated compact encoding per connected sid on this node (absent for original-protocol clients)
+_client_encodings = {}
+
+# Conversation events are fanned out to every node once and batched there for that node's clients
+ROOM_EVENT = 'conversation_event'
+
+event_batcher = EventBatcher(
+    lambda room, payload: socketio.emit('batch', payload, room=room, namespace='/', ignore_queue=True)
+)
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Handle client connection"""
     print(f"Client connected: {request.sid}")
+    
+    # Clients that send {'protocol': 2, 'encoding': ...} get batched compact frames
+    encoding = negotiate(auth)
+    if encoding:
+        _client_encodings[request.sid] = encoding
+        emit('protocol', {'protocol': PROTOCOL_VERSION, 'encoding': encoding}, room=request.sid)
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle client disconnection"""
+    _client_encodings.pop(request.sid, None)
     print(f"Client disconnected: {request.sid}")
 
 @socketio.on('join')
 def handle_join(data):
-    """Handle client joining a conversation room"""
+    """Handle client joining a conversation room, replaying what it missed since last_seq"""
     conversation_id = data.get('conversation_id')
-    if conversation_id:
-        join_room(f"conversation_{conversation_id}")
-        emit('joined', {'conversation_id': conversation_id}, room=request.sid)
+    if not conversation_id:
+        return
+    
+    encoding = _client_encodings.get(request.sid)
+    join_room(conversation_room(conversation_id, encoding))
+    
+    last_seq = data.get('last_seq')
+    if not isinstance(last_seq, int):
+        emit('joined', {'conversation_id': conversation_id, 'seq': replay_buffer.current(conversation_id)},
+             room=request.sid)
+        return
+    
+    missed, seq = replay_buffer.since(conversation_id, last_seq)
+    if missed is None:
+        # The gap is older than the replay buffer; the client is told it may be missing messages
+        emit('resync', {'conversation_id': conversation_id, 'seq': seq}, room=request.sid)
+    elif missed and encoding:
+        emit('batch', encode_batch(missed, encoding), room=request.sid)
+    else:
+        for frame in missed:
+            emit(*legacy_event(frame), room=request.sid)
+    
+    # After the replay, so a client that takes seq from 'joined' doesn't skip the replayed frames
+    emit('joined', {'conversation_id': conversation_id, 'seq': seq}, room=request.sid)
 
 @socketio.on('leave')
 def handle_leave(data):
     """Handle client leaving a conversation room"""
     conversation_id = data.get('conversation_id')
     if conversation_id:
-        leave_room(f"conversation_{conversation_id}")
+        leave_room(conversation_room(conversation_id, _client_encodings.get(request.sid)))
         emit('left', {'conversation_id': conversation_id}, room=request.sid)
 
 @socketio.on('message')
 def handle_message(data):
     """Handle incoming messages"""
+    # Start the request's time budget before any other work
+    deadline = Deadline.for_request()
+    
     conversation_id = data.get('conversation_id')
     content = data.get('content')
     
@@ -43,47 +96,162 @@ def handle_message(data):
         emit('error', {'message': 'Missing required fields'}, room=request.sid)
         return
     
-    # Get conversation
-    conversation = Conversation.query.get(conversation_id)
-    if not conversation:
-        emit('error', {'message': 'Conversation not found'}, room=request.sid)
+    # Connection and IP limits are checked before any lookup; visitor and chatbot once they're known
+    try:
+        rate_limiter.hit('message', {'sid': request.sid, 'ip': request.remote_addr})
+    except RateLimitExceeded as e:
+        emit('error', {
+            'message': str(e),
+            'retry_after': e.retry_after,
+            'idempotency_key': data.get('idempotency_key')
+        }, room=request.sid)
         return
     
-    # Get chatbot
-    chatbot = ChatBot.query.get(conversation.chatbot_id)
-    
-    # Create conversation service
-    conversation_service = ConversationService(
-        chatbot=chatbot,
-        organization_id=chatbot.organization_id,
-        visitor_id=conversation.visitor_id
+    # DB and LLM work runs on the worker pool so the event loop keeps serving other sockets
+    future = socket_workers.submit(
+        current_app._get_current_object(),
+        _process_message,
+        request.sid,
+        conversation_id,
+        content,
+        data.get('idempotency_key'),
+        deadline
     )
+    if future is None:
+        emit('error', {
+            'message': 'Server is busy, please try again',
+            'idempotency_key': data.get('idempotency_key')
+        }, room=request.sid)
+
+def _process_message(sid, conversation_id, content, idempotency_key, deadline):
+    """Process a message on a socket worker and emit the reply (runs in an app context)"""
+    try:
+        # Get conversation (cached while the conversation is active)
+        conversation = conversation_cache.get(conversation_id)
+        if not conversation:
+            socketio.emit('error', {'message': 'Conversation not found'}, room=sid)
+            return
+        
+        # Get chatbot
+        chatbot = chatbot_cache.get(conversation.chatbot_id)
+        
+        try:
+            rate_limiter.hit('message', {'visitor': conversation.visitor_id, 'chatbot': chatbot.id}, chatbot=chatbot)
+        except RateLimitExceeded as e:
+            socketio.emit('error', {
+                'message': str(e),
+                'retry_after': e.retry_after,
+                'idempotency_key': idempotency_key
+            }, room=sid)
+            return
+        
+        # Create conversation service
+        conversation_service = ConversationService(
+            chatbot=chatbot,
+            organization_id=chatbot.organization_id,
+            visitor_id=conversation.visitor_id
+        )
+        
+        def process():
+            send_typing(conversation_id, 'started')
+            try:
+                result = conversation_service.process_message(
+                    conversation_id=conversation_id,
+                    message_content=content,
+                    deadline=deadline
+                )
+            except Exception:
+                send_typing(conversation_id, 'stopped')
+                raise
+            # Compact clients take the reply itself as the end of typing
+            send_typing(conversation_id, 'stopped', compact='error' in result)
+            return result
+        
+        # Process message; a resend with the same idempotency_key gets the first result
+        replayed = False
+        if idempotency_key:
+            try:
+                result, replayed = idempotency_store.run(
+                    f'conversation:{conversation_id}',
+                    idempotency_key,
+                    process,
+                    fingerprint=content,
+                    wait_timeout=deadline.remaining()
+                )
+            except (IdempotencyConflictError, IdempotencyKeyReusedError, ValueError) as e:
+                socketio.emit('error', {'message': str(e), 'idempotency_key': idempotency_key}, room=sid)
+                return
+        else:
+            result = process()
+    except Exception:
+        logger.exception('Failed to process message for conversation %s', conversation_id)
+        socketio.emit('error', {'message': 'Failed to process message'}, room=sid)
+        return
     
-    # Process message
-    emit('typing', {'status': 'started'}, room=f"conversation_{conversation_id}")
-    
-    result = conversation_service.process_message(
-        conversation_id=conversation_id,
-        message_content=content
-    )
+    if 'error' in result:
+        socketio.emit('error', {'message': result['error']}, room=sid)
+        return
     
-    emit('typing', {'status': 'stopped'}, room=f"conversation_{conversation_id}")
+    # Send the reply to the conversation room; the room already got the
+    # original reply, so a replay only goes to the resending client
+    send_bot_message(conversation_id, result, idempotency_key=idempotency_key, replayed=replayed,
+                     room=sid if replayed else None)
+
+def conversation_room(conversation_id, encoding=None):
+    """Socket.IO room for a conversation; compact clients join one room per encoding"""
+    return f"conversation_{conversation_id}:{encoding}" if encoding else f"conversation_{conversation_id}"
+
+def send_typing(conversation_id, status, compact=True):
+    """Send a typing status to a conversation room"""
+    _publish_room_event(conversation_id, ('typing', {'status': status}), typing_frame(status) if compact else None)
+
+def send_bot_message(conversation_id, result, idempotency_key=None, replayed=False, room=None):
+    """Send a bot reply to a conversation room (on every node), or to one room such as a sid"""
+    frame = message_frame(result['message_id'], result['content'], idempotency_key, replayed)
     
-    if 'error' in result:
-        emit('error', {'message': result['error']}, room=request.sid)
+    # Only room broadcasts are sequenced; a reply resent to one client isn't a new event
+    if room:
+        if room in _client_encodings:
+            event_batcher.add(room, frame, _client_encodings[room])
+        else:
+            socketio.emit(*legacy_event(frame), room=room, namespace='/')
         return
     
-    # Broadcast message to all clients in the conversation room
-    emit('message', {
-        'id': result['message_id'],
-        'content': result['content'],
-        'sender': 'bot',
-        'timestamp': json.dumps({"$date": {"$numberLong": str(int(datetime.now().timestamp() * 1000))}})
-    }, room=f"conversation_{conversation_id}")
+    _broadcast_sequenced(conversation_id, frame)
 
 def send_system_message(conversation_id, content):
     """Send a system message to all clients in a conversation room"""
-    emit('system', {
-        'content': content,
-        'timestamp': json.dumps({"$date": {"$numberLong": str(int(datetime.now().timestamp() * 1000))}})
-    }, room=f"conversation_{conversation_id}", namespace='/')
+    _broadcast_sequenced(conversation_id, system_frame(content))
+
+def deliver_room_event(payload):
+    """
+    Deliver a conversation event to this node's clients: the original event to
+    the legacy room and the frame to each encoding's room, skipping rooms with
+    no members here (runs on every node for each fanout of ROOM_EVENT)
+    """
+    conversation_id = payload['conversation_id']
+    if payload.get('event') and _has_local_members(conversation_room(conversation_id)):
+        event, data = payload['event']
+        socketio.emit(event, data, room=conversation_room(conversation_id), namespace='/', ignore_queue=True)
+    
+    if payload.get('frame'):
+        for encoding in available_encodings():
+            room = conversation_room(conversation_id, encoding)
+            if _has_local_members(room):
+                event_batcher.add(room, payload['frame'], encoding)
+
+def _broadcast_sequenced(conversation_id, frame):
+    frame = replay_buffer.record(conversation_id, frame)
+    _publish_room_event(conversation_id, legacy_event(frame), frame)
+
+def _publish_room_event(conversation_id, event=None, frame=None):
+    """One publish per conversation event, whatever mix of protocols its clients speak"""
+    payload = {'conversation_id': conversation_id, 'event': event, 'frame': frame}
+    manager = socketio.server.manager
+    if hasattr(manager, 'fanout'):
+        manager.fanout(ROOM_EVENT, payload)
+    else:
+        deliver_room_event(payload)
+
+def _has_local_members(room):
+    return bool(socketio.server.manager.rooms.get('/', {}).get(room))
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+class SocketWorkerPool:
+    """
+    Bounded pool for the blocking part of socket events (DB reads, LLM calls).
+
+    Event handlers only validate input and submit; the job runs on the pool
+    inside an app context and emits its results to the room itself. When
+    max_workers jobs are running and max_queue more are waiting, submit()
+    returns None so the handler can tell the client to retry instead of
+    piling up work. Under eventlet (run.py monkey-patches before importing
+    the app) the pool threads are green threads, so a job waiting on the
+    database or the LLM yields to the other sockets.
+    """
+    def __init__(self, max_workers=64, max_queue=1000):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='socket')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'max_wait_ms': 0
+        }
+
+    def init_app(self, app):
+        """
+        Resize the pool to SOCKET_WORKERS and SOCKET_WORKER_QUEUE (before any job is submitted)
+        """
+        self.max_workers = app.config['SOCKET_WORKERS']
+        self.max_queue = app.config['SOCKET_WORKER_QUEUE']
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='socket')
+
+    def submit(self, app, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) on the pool in an app context. Returns its Future,
+        or None if the pool is saturated.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._stats['rejected'] += 1
+                return None
+            self._pending += 1
+            self._stats['submitted'] += 1
+
+        submitted = time.monotonic()
+
+        def run():
+            with self._lock:
+                self._running += 1
+                self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], int((time.monotonic() - submitted) * 1000))
+            try:
+                with app.app_context():
+                    result = fn(*args, **kwargs)
+                self._count('completed')
+                return result
+            except Exception:
+                self._count('failed')
+                raise
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._pending -= 1
+
+        return self._pool.submit(run)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._stats,
+                max_workers=self.max_workers,
+                max_queue=self.max_queue,
+                running=self._running,
+                queued=self._pending - self._running
+            )
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how much later than asked a sleeping thread wakes.
+
+    Under eventlet the sleep is a green one, so a lag well above zero means
+    something is blocking the hub and every socket on this worker waits.
+    Keeps the last window samples.
+    """
+    def __init__(self, interval=0.5, window=240):
+        self.interval = interval
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.interval = app.config['LOOP_LAG_INTERVAL']
+
+    def run(self):
+        """
+        Sample forever; start with socketio.start_background_task
+        """
+        while True:
+            started = time.monotonic()
+            time.sleep(self.interval)
+            self.record(time.monotonic() - started - self.interval)
+
+    def record(self, lag):
+        with self._lock:
+            self._samples.append(max(0.0, lag) * 1000)
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return {'samples': 0}
+        return {
+            'samples': len(samples),
+            'p50_ms': samples[len(samples) // 2],
+            'p99_ms': samples[min(int(len(samples) * 0.99), len(samples) - 1)],
+            'max_ms': samples[-1]
+        }
+
+socket_workers = SocketWorkerPool()
+
+loop_lag_monitor = LoopLagMonitor()
@@ -80,8 +80,8 @@ class WebhookService:
         
         return True
     
-    def trigger_webhook_event(self, organization_id, event, payload):
-        """Trigger webhooks for a specific event"""
+    def trigger_webhook_event(self, organization_id, event, payload, deadline=None):
+        """Trigger webhooks for a specific event, skipping any left when the deadline passes"""
         # Get all active webhooks for this organization that listen to this event
         webhooks = Webhook.query.filter(
             Webhook.organization_id == organization_id,
@@ -92,17 +92,26 @@ class WebhookService:
         results = []
         
         for webhook in webhooks:
+            if deadline is not None and deadline.expired():
+                results.append({
+                    'webhook_id': webhook.id,
+                    'event': event,
+                    'success': False,
+                    'error': 'Request deadline exceeded'
+                })
+                continue
+            
             # Add timestamp to payload
             payload['timestamp'] = int(time.time())
             payload['event'] = event
             
             # Send webhook request
-            result = self._send_webhook_request(webhook, event, payload)
+            result = self._send_webhook_request(webhook, event, payload, deadline=deadline)
             results.append(result)
         
         return results
     
-    def _send_webhook_request(self, webhook, event, payload):
+    def _send_webhook_request(self, webhook, event, payload, deadline=None):
         """Send a webhook request and log the result"""
         # Prepare headers
         headers = {
@@ -135,7 +144,8 @@ class WebhookService:
                 webhook.url,
                 headers=headers,
                 data=json_payload,
-                timeout=5  # 5 second timeout
+                # 5 second timeout, shortened to what's left of the request's budget
+                timeout=deadline.timeout(5) if deadline else 5
             )
             
             # Update log with response
@@ -0,0 +1,331 @@
+"""
+Online schema changes that can't go through create_all on a live database:
+adding columns to existing tables, building indexes without locking writes,
+and moving the message table to monthly range partitions on Postgres.
+
+Run from api/src, e.g.:
+
+    python -m utils.db_migrations schema
+    python -m utils.db_migrations indexes
+    python -m utils.db_migrations backfill-conversation-organizations
+    python -m utils.db_migrations partition-messages --months-ahead 3
+    python -m utils.db_migrations add-partitions --months-ahead 3
+"""
+import argparse
+import os
+from datetime import date
+
+from sqlalchemy import create_engine, inspect, text
+
+from models import db
+
+# (name, table, columns) for every index declared in the models' __table_args__
+INDEXES = [
+    ('ix_message_conversation_id_timestamp', 'message', ('conversation_id', 'timestamp')),
+    ('ix_conversation_metrics_organization_id_created_at', 'conversation_metrics', ('organization_id', 'created_at')),
+    ('ix_conversation_metrics_conversation_id', 'conversation_metrics', ('conversation_id',)),
+    ('ix_conversation_visitor_id', 'conversation', ('visitor_id',)),
+    ('ix_conversation_organization_id_started_at', 'conversation', ('organization_id', 'started_at', 'id')),
+]
+
+# (table, column) for model columns added after their table was first created;
+# create_all skips existing tables, so these are added by add_columns
+COLUMNS = [
+    ('message', 'prompt_tokens'),
+    ('message', 'completion_tokens'),
+    ('message', 'latency_ms'),
+    ('message', 'llm_route'),
+    ('conversation_metrics', 'llm_call_count'),
+    ('conversation_metrics', 'prompt_tokens'),
+    ('conversation_metrics', 'completion_tokens'),
+    ('conversation_metrics', 'llm_latency_ms'),
+    ('conversation_metrics', 'canned_response_count'),
+    ('conversation', 'archived_at'),
+    ('export_job', 'heartbeat_at'),
+]
+
+# Model tables added after the first deploy, created by create_tables
+TABLES = ['conversation_archive', 'export_job']
+
+def is_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+def add_columns(engine, columns=COLUMNS):
+    """
+    Add any of the given model columns missing from their (existing) tables,
+    typed as in the models. They are nullable with no server default, so
+    adding one doesn't rewrite the table, and counters are read with
+    coalesce(column, 0). On Postgres ADD COLUMN IF NOT EXISTS makes a
+    concurrent run harmless. Returns 'table.column' for each column added.
+    """
+    inspector = inspect(engine)
+    added = []
+
+    for table, column in columns:
+        if not inspector.has_table(table):
+            continue
+        if column in {existing['name'] for existing in inspector.get_columns(table)}:
+            continue
+
+        column_type = db.metadata.tables[table].c[column].type.compile(dialect=engine.dialect)
+        if_not_exists = ' IF NOT EXISTS' if is_postgres(engine) else ''
+        with engine.begin() as connection:
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN{if_not_exists} "{column}" {column_type}'))
+        added.append(f'{table}.{column}')
+
+    return added
+
+def create_tables(engine, tables=TABLES):
+    """
+    Create any of the given model tables that don't exist yet, with their
+    indexes. Returns the names of the tables created.
+    """
+    inspector = inspect(engine)
+    missing = [name for name in tables if not inspector.has_table(name)]
+    if missing:
+        db.metadata.create_all(engine, tables=[db.metadata.tables[name] for name in missing])
+    return missing
+
+def upgrade_schema(engine):
+    """
+    Bring an existing database up to the models. Safe to run on every deploy.
+    Returns the schema objects added.
+    """
+    return create_tables(engine) + add_columns(engine)
+
+def create_indexes(engine, indexes=INDEXES):
+    """
+    Create any missing indexes. On Postgres they are built CONCURRENTLY so
+    writes continue while each index builds; that can't run inside a
+    transaction, so each statement runs on an autocommit connection.
+    Returns the names of the indexes created.
+    """
+    existing = _existing_indexes(engine)
+    created = []
+
+    for name, table, columns in indexes:
+        if name in existing.get(table, set()):
+            continue
+
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        if is_postgres(engine):
+            statement = f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON "{table}" ({column_list})'
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                # A failed concurrent build leaves an INVALID index behind; drop it before retrying
+                _drop_invalid_index(connection, name)
+                connection.execute(text(statement))
+        else:
+            with engine.begin() as connection:
+                connection.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON "{table}" ({column_list})'))
+
+        created.append(name)
+
+    return created
+
+def drop_indexes(engine, indexes=INDEXES):
+    """
+    Drop the indexes again (used by the query benchmark to measure the baseline)
+    """
+    for name, table, _ in indexes:
+        if is_postgres(engine):
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        else:
+            with engine.begin() as connection:
+                connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+def backfill_conversation_organizations(engine, batch_size=5000):
+    """
+    Add conversation.organization_id if missing and copy it from each
+    conversation's chatbot, in id-range batches committed separately so no
+    long transaction holds row locks. Then build the listing index.
+    Returns the number of rows updated.
+    """
+    columns = {column['name'] for column in inspect(engine).get_columns('conversation')}
+    if 'organization_id' not in columns:
+        with engine.begin() as connection:
+            # Nullable with no default, so adding it doesn't rewrite the table
+            connection.execute(text(
+                'ALTER TABLE conversation ADD COLUMN organization_id INTEGER REFERENCES organization (id)'
+            ))
+
+    with engine.connect() as connection:
+        max_id = connection.execute(text('SELECT max(id) FROM conversation')).scalar() or 0
+
+    updated = 0
+    for first_id in range(1, max_id + 1, batch_size):
+        with engine.begin() as connection:
+            updated += connection.execute(text(
+                'UPDATE conversation SET organization_id = ('
+                '  SELECT chat_bot.organization_id FROM chat_bot WHERE chat_bot.id = conversation.chatbot_id'
+                ') WHERE conversation.organization_id IS NULL AND conversation.id BETWEEN :first AND :last'
+            ), {'first': first_id, 'last': first_id + batch_size - 1}).rowcount
+
+    create_indexes(engine, [index for index in INDEXES if index[1] == 'conversation'])
+    return updated
+
+def month_ranges(start, months):
+    """
+    (first_day, first_day_of_next_month) pairs for months starting at start's month
+    """
+    year, month = start.year, start.month
+    ranges = []
+    for _ in range(months):
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        ranges.append((date(year, month, 1), date(next_year, next_month, 1)))
+        year, month = next_year, next_month
+    return ranges
+
+def is_message_partitioned(engine):
+    if not is_postgres(engine):
+        return False
+
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'message')"
+        )).scalar()
+
+def add_message_partitions(engine, start=None, months_ahead=3):
+    """
+    Create monthly message partitions from start's month through months_ahead
+    months after it. Safe to run repeatedly, e.g. from a monthly cron job.
+    Returns the names of the partitions that now exist for that range.
+    """
+    if not is_message_partitioned(engine):
+        raise RuntimeError('message is not a partitioned table; run partition-messages first')
+
+    names = []
+    with engine.begin() as connection:
+        for first_day, next_first_day in month_ranges(start or date.today(), months_ahead + 1):
+            name = f'message_{first_day:%Y_%m}'
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF message "
+                f"FOR VALUES FROM ('{first_day.isoformat()}') TO ('{next_first_day.isoformat()}')"
+            ))
+            names.append(name)
+    return names
+
+def partition_message_table(engine, months_ahead=3):
+    """
+    Convert the message table to one range-partitioned by month on timestamp.
+
+    The existing table becomes message_legacy, attached as the partition for
+    everything before next month, so no rows are copied. Its constraints and
+    indexes are built and validated online first, which lets the swap itself
+    run in one short transaction without scanning the table. Later months get
+    their own partitions, and a default partition catches anything outside
+    the ranges. The primary key becomes (id, timestamp) because Postgres
+    requires the partition key in every unique constraint; ids still come
+    from the existing sequence, so they stay unique.
+    """
+    if not is_postgres(engine):
+        raise RuntimeError('Message partitioning requires Postgres')
+    if is_message_partitioned(engine):
+        return add_message_partitions(engine, months_ahead=months_ahead)
+
+    # The legacy partition also takes the rest of this month's writes
+    boundary = month_ranges(date.today(), 1)[0][1].isoformat()
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # Rows without a timestamp can't be routed to a range partition
+        connection.execute(text(
+            "UPDATE message SET timestamp = now() AT TIME ZONE 'utc' WHERE timestamp IS NULL"
+        ))
+
+        # Unique (id, timestamp) for the partitioned primary key, built without blocking writes
+        _drop_invalid_index(connection, 'message_legacy_id_timestamp_key')
+        connection.execute(text(
+            'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS message_legacy_id_timestamp_key '
+            'ON message (id, timestamp)'
+        ))
+
+        # NOT VALID + VALIDATE checks existing rows without an exclusive lock
+        for name, condition in [
+            ('message_timestamp_not_null', 'timestamp IS NOT NULL'),
+            ('message_legacy_range', f"timestamp < '{boundary}'")
+        ]:
+            connection.execute(text(
+                f'ALTER TABLE message DROP CONSTRAINT IF EXISTS {name}'
+            ))
+            connection.execute(text(f'ALTER TABLE message ADD CONSTRAINT {name} CHECK ({condition}) NOT VALID'))
+            connection.execute(text(f'ALTER TABLE message VALIDATE CONSTRAINT {name}'))
+
+    with engine.begin() as connection:
+        # Both use the validated constraints above instead of scanning the table
+        connection.execute(text('ALTER TABLE message ALTER COLUMN timestamp SET NOT NULL'))
+        connection.execute(text(
+            'ALTER TABLE message ADD CONSTRAINT message_legacy_id_timestamp_key '
+            'UNIQUE USING INDEX message_legacy_id_timestamp_key'
+        ))
+
+        connection.execute(text('ALTER TABLE message RENAME TO message_legacy'))
+        # Free the index name for the partitioned index; the legacy index is attached to it below
+        connection.execute(text(
+            'ALTER INDEX IF EXISTS ix_message_conversation_id_timestamp '
+            'RENAME TO message_legacy_conversation_id_timestamp_idx'
+        ))
+        connection.execute(text(
+            'CREATE TABLE message (LIKE message_legacy INCLUDING DEFAULTS, '
+            'PRIMARY KEY (id, timestamp)) PARTITION BY RANGE (timestamp)'
+        ))
+        connection.execute(text(
+            'ALTER TABLE message ADD FOREIGN KEY (conversation_id) REFERENCES conversation (id)'
+        ))
+        connection.execute(text(
+            f"ALTER TABLE message ATTACH PARTITION message_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary}')"
+        ))
+        connection.execute(text('CREATE TABLE IF NOT EXISTS message_default PARTITION OF message DEFAULT'))
+
+        # Partitioned index; the legacy partition's existing index is reused rather than rebuilt
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_message_conversation_id_timestamp '
+            'ON message (conversation_id, timestamp)'
+        ))
+
+    return add_message_partitions(engine, start=date.fromisoformat(boundary), months_ahead=months_ahead)
+
+def _existing_indexes(engine):
+    inspector = inspect(engine)
+    return {
+        table: {index['name'] for index in inspector.get_indexes(table)}
+        for table in {table for _, table, _ in INDEXES}
+        if inspector.has_table(table)
+    }
+
+def _drop_invalid_index(connection, name):
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {'name': name}).scalar()
+    if invalid:
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+def main():
+    parser = argparse.ArgumentParser(description='Online schema changes for the chat database')
+    parser.add_argument('command', choices=['schema', 'indexes', 'backfill-conversation-organizations',
+                                            'partition-messages', 'add-partitions'])
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'postgresql://postgres:postgres@db:5432/clai_chat'))
+    parser.add_argument('--months-ahead', type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+
+    if args.command == 'schema':
+        added = upgrade_schema(engine)
+        print(f"Added: {', '.join(added) or 'nothing (schema up to date)'}")
+    elif args.command == 'indexes':
+        created = create_indexes(engine)
+        print(f"Created indexes: {', '.join(created) or 'none (all present)'}")
+    elif args.command == 'backfill-conversation-organizations':
+        updated = backfill_conversation_organizations(engine)
+        print(f'Backfilled organization_id on {updated} conversations')
+    elif args.command == 'partition-messages':
+        partitions = partition_message_table(engine, months_ahead=args.months_ahead)
+        print(f"Message partitions: {', '.join(partitions)}")
+    else:
+        partitions = add_message_partitions(engine, months_ahead=args.months_ahead)
+        print(f"Message partitions: {', '.join(partitions)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import time
+
+from sqlalchemy import text
+
+from config.config import setting
+
+class Deadline:
+    """
+    Request-scoped time budget, created at the entry point (HTTP route or
+    socket handler) and passed down so each stage knows how much time is left.
+    """
+    def __init__(self, seconds):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def for_request(cls, seconds=None):
+        """
+        Start the deadline for an incoming chat request (REQUEST_DEADLINE_SECONDS by default)
+        """
+        if seconds is None:
+            seconds = setting('REQUEST_DEADLINE_SECONDS')
+        return cls(seconds)
+
+    def remaining(self):
+        """
+        Seconds left, never negative
+        """
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def has_at_least(self, seconds):
+        """
+        Check whether at least this many seconds remain
+        """
+        return self.remaining() >= seconds
+
+    def timeout(self, default):
+        """
+        Shrink a stage's own timeout so it never outlives the request
+        """
+        return min(default, self.remaining())
+
+def apply_statement_timeout(session, deadline):
+    """
+    Bound Postgres statements in the current transaction by the remaining budget
+    """
+    if deadline is None or session.get_bind().dialect.name != 'postgresql':
+        return
+
+    timeout_ms = max(1, int(deadline.remaining() * 1000))
+    session.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {'timeout': str(timeout_ms)}
+    )
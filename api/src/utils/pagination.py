@@ -0,0 +1,33 @@
+import base64
+import json
+from datetime import datetime
+
+def encode_cursor(timestamp, row_id):
+    """
+    Opaque keyset cursor for the row after (timestamp, id)
+    """
+    data = json.dumps([timestamp.isoformat() if timestamp else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    (timestamp, id) from a cursor made by encode_cursor; raises ValueError if it is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def after_keyset(timestamp_column, id_column, timestamp, row_id):
+    """
+    SQL condition for rows strictly after (timestamp, id) in (timestamp, id) order
+    """
+    return (timestamp_column > timestamp) | ((timestamp_column == timestamp) & (id_column > row_id))
+
+def before_keyset(timestamp_column, id_column, timestamp, row_id):
+    """
+    SQL condition for rows strictly before (timestamp, id) in (timestamp, id) order
+    """
+    return (timestamp_column < timestamp) | ((timestamp_column == timestamp) & (id_column < row_id))
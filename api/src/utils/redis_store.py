@@ -0,0 +1,211 @@
+import fnmatch
+import os
+import queue
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is in requirements, but keep the local store usable without it
+    redis = None
+
+class LocalPubSub:
+    """
+    In-process stand-in for a redis PubSub object
+    """
+    def __init__(self, store):
+        self._store = store
+        self._messages = queue.Queue()
+        self.channels = set()
+
+    def subscribe(self, *channels):
+        for channel in channels:
+            self.channels.add(channel)
+        self._store._add_subscriber(self)
+
+    def unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.channels.discard(channel)
+        if not self.channels:
+            self._store._remove_subscriber(self)
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self._messages.get(timeout=timeout) if timeout else self._messages.get_nowait()
+        except queue.Empty:
+            return None
+
+    def listen(self):
+        while True:
+            yield self._messages.get()
+
+    def close(self):
+        self.unsubscribe()
+
+    def _deliver(self, channel, data):
+        self._messages.put({'type': 'message', 'channel': channel, 'data': data})
+
+class LocalStore:
+    """
+    In-process stand-in for the subset of the redis client API the app uses.
+
+    Values are stored as strings (like a client created with
+    decode_responses=True), lists as Python lists, and keys honour expiry. It only shares state
+    within one process, so it is meant for tests and single-worker development.
+    """
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._subscribers = []
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._data[key] = str(value)
+            self._set_expiry(key, ex, px)
+            return True
+
+    def delete(self, *keys):
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._live(key) is not None:
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def exists(self, key):
+        with self._lock:
+            return 1 if self._live(key) is not None else 0
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._live(key) or 0) + amount
+            self._data[key] = str(value)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            if self._live(key) is None:
+                return False
+            self._set_expiry(key, seconds, None)
+            return True
+
+    def ttl(self, key):
+        with self._lock:
+            if self._live(key) is None:
+                return -2
+            if key not in self._expires:
+                return -1
+            return int(self._expires[key] - time.monotonic())
+
+    def keys(self, pattern='*'):
+        with self._lock:
+            return [key for key in list(self._data) if self._live(key) is not None and fnmatch.fnmatch(key, pattern)]
+
+    def rpush(self, key, *values):
+        with self._lock:
+            items = self._live(key)
+            if items is None:
+                items = self._data[key] = []
+            items.extend(str(value) for value in values)
+            return len(items)
+    
+    def lrange(self, key, start, end):
+        with self._lock:
+            items = self._live(key) or []
+            return list(items[self._slice(items, start, end)])
+    
+    def ltrim(self, key, start, end):
+        with self._lock:
+            items = self._live(key)
+            if items is not None:
+                items[:] = items[self._slice(items, start, end)]
+                if not items:
+                    self._data.pop(key, None)
+                    self._expires.pop(key, None)
+            return True
+    
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = [s for s in self._subscribers if channel in s.channels]
+        for subscriber in subscribers:
+            subscriber._deliver(channel, message)
+        return len(subscribers)
+
+    def pubsub(self, **kwargs):
+        return LocalPubSub(self)
+
+    def ping(self):
+        return True
+
+    def _add_subscriber(self, pubsub):
+        with self._lock:
+            if pubsub not in self._subscribers:
+                self._subscribers.append(pubsub)
+
+    def _remove_subscriber(self, pubsub):
+        with self._lock:
+            if pubsub in self._subscribers:
+                self._subscribers.remove(pubsub)
+
+    @staticmethod
+    def _slice(items, start, end):
+        """
+        Python slice for redis list indexes (inclusive end, negatives count from the tail)
+        """
+        start = max(0, len(items) + start) if start < 0 else start
+        end = len(items) + end if end < 0 else end
+        return slice(start, max(start, end + 1))
+    
+    def _set_expiry(self, key, ex, px):
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        elif px is not None:
+            self._expires[key] = time.monotonic() + px / 1000
+        else:
+            self._expires.pop(key, None)
+
+    def _live(self, key):
+        """
+        Value for key, dropping it first if it has expired (lock held)
+        """
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+# What a store call raises when Redis is unreachable or fails; the LocalStore never does
+if redis is not None:
+    StoreError = redis.RedisError
+else:  # pragma: no cover
+    class StoreError(Exception):
+        pass
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_redis():
+    """
+    Get the shared Redis client, or the in-process LocalStore when REDIS_URL is not set
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = os.environ.get('REDIS_URL')
+                if url and redis is not None:
+                    _store = redis.Redis.from_url(url, decode_responses=True)
+                else:
+                    _store = LocalStore()
+
+    return _store
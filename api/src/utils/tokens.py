@@ -0,0 +1,70 @@
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tiktoken is optional
+    tiktoken = None
+
+# Per-message overhead used by the OpenAI chat format
+# (see the OpenAI cookbook "How to count tokens with tiktoken")
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+# Rough characters-per-token ratio for English text, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+_encodings = {}
+
+def _get_encoding(model_name):
+    """
+    Get (and cache) the tiktoken encoding for a model, or None if tiktoken is
+    unavailable or its encoding cannot be loaded (tiktoken downloads encodings
+    on first use, which fails without network access). Failures are cached too,
+    so counting falls back to the character estimate without retrying.
+    """
+    if tiktoken is None:
+        return None
+
+    if model_name not in _encodings:
+        try:
+            try:
+                _encodings[model_name] = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                _encodings[model_name] = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            logger.warning('Could not load the tiktoken encoding for %s, estimating token counts', model_name, exc_info=True)
+            _encodings[model_name] = None
+
+    return _encodings[model_name]
+
+def count_text_tokens(text, model_name='gpt-3.5-turbo'):
+    """
+    Count the tokens in a piece of text
+    """
+    if not text:
+        return 0
+
+    encoding = _get_encoding(model_name)
+    if encoding is not None:
+        return len(encoding.encode(text))
+
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+def count_message_tokens(messages, model_name='gpt-3.5-turbo'):
+    """
+    Count the prompt tokens for a list of chat messages (langchain messages or role/content dicts)
+    """
+    total = TOKENS_PER_REPLY
+    for message in messages:
+        content = message['content'] if isinstance(message, dict) else message.content
+        total += TOKENS_PER_MESSAGE + count_text_tokens(content, model_name)
+
+    return total
+
+def tokenizer_name(model_name='gpt-3.5-turbo'):
+    """
+    Name of the tokenizer backing the local counts for a model, recorded alongside usage
+    """
+    return 'tiktoken' if _get_encoding(model_name) is not None else 'estimate'
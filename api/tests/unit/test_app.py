@@ -0,0 +1,39 @@
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'src')
+
+def test_app_imports_and_registers_routes():
+    """Test the app module (what run.py serves) imports with its models, routes and Socket.IO wiring"""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, LLM_PROVIDER='mock', SOCKETIO_ASYNC_MODE='threading')
+    env.pop('REDIS_URL', None)
+    
+    result = subprocess.run(
+        [sys.executable, '-c', "from app import app; print(sorted(rule.rule for rule in app.url_map.iter_rules()))"],
+        cwd=SRC_DIR, env=env, capture_output=True, text=True, timeout=60
+    )
+    
+    assert result.returncode == 0, result.stderr
+    assert '/api/conversations/' in result.stdout
+    assert '/api/analytics/socket-workers' in result.stdout
+
+def test_app_configures_process_wide_services():
+    """Test settings reach the services through the app config rather than their own defaults"""
+    env = dict(os.environ, PYTHONPATH=SRC_DIR, SOCKETIO_ASYNC_MODE='threading', CONVERSATION_CACHE_WINDOW='4',
+               CONVERSATION_SWEEP_LOCK_TTL='15', RATE_LIMIT_TIERS='{"free": {}}', SOCKET_WORKERS='8')
+    env.pop('REDIS_URL', None)
+    script = (
+        "from app import app\n"
+        "from services.conversation_cache import conversation_cache\n"
+        "from services.conversation_sweeper import conversation_sweeper\n"
+        "from services.rate_limiter import rate_limiter\n"
+        "from services.socket_workers import socket_workers\n"
+        "print(conversation_cache.window, conversation_sweeper.lock_ttl, rate_limiter.tiers, socket_workers.max_workers)"
+    )
+    
+    result = subprocess.run([sys.executable, '-c', script], cwd=SRC_DIR, env=env, capture_output=True, text=True,
+                            timeout=60)
+    
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split('\n')[-2] == "4 15 {'free': {}} 8"
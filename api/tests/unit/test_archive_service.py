@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import db, ChatBot, Conversation, ConversationArchive, Message, Organization
+from services.archive_service import ArchiveService, available_codecs, compress, decompress
+from services.conversation_service import ConversationService
+
+@pytest.mark.parametrize('codec', available_codecs())
+def test_compress_round_trip(codec):
+    """Test archived transcripts decompress to the original bytes"""
+    data = json.dumps([{'sender_type': 'human', 'content': 'Hello ' * 50}]).encode('utf-8')
+    
+    payload = compress(data, codec)
+    
+    assert decompress(payload, codec) == data
+    assert len(payload) < len(data)
+
+def test_unknown_codec_is_rejected():
+    """Test an unknown codec raises instead of writing unreadable archives"""
+    with pytest.raises(ValueError):
+        compress(b'data', 'lz4')
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['LLM_PROVIDER'] = 'mock'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "archive.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([Organization(id=1, name='Org'), ChatBot(id=1, name='Bot', organization_id=1)])
+        ended = datetime.utcnow() - timedelta(days=120)
+        db.session.add_all([
+            Conversation(id=1, chatbot_id=1, organization_id=1, status='ended', started_at=ended, ended_at=ended),
+            Conversation(id=2, chatbot_id=1, organization_id=1, status='active', started_at=ended)
+        ])
+        # Two messages share a timestamp, so paging has to break the tie on id
+        for offset in (0, 1, 1, 2):
+            db.session.add(Message(conversation_id=1, sender_type='human', content=f'at {offset}',
+                                   timestamp=ended + timedelta(seconds=offset)))
+        db.session.add(Message(conversation_id=2, sender_type='human', content='still here', timestamp=ended))
+        db.session.commit()
+        yield app
+
+def test_archive_moves_messages_and_pages_them_back(app):
+    """Test archived messages leave the message table and still page back in order"""
+    totals = ArchiveService(older_than_days=90).archive_ended_conversations()
+    
+    assert totals['conversations'] == 1
+    assert totals['messages'] == 4
+    assert Message.query.filter_by(conversation_id=1).count() == 0
+    assert Message.query.filter_by(conversation_id=2).count() == 1
+    assert Conversation.query.get(1).archived_at is not None
+    assert Conversation.query.get(2).archived_at is None
+    assert ConversationArchive.query.filter_by(conversation_id=1).one().message_count == 4
+    
+    service = ConversationService(ChatBot.query.get(1), organization_id=1)
+    pages, cursor = [], None
+    while True:
+        page = service.get_conversation(1, limit=2, cursor=cursor)
+        assert page['conversation']['archived']
+        pages.append([message['id'] for message in page['messages']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    
+    assert pages == [[1, 2], [3, 4]]
+    assert [m['content'] for m in service.get_conversation(1)['messages']] == ['at 0', 'at 1', 'at 1', 'at 2']
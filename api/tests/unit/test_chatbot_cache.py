@@ -0,0 +1,114 @@
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services import chatbot_cache as chatbot_cache_module
+from services.chatbot_cache import ChatBotCache, ChatBotSnapshot, build_canned_responses, normalize_message
+from utils.redis_store import LocalStore
+
+def make_chatbot(config):
+    return SimpleNamespace(
+        id=1,
+        name='Test Bot',
+        organization_id=1,
+        allowed_responses=None,
+        forbidden_responses=None,
+        config=config,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+
+def test_normalize_message_ignores_case_spacing_and_punctuation():
+    """Test small differences in typing match the same canned response"""
+    assert normalize_message('  What are your   HOURS?! ') == 'what are your hours'
+    assert normalize_message(None) == ''
+
+def test_build_canned_responses_skips_incomplete_entries():
+    """Test entries without a response or a message are ignored"""
+    responses = build_canned_responses({
+        'openingMessages': [{'message': 'Pricing', 'response': 'Plans start at $10.'}],
+        'quickReplies': [
+            {'label': 'Talk to sales', 'response': 'Sure, leave your email.'},
+            {'label': 'No answer'},
+            'not a dict'
+        ]
+    })
+    
+    assert responses == {
+        'pricing': ('Plans start at $10.', 'opening'),
+        'talk to sales': ('Sure, leave your email.', 'quick_reply')
+    }
+
+def test_opening_messages_only_match_the_first_turn():
+    """Test opening messages are answered on the first turn and quick replies on any turn"""
+    snapshot = ChatBotSnapshot(make_chatbot({
+        'openingMessages': [{'message': 'Pricing', 'response': 'Plans start at $10.'}],
+        'quickReplies': [{'label': 'Hours', 'response': 'We are open 9-5.'}]
+    }))
+    
+    assert snapshot.canned_response('pricing', first_turn=True) == ('Plans start at $10.', 'opening')
+    assert snapshot.canned_response('pricing', first_turn=False) is None
+    assert snapshot.canned_response('Hours?') == ('We are open 9-5.', 'quick_reply')
+    assert snapshot.canned_response('Something else', first_turn=True) is None
+
+def test_snapshot_config_is_deeply_read_only():
+    """Test nested config values cannot be changed through a shared snapshot"""
+    snapshot = ChatBotSnapshot(make_chatbot({'theme': {'primaryColor': '#0088CC'}, 'quickReplies': [{'label': 'Hours'}]}))
+    
+    with pytest.raises(TypeError):
+        snapshot.config['theme']['primaryColor'] = '#000000'
+    with pytest.raises(AttributeError):
+        snapshot.config['quickReplies'].append({'label': 'Pricing'})
+    
+    assert json.loads(json.dumps(snapshot.config)) == {'theme': {'primaryColor': '#0088CC'}, 'quickReplies': [{'label': 'Hours'}]}
+    config = snapshot.to_dict()['config']
+    config['theme']['primaryColor'] = '#000000'
+    assert snapshot.config['theme']['primaryColor'] == '#0088CC'
+
+class FailingRedis:
+    def publish(self, channel, message):
+        raise ConnectionError('redis is down')
+    
+    def pubsub(self):
+        raise ConnectionError('redis is down')
+
+def test_invalidate_survives_a_redis_outage(monkeypatch):
+    """Test an invalidation still drops the local copy when it cannot be published"""
+    monkeypatch.setattr(chatbot_cache_module, 'get_redis', lambda: FailingRedis())
+    cache = ChatBotCache()
+    cache._entries[1] = (ChatBotSnapshot(make_chatbot({})), time.monotonic())
+    
+    cache.invalidate(1)
+    
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['publish_errors'] == 1
+
+def test_listener_resubscribes_after_the_connection_drops(monkeypatch):
+    """Test invalidations keep arriving after the pub/sub connection fails"""
+    store = LocalStore()
+    connections = []
+    
+    def get_redis():
+        connections.append(1)
+        return FailingRedis() if len(connections) == 1 else store
+    
+    monkeypatch.setattr(chatbot_cache_module, 'get_redis', get_redis)
+    cache = ChatBotCache(retry_delay=0.01)
+    cache._ensure_listener()
+    for _ in range(100):
+        if store._subscribers:
+            break
+        time.sleep(0.01)
+    
+    updated_at = datetime(2024, 1, 1)
+    store.publish(chatbot_cache_module.INVALIDATION_CHANNEL, json.dumps({'chatbot_id': 1, 'updated_at': updated_at.isoformat()}))
+    for _ in range(100):
+        if cache._invalidated.get(1):
+            break
+        time.sleep(0.01)
+    
+    assert cache._invalidated.get(1) == updated_at
+    assert cache.stats()['listener_errors'] == 1
@@ -0,0 +1,37 @@
+import time
+
+from services.circuit_breaker import CircuitBreaker
+
+def test_breaker_opens_on_error_rate():
+    """Test the breaker opens once the error rate crosses its threshold"""
+    breaker = CircuitBreaker('test-model', min_calls=4, error_rate_threshold=0.5, cooldown_seconds=60)
+    
+    breaker.record_success(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.allow_request()
+    
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+def test_breaker_opens_on_slow_calls():
+    """Test slow successful calls also open the breaker"""
+    breaker = CircuitBreaker('test-model', min_calls=2, slow_call_seconds=1.0, slow_rate_threshold=0.5)
+    
+    breaker.record_success(2.0)
+    breaker.record_success(2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_breaker_half_open_probe():
+    """Test a single probe is allowed after the cooldown and closes the breaker on success"""
+    breaker = CircuitBreaker('test-model', min_calls=1, cooldown_seconds=0.01)
+    
+    breaker.record_failure(0.1)
+    time.sleep(0.02)
+    
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
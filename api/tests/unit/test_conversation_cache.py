@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+import redis
+from flask import Flask
+
+from models import db, Conversation, Message
+from services.conversation_cache import ConversationCache
+
+def test_started_conversation_is_served_from_cache():
+    """Test a cached conversation is read without touching the database"""
+    cache = ConversationCache(idle_ttl=60, window=3)
+    cache.put(Conversation(id=9001, chatbot_id=2, visitor_id='visitor', status='active'), organization_id=5)
+    
+    state = cache.get(9001)
+    
+    assert state.is_active
+    assert state.chatbot_id == 2
+    assert state.organization_id == 5
+    assert state.messages == ()
+    assert cache.stats()['hits'] == 1
+
+def test_append_keeps_recent_window():
+    """Test appended messages are capped to the configured window"""
+    cache = ConversationCache(idle_ttl=60, window=3)
+    cache.put(Conversation(id=9002, chatbot_id=2, status='active'), organization_id=5)
+    
+    for number in range(5):
+        assert cache.append_message(9002, 'human', f'message {number}')
+    
+    history = cache.get(9002).history()
+    assert [message.content for message in history] == ['message 2', 'message 3', 'message 4']
+
+def test_evict_and_cold_append():
+    """Test ended conversations are dropped and appends skip cold entries"""
+    cache = ConversationCache(idle_ttl=60, window=3)
+    cache.put(Conversation(id=9003, chatbot_id=2, status='active'), organization_id=5)
+    
+    cache.evict(9003)
+    
+    assert cache.append_message(9003, 'bot', 'late reply') is False
+
+class UnavailableStore:
+    """Store whose every call fails the way redis-py does when Redis is down"""
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError('Error 111 connecting to redis:6379. Connection refused.')
+        return fail
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "cache.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Conversation(id=1, chatbot_id=2, organization_id=5, visitor_id='visitor', status='active'))
+        db.session.add_all([
+            Message(conversation_id=1, sender_type='human', content='Hi', timestamp=datetime(2024, 1, 1, 12, 0)),
+            Message(conversation_id=1, sender_type='bot', content='Hello!', timestamp=datetime(2024, 1, 1, 12, 1))
+        ])
+        db.session.commit()
+        monkeypatch.setattr('services.conversation_cache.get_redis', UnavailableStore)
+        yield app
+
+def test_store_outage_falls_back_to_database(app):
+    """Test reads are served from the database and writes are skipped while the store is down"""
+    cache = ConversationCache(idle_ttl=60, window=3)
+    
+    state = cache.get(1)
+    
+    assert state.is_active
+    assert state.organization_id == 5
+    assert [message['content'] for message in state.messages] == ['Hi', 'Hello!']
+    assert [message.timestamp for message in state.history()] == [datetime(2024, 1, 1, 12, 0), datetime(2024, 1, 1, 12, 1)]
+    assert cache.append_message(1, 'human', 'Still there?') is False
+    cache.evict(1)
+    cache.put(Conversation(id=2, chatbot_id=2, status='active'), organization_id=5)
+    
+    stats = cache.stats()
+    assert stats['hits'] == 0
+    assert stats['evictions'] == 0
+    assert stats['store_errors'] == 6  # read + re-cache, append + its evict, evict, put
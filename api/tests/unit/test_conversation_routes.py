@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+import redis
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from models import db, ChatBot, Conversation, Organization, User
+from routes.conversation import conversation_routes
+from utils.redis_store import get_redis
+
+STARTED = datetime(2024, 6, 1, 12, 0)
+
+@pytest.fixture
+def client(tmp_path):
+    app = Flask(__name__)
+    app.config['LLM_PROVIDER'] = 'mock'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "routes.db"}'
+    app.config['JWT_SECRET_KEY'] = 'test-jwt-key-at-least-32-bytes-long'
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(conversation_routes)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Organization(id=1, name='Org'),
+            ChatBot(id=1, name='Bot', organization_id=1),
+            User(id=1, email='owner@example.com', password_hash='-', organization_id=1)
+        ])
+        # Conversations 2, 3 and 4 started at the same moment; the id breaks the tie
+        for conversation_id, minutes in ((1, 0), (2, 5), (3, 5), (4, 5), (5, 10)):
+            db.session.add(Conversation(id=conversation_id, chatbot_id=1, organization_id=1, status='active',
+                                        started_at=STARTED + timedelta(minutes=minutes)))
+        db.session.commit()
+        token = create_access_token(identity='1')
+    get_redis().delete('conversation_count:1:all')
+    
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    yield client
+    get_redis().delete('conversation_count:1:all')
+
+def test_listing_pages_by_cursor_across_equal_start_times(client):
+    """Test keyset pages cover every conversation once, newest first, with ties broken by id"""
+    ids, cursor = [], None
+    while True:
+        response = client.get('/api/conversations/', query_string={'per_page': 2, 'cursor': cursor or ''})
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['items']) <= 2
+        ids += [item['id'] for item in body['items']]
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    
+    assert ids == [5, 4, 3, 2, 1]
+
+@pytest.mark.parametrize('mode, total, estimate', [('exact', 5, False), ('cached', 5, True), ('none', None, False)])
+def test_listing_total_modes(client, mode, total, estimate):
+    """Test the total is counted, cached or skipped as asked"""
+    body = client.get('/api/conversations/', query_string={'total': mode}).get_json()
+    
+    assert body['total'] == total
+    assert body['total_is_estimate'] is estimate
+    assert client.get('/api/conversations/', query_string={'total': 'maybe'}).status_code == 400
+
+def test_cached_total_survives_store_outage(client, monkeypatch):
+    """Test a store failure falls back to counting instead of failing the listing"""
+    def unavailable():
+        raise redis.ConnectionError('Connection refused')
+    monkeypatch.setattr('routes.conversation.get_redis', unavailable)
+    
+    response = client.get('/api/conversations/')
+    
+    assert response.status_code == 200
+    assert response.get_json()['total'] == 5
+
+def test_deprecated_page_parameter_still_pages(client):
+    """Test ?page= keeps working for one release, with an exact total and a Deprecation header"""
+    response = client.get('/api/conversations/', query_string={'page': 2, 'per_page': 2})
+    body = response.get_json()
+    
+    assert response.status_code == 200
+    assert response.headers['Deprecation'] == 'true'
+    assert [item['id'] for item in body['items']] == [3, 2]
+    assert (body['total'], body['pages'], body['current_page']) == (5, 3, 2)
+    
+    # The cursor from an offset page continues with the keyset listing
+    follow = client.get('/api/conversations/', query_string={'per_page': 2, 'cursor': body['next_cursor']})
+    assert [item['id'] for item in follow.get_json()['items']] == [1]
+    
+    assert client.get('/api/conversations/', query_string={'page': 1, 'cursor': body['next_cursor']}).status_code == 400
+    assert client.get('/api/conversations/', query_string={'page': 0}).status_code == 400
@@ -0,0 +1,129 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from models import db, ChatBot, Conversation, ConversationMetrics, Message, Organization
+from services.conversation_cache import conversation_cache
+from services.conversation_service import ConversationService
+from services.llm_service import LLMService
+from services.message_buffer import MessageBuffer
+
+STARTED = datetime(2024, 6, 1, 12, 0)
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['LLM_PROVIDER'] = 'mock'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "conversations.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Organization(id=1, name='Org'),
+            ChatBot(id=1, name='Bot', organization_id=1),
+            Conversation(id=1, chatbot_id=1, organization_id=1, status='active', started_at=STARTED),
+            ConversationMetrics(conversation_id=1, organization_id=1, chatbot_id=1, message_count=5)
+        ])
+        # Messages 2 and 3 share a timestamp
+        for offset in (0, 1, 1, 2, 3):
+            db.session.add(Message(conversation_id=1, sender_type='human', content=f'at {offset}',
+                                   timestamp=STARTED + timedelta(seconds=offset)))
+        db.session.commit()
+        conversation_cache.evict(1)
+        yield app
+    conversation_cache.evict(1)
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = MessageBuffer()
+    monkeypatch.setattr('services.conversation_service.message_buffer', buffer)
+    return buffer
+
+def read_pages(service, limit):
+    pages, cursor = [], None
+    while True:
+        page = service.get_conversation(1, limit=limit, cursor=cursor)
+        pages.append([message['id'] for message in page['messages']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+def test_get_conversation_pages_in_timestamp_id_order(app, buffer):
+    """Test cursor pages cover every message once, breaking timestamp ties by id"""
+    service = ConversationService(ChatBot.query.get(1), organization_id=1)
+    
+    assert read_pages(service, 2) == [[1, 2], [3, 4], [5]]
+    assert read_pages(service, 5) == [[1, 2, 3, 4, 5]]
+
+@pytest.mark.parametrize('limit, pages', [
+    (2, [[1, 2], [3, 4], [5], [None, None]]),
+    (3, [[1, 2, 3], [4, 5], [None, None]]),
+    (4, [[1, 2, 3, 4], [5, None, None]])
+])
+def test_get_conversation_pages_never_exceed_limit_with_pending_rows(app, buffer, limit, pages):
+    """Test write-behind rows follow the written ones without overfilling the last page"""
+    buffer.enqueue(1, 'human', 'queued', timestamp=STARTED + timedelta(seconds=4))
+    buffer.enqueue(1, 'bot', 'queued reply', timestamp=STARTED + timedelta(seconds=5))
+    service = ConversationService(ChatBot.query.get(1), organization_id=1)
+    
+    assert read_pages(service, limit) == pages
+    assert len(service.get_conversation(1)['messages']) == 7
+
+def llm_reply(prompt, deadline=None, message=None, **kwargs):
+    return {'content': f'Re: {message}', 'model': 'gpt-3.5-turbo', 'prompt_tokens': 10, 'completion_tokens': 5,
+            'total_tokens': 15, 'latency_ms': 20}
+
+def test_concurrent_turns_both_count(app, monkeypatch):
+    """Test two turns in flight at once each add their messages and tokens to the metrics"""
+    in_flight = threading.Barrier(2, timeout=5)
+    
+    def both_waiting(self, prompt, **kwargs):
+        # Both turns have written their user message before either writes its reply
+        in_flight.wait()
+        return llm_reply(prompt, **kwargs)
+    
+    monkeypatch.setattr(LLMService, 'get_chat_response', both_waiting)
+    errors = []
+    
+    def turn(content):
+        try:
+            with app.app_context():
+                ConversationService(ChatBot.query.get(1), organization_id=1).process_message(1, content)
+        except Exception as error:
+            errors.append(error)
+    
+    threads = [threading.Thread(target=turn, args=(content,)) for content in ('first', 'second')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    
+    assert errors == []
+    metrics = ConversationMetrics.query.filter_by(conversation_id=1).one()
+    assert (metrics.message_count, metrics.llm_call_count, metrics.prompt_tokens) == (9, 2, 20)
+    assert Message.query.filter_by(sender_type='bot').count() == 2
+
+def test_failed_metrics_update_rolls_back_the_bot_message(app, monkeypatch):
+    """Test the bot message is not kept when its metrics cannot be written, while the user message is"""
+    monkeypatch.setattr(LLMService, 'get_chat_response', lambda self, prompt, **kwargs: llm_reply(prompt, **kwargs))
+    
+    def fail_metrics(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE conversation_metrics'):
+            raise OperationalError(statement, parameters, Exception('canceling statement due to statement timeout'))
+    
+    event.listen(db.engine, 'before_cursor_execute', fail_metrics)
+    try:
+        with pytest.raises(OperationalError):
+            ConversationService(ChatBot.query.get(1), organization_id=1).process_message(1, 'Hello?')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', fail_metrics)
+    db.session.rollback()
+    
+    assert [message.sender_type for message in Message.query.filter_by(content='Hello?')] == ['human']
+    assert Message.query.filter_by(sender_type='bot').count() == 0
+    assert ConversationMetrics.query.filter_by(conversation_id=1).one().message_count == 5
+    assert [message['sender_type'] for message in conversation_cache.get(1).messages][-1] == 'human'
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import db, Conversation, ConversationMetrics, Message
+from services.conversation_cache import KEY_PREFIX as CACHE_KEY_PREFIX, conversation_cache
+from services.conversation_sweeper import LOCK_KEY, RESUME_KEY, ConversationSweeper
+from utils.redis_store import get_redis
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+def test_sweep_skips_when_another_worker_holds_the_lock():
+    """Test only one worker sweeps per interval"""
+    store = get_redis()
+    store.set(LOCK_KEY, 'other-worker', ex=60)
+    sweeper = ConversationSweeper(interval=60)
+    
+    try:
+        assert sweeper.sweep() is None
+        assert sweeper.stats()['skipped_locked'] == 1
+        assert sweeper.stats()['runs'] == 0
+    finally:
+        store.delete(LOCK_KEY)
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "sweeper.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        started = NOW - timedelta(hours=2)
+        for conversation_id, last_message in ((1, NOW - timedelta(hours=1)), (2, NOW - timedelta(minutes=5))):
+            db.session.add(Conversation(id=conversation_id, chatbot_id=1, organization_id=1, status='active',
+                                        started_at=started))
+            db.session.add(ConversationMetrics(conversation_id=conversation_id, organization_id=1, chatbot_id=1,
+                                               message_count=1, completed=False))
+            db.session.add(Message(conversation_id=conversation_id, sender_type='human', content='Hi',
+                                   timestamp=last_message))
+        db.session.commit()
+        get_redis().delete(LOCK_KEY, RESUME_KEY)
+        yield app
+        get_redis().delete(LOCK_KEY, RESUME_KEY)
+
+def test_sweep_ends_idle_conversation(app):
+    """Test an idle conversation is ended at its last message, with its metrics filled in and its cache entry dropped"""
+    conversation_cache.put(Conversation.query.get(1), organization_id=1)
+    sweeper = ConversationSweeper(idle_timeout=1800, interval=0)
+    
+    assert sweeper.sweep(now=NOW) == 1
+    
+    conversation = Conversation.query.get(1)
+    assert conversation.status == 'ended'
+    assert conversation.ended_at == NOW - timedelta(hours=1)
+    metrics = ConversationMetrics.query.filter_by(conversation_id=1).one()
+    assert metrics.completed is True
+    assert metrics.duration_seconds == 3600
+    assert not get_redis().exists(f'{CACHE_KEY_PREFIX}:1')
+    
+    # Released once the run is over
+    assert get_redis().get(LOCK_KEY) is None
+
+def test_sweep_leaves_recently_active_conversation(app):
+    """Test a conversation with a message inside the idle timeout stays active"""
+    sweeper = ConversationSweeper(idle_timeout=1800, interval=0)
+    
+    sweeper.sweep(now=NOW)
+    
+    conversation = Conversation.query.get(2)
+    assert conversation.status == 'active'
+    assert conversation.ended_at is None
+    assert ConversationMetrics.query.filter_by(conversation_id=2).one().completed is False
+
+def test_sweep_stops_when_its_lock_changes_hands(app):
+    """Test a run whose lock expired and was taken by another worker stops before its next batch"""
+    sweeper = ConversationSweeper(idle_timeout=60, interval=0, batch_size=1, batch_pause=0, max_batches=5)
+    end_batch = sweeper._end_batch
+    
+    def end_batch_then_lose_lock(candidates, cutoff):
+        get_redis().set(LOCK_KEY, 'other-worker')
+        return end_batch(candidates, cutoff)
+    
+    sweeper._end_batch = end_batch_then_lose_lock
+    
+    assert sweeper.sweep(now=NOW) == 1
+    assert sweeper.stats()['lost_lock'] == 1
+    assert Conversation.query.get(2).status == 'active'
+    assert get_redis().get(LOCK_KEY) == 'other-worker'
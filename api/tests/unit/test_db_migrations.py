@@ -0,0 +1,72 @@
+from datetime import date
+
+from sqlalchemy import create_engine, inspect, text
+
+from utils.db_migrations import add_columns, create_indexes, drop_indexes, month_ranges, upgrade_schema
+
+def test_month_ranges_cross_year_boundary():
+    """Test monthly partition bounds roll over into the next year"""
+    assert month_ranges(date(2024, 11, 15), 3) == [
+        (date(2024, 11, 1), date(2024, 12, 1)),
+        (date(2024, 12, 1), date(2025, 1, 1)),
+        (date(2025, 1, 1), date(2025, 2, 1))
+    ]
+
+def test_create_indexes_is_idempotent():
+    """Test missing indexes are created once and skipped afterwards"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE message (id INTEGER PRIMARY KEY, conversation_id INTEGER, timestamp DATETIME)'))
+    indexes = [('ix_message_conversation_id_timestamp', 'message', ('conversation_id', 'timestamp'))]
+    
+    assert create_indexes(engine, indexes) == ['ix_message_conversation_id_timestamp']
+    assert create_indexes(engine, indexes) == []
+    
+    drop_indexes(engine, indexes)
+    assert inspect(engine).get_indexes('message') == []
+
+def test_add_columns_upgrades_existing_tables():
+    """Test columns added to the models are added to tables created before them, once"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE message (id INTEGER PRIMARY KEY, conversation_id INTEGER, content TEXT)'))
+        connection.execute(text('CREATE TABLE conversation_metrics (id INTEGER PRIMARY KEY, message_count INTEGER)'))
+        connection.execute(text('INSERT INTO conversation_metrics (id, message_count) VALUES (1, 4)'))
+    
+    added = add_columns(engine)
+    
+    assert 'message.llm_route' in added
+    assert 'conversation_metrics.canned_response_count' in added
+    assert add_columns(engine) == []
+    
+    # The write path's counter increments work on the upgraded table
+    with engine.begin() as connection:
+        connection.execute(text('INSERT INTO message (conversation_id, content, prompt_tokens, latency_ms, llm_route) '
+                                "VALUES (1, 'Hi', 12, 340, 'simple')"))
+        connection.execute(text('UPDATE conversation_metrics SET prompt_tokens = coalesce(prompt_tokens, 0) + 12'))
+        assert connection.execute(text('SELECT prompt_tokens FROM conversation_metrics')).scalar() == 12
+
+def test_upgrade_schema_adds_archive_table_and_column():
+    """Test the archive table and conversation.archived_at are added to an existing database"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE conversation (id INTEGER PRIMARY KEY, chatbot_id INTEGER, status VARCHAR(50))'))
+    
+    added = upgrade_schema(engine)
+    
+    assert 'conversation_archive' in added
+    assert 'conversation.archived_at' in added
+    assert 'archived_at' in {column['name'] for column in inspect(engine).get_columns('conversation')}
+    assert upgrade_schema(engine) == []
+
+def test_upgrade_schema_adds_export_jobs():
+    """Test the export job table is created, and an early copy of it gains the heartbeat column"""
+    engine = create_engine('sqlite://')
+    
+    assert 'export_job' in upgrade_schema(engine)
+    assert 'heartbeat_at' in {column['name'] for column in inspect(engine).get_columns('export_job')}
+    
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE export_job (id INTEGER PRIMARY KEY, status VARCHAR(20), started_at DATETIME)'))
+    assert 'export_job.heartbeat_at' in upgrade_schema(engine)
@@ -0,0 +1,22 @@
+import time
+
+from utils.deadline import Deadline
+
+def test_deadline_remaining_and_expiry():
+    """Test a deadline counts down and expires"""
+    deadline = Deadline(0.05)
+    
+    assert not deadline.expired()
+    assert deadline.has_at_least(0.01)
+    assert not deadline.has_at_least(1)
+    
+    time.sleep(0.06)
+    assert deadline.expired()
+    assert deadline.remaining() == 0
+
+def test_deadline_shrinks_stage_timeout():
+    """Test stage timeouts never outlive the request"""
+    deadline = Deadline(2)
+    
+    assert deadline.timeout(5) <= 2
+    assert deadline.timeout(1) == 1
@@ -0,0 +1,73 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from models import db, ExportJob
+from services.export_service import CSV_COLUMNS, ExportService
+
+def test_csv_writes_one_row_per_message():
+    """Test CSV exports flatten conversations into message rows"""
+    service = ExportService(export_dir='/tmp')
+    output = io.StringIO()
+    writer = service._csv_writer(output)
+    conversation = {
+        'id': 7, 'chatbot_id': 2, 'visitor_id': 'visitor', 'started_at': '2024-01-01T10:00:00',
+        'ended_at': None, 'status': 'active'
+    }
+    messages = [
+        {'id': 1, 'sender_type': 'human', 'timestamp': '2024-01-01T10:00:01', 'content': 'Hi, "there"'},
+        {'id': 2, 'sender_type': 'bot', 'timestamp': '2024-01-01T10:00:02', 'content': 'Hello!\nHow can I help?',
+         'llm_model_used': 'gpt-3.5-turbo'}
+    ]
+    
+    service._write_csv(writer, conversation, messages)
+    
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert list(rows[0].keys()) == CSV_COLUMNS
+    assert [row['content'] for row in rows] == ['Hi, "there"', 'Hello!\nHow can I help?']
+    assert rows[1]['conversation_id'] == '7'
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "export.db"}', EXPORT_DIR=str(tmp_path / 'exports'),
+                      EXPORT_STALE_SECONDS=900)
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+
+def test_export_dir_comes_from_app_config(app):
+    """Test the service writes where EXPORT_DIR in the app config says"""
+    assert ExportService().export_dir == app.config['EXPORT_DIR']
+
+def test_failure_while_starting_marks_the_job_failed(app, monkeypatch):
+    """Test an error counting conversations fails the job instead of leaving it running"""
+    service = ExportService()
+    job = service.create_job(organization_id=1)
+    
+    def broken_query(**filters):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(service, '_conversation_query', broken_query)
+    service.run(job.id)
+    
+    job = db.session.get(ExportJob, job.id)
+    assert job.status == 'failed'
+    assert 'database went away' in job.error
+
+def test_fail_stale_jobs_only_fails_jobs_without_recent_progress(app):
+    """Test running jobs whose process died are failed and live ones are left alone"""
+    now = datetime.utcnow()
+    stale = ExportJob(organization_id=1, status='running', started_at=now - timedelta(hours=2),
+                      heartbeat_at=now - timedelta(hours=1))
+    live = ExportJob(organization_id=1, status='running', started_at=now - timedelta(hours=2), heartbeat_at=now)
+    done = ExportJob(organization_id=1, status='completed', started_at=now - timedelta(hours=2))
+    db.session.add_all([stale, live, done])
+    db.session.commit()
+    
+    assert ExportService().fail_stale_jobs() == 1
+    
+    assert [job.status for job in ExportJob.query.order_by(ExportJob.id)] == ['failed', 'running', 'completed']
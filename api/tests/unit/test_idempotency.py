@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from services.idempotency import IdempotencyConflictError, IdempotencyKeyReusedError, IdempotencyStore
+
+def test_retry_returns_cached_result():
+    """Test a retried key replays the first result without running again"""
+    store = IdempotencyStore()
+    calls = []
+    
+    def process():
+        calls.append(1)
+        return {'content': 'Hello!'}
+    
+    assert store.run('conversation:1', 'retry-key', process, fingerprint='hi') == ({'content': 'Hello!'}, False)
+    assert store.run('conversation:1', 'retry-key', process, fingerprint='hi') == ({'content': 'Hello!'}, True)
+    assert len(calls) == 1
+
+def test_concurrent_duplicate_waits_for_first():
+    """Test a duplicate that arrives mid-flight waits for the first result"""
+    store = IdempotencyStore(poll_interval=0.01)
+    results = []
+    
+    def slow_process():
+        time.sleep(0.1)
+        return {'content': 'done'}
+    
+    threads = [
+        threading.Thread(target=lambda: results.append(store.run('conversation:2', 'same', slow_process)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+    assert all(result == {'content': 'done'} for result, _ in results)
+
+def test_key_reused_for_different_payload():
+    """Test a key can't be replayed for a different message"""
+    store = IdempotencyStore()
+    store.run('conversation:3', 'reused', lambda: {'content': 'a'}, fingerprint='first')
+    
+    with pytest.raises(IdempotencyKeyReusedError):
+        store.run('conversation:3', 'reused', lambda: {'content': 'b'}, fingerprint='second')
+
+def test_failed_request_releases_key():
+    """Test an exception releases the claim so a retry runs again"""
+    store = IdempotencyStore()
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    with pytest.raises(RuntimeError):
+        store.run('conversation:4', 'flaky', fail)
+    
+    assert store.run('conversation:4', 'flaky', lambda: {'content': 'ok'}) == ({'content': 'ok'}, False)
+
+def test_duplicate_gives_up_after_wait_timeout():
+    """Test a duplicate raises a conflict if the first request is still running"""
+    store = IdempotencyStore(poll_interval=0.01)
+    started = threading.Event()
+    
+    def slow_process():
+        started.set()
+        time.sleep(0.3)
+        return {}
+    
+    thread = threading.Thread(target=lambda: store.run('conversation:5', 'slow', slow_process))
+    thread.start()
+    started.wait()
+    
+    with pytest.raises(IdempotencyConflictError):
+        store.run('conversation:5', 'slow', slow_process, wait_timeout=0.05)
+    thread.join()
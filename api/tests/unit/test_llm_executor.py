@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from services.llm_executor import LLMExecutor, LLMCapacityError, LLMTimeoutError
+
+def test_executor_runs_call():
+    """Test the executor returns the call result"""
+    executor = LLMExecutor(max_concurrency=2, max_per_organization=1, max_queue=2)
+    
+    assert executor.run(lambda: 'ok', organization_id=1) == 'ok'
+    assert executor.stats()['submitted'] == 1
+
+def test_executor_rejects_expired_deadline():
+    """Test requests past their deadline are rejected before running"""
+    executor = LLMExecutor(max_concurrency=1, max_per_organization=1, max_queue=1)
+    
+    with pytest.raises(LLMCapacityError) as excinfo:
+        executor.run(lambda: 'ok', deadline=time.monotonic() - 1)
+    
+    assert excinfo.value.reason == 'deadline_unreachable'
+
+def test_executor_enforces_organization_limit():
+    """Test a busy organization cannot take more than its share of slots"""
+    executor = LLMExecutor(max_concurrency=4, max_per_organization=1, max_queue=4)
+    release = threading.Event()
+    
+    worker = threading.Thread(target=lambda: executor.run(release.wait, organization_id=1))
+    worker.start()
+    time.sleep(0.05)
+    
+    with pytest.raises(LLMCapacityError) as excinfo:
+        executor.run(lambda: 'ok', organization_id=1, deadline=time.monotonic() + 0.05)
+    assert excinfo.value.reason == 'organization_limit'
+    
+    # Other organizations are unaffected
+    assert executor.run(lambda: 'ok', organization_id=2) == 'ok'
+    
+    release.set()
+    worker.join()
+
+def test_executor_times_out_slow_call():
+    """Test callers stop waiting at their deadline"""
+    executor = LLMExecutor(max_concurrency=1, max_per_organization=1, max_queue=1)
+    
+    with pytest.raises(LLMTimeoutError):
+        executor.run(lambda: time.sleep(0.2), deadline=time.monotonic() + 0.05)
+
+def test_executor_admits_calls_after_a_slow_period():
+    """Test a slow call does not lock out later requests while slots are free"""
+    executor = LLMExecutor(max_concurrency=2, max_per_organization=2, max_queue=2)
+    
+    with pytest.raises(LLMTimeoutError):
+        executor.run(lambda: time.sleep(0.3), deadline=time.monotonic() + 0.25)
+    time.sleep(0.1)
+    assert executor.stats()['avg_latency_seconds'] >= 0.3
+    
+    for _ in range(5):
+        assert executor.run(lambda: 'ok', deadline=time.monotonic() + 0.25) == 'ok'
+    assert executor.stats()['rejected'] == {}
+
+def test_executor_rejects_when_queue_wait_exceeds_deadline():
+    """Test a request that would have to queue behind slow calls is rejected up front"""
+    executor = LLMExecutor(max_concurrency=1, max_per_organization=1, max_queue=2)
+    executor.run(lambda: time.sleep(0.2))
+    release = threading.Event()
+    
+    worker = threading.Thread(target=lambda: executor.run(release.wait))
+    worker.start()
+    time.sleep(0.05)
+    
+    with pytest.raises(LLMCapacityError) as excinfo:
+        executor.run(lambda: 'ok', deadline=time.monotonic() + 0.1)
+    assert excinfo.value.reason == 'deadline_unreachable'
+    
+    release.set()
+    worker.join()
+
+def test_executor_frees_slots_when_the_pool_refuses_work():
+    """Test slots taken for a call are returned if the pool cannot accept it"""
+    executor = LLMExecutor(max_concurrency=1, max_per_organization=1, max_queue=1)
+    executor._pool.shutdown()
+    
+    with pytest.raises(RuntimeError):
+        executor.run(lambda: 'ok', organization_id=1)
+    
+    assert executor.stats()['in_flight'] == 0
+    assert executor._global_slots.acquire(blocking=False)
+    assert executor._org_slots[1].acquire(blocking=False)
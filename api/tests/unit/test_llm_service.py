@@ -0,0 +1,39 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from services.llm_service import LLMService, prompt_coalescer
+
+def test_identical_prompts_are_shared_only_within_an_organization(monkeypatch):
+    """Test concurrent identical prompts share a call per organization and each caller gets its usage"""
+    calls = []
+    
+    def generate(self, messages, deadline_at):
+        calls.append(self.organization_id)
+        # Hold the call until the second request from organization 1 is waiting on it
+        give_up_at = time.monotonic() + 2
+        while prompt_coalescer.stats()['waiting'] < 1 and time.monotonic() < give_up_at:
+            time.sleep(0.01)
+        generation = SimpleNamespace(text='Hello!')
+        usage = {'token_usage': {'prompt_tokens': 12, 'completion_tokens': 3}}
+        return self.model_name, SimpleNamespace(generations=[[generation]], llm_output=usage)
+    
+    monkeypatch.setattr(LLMService, '_generate', generate)
+    responses = {}
+    
+    def ask(name, organization_id):
+        service = LLMService(model_name='gpt-3.5-turbo', organization_id=organization_id)
+        prompt = service.create_prompt_template('You are a helpful assistant.', '{message}')
+        responses[name] = service.get_chat_response(prompt, message='Hi')
+    
+    threads = [threading.Thread(target=ask, args=args) for args in (('a', 1), ('b', 1), ('c', 2))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    
+    assert sorted(calls) == [1, 2]
+    assert sorted(responses[name]['coalesced'] for name in ('a', 'b')) == [False, True]
+    assert responses['c']['coalesced'] is False
+    assert all(response['content'] == 'Hello!' for response in responses.values())
+    assert all((response['prompt_tokens'], response['total_tokens']) == (12, 15) for response in responses.values())
@@ -0,0 +1,63 @@
+import pytest
+
+from scripts import load_test_sockets
+from scripts.load_test_sockets import new_results, percentile, step_failed, summarize_step
+
+def test_percentile_picks_from_sorted_values():
+    """Test percentiles index into the sorted values and stay in range"""
+    values = list(range(100, 0, -1))
+    
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.99) == 100
+    assert percentile(values, 1.0) == 100
+    assert percentile([], 0.5) is None
+
+def test_summarize_step_aggregates_results():
+    """Test a step's round trips, probes, failures and memory are rolled up into one row"""
+    results = new_results()
+    results['round_trips'] = [float(ms) for ms in range(1, 101)]
+    results['probes'] = [2.0, 4.0, 30.0]
+    results['timeouts'] = 3
+    results['errors'] = {'Rate limit exceeded': 2}
+    results['connect_failures'] = 1
+    
+    row = summarize_step(results, clients=50, connect_seconds=1.5, rss=204800, baseline_rss=102400)
+    
+    assert row['messages'] == 100
+    assert (row['rtt_p50'], row['rtt_p95'], row['rtt_p99']) == (50.5, 96.0, 100.0)
+    assert (row['lag_p50'], row['lag_p99']) == (4.0, 30.0)
+    assert row['rss_mb'] == 200
+    assert row['kb_per_connection'] == 2048
+    assert (row['timeouts'], row['errors'], row['connect_failures']) == (3, {'Rate limit exceeded': 2}, 1)
+    assert not step_failed(row)
+
+def test_step_without_replies_fails():
+    """Test a step where every message timed out or errored fails the run, with empty statistics"""
+    results = new_results()
+    results['timeouts'] = 40
+    
+    row = summarize_step(results, clients=0, connect_seconds=0.2, rss=204800)
+    
+    assert step_failed(row)
+    assert row['rtt_p50'] is None and row['lag_p99'] is None
+    assert row['kb_per_connection'] is None
+
+def test_warm_up_without_a_reply_raises(monkeypatch):
+    """Test the run stops before the first step when the warm-up message gets no reply"""
+    class Client:
+        def __init__(self, url, chatbot_id, results, reply_timeout):
+            self.results = results
+        
+        def start(self):
+            pass
+        
+        def send(self, content):
+            self.results['errors']['LLM unavailable'] = 1
+        
+        def stop(self):
+            pass
+    
+    monkeypatch.setattr(load_test_sockets, 'SimulatedClient', Client)
+    
+    with pytest.raises(RuntimeError, match='LLM unavailable'):
+        load_test_sockets.warm_up('http://localhost:5099', 1, timeout=5)
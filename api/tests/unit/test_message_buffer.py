@@ -0,0 +1,116 @@
+import sqlite3
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from models import db, ConversationMetrics, Message
+from services.message_buffer import MessageBuffer, MESSAGE_FIELDS
+
+def test_enqueue_fills_missing_fields():
+    """Test queued rows carry every optional column so batches share one insert"""
+    buffer = MessageBuffer()
+    
+    row = buffer.enqueue(1, 'human', 'Hello', token_count=2)
+    
+    assert row['conversation_id'] == 1
+    assert row['token_count'] == 2
+    assert all(field in row for field in MESSAGE_FIELDS)
+    assert row['timestamp'] is not None
+
+def test_enqueue_rejects_when_full():
+    """Test a full buffer tells the caller to write synchronously"""
+    buffer = MessageBuffer(max_size=1)
+    
+    assert buffer.enqueue(1, 'human', 'first') is not None
+    assert buffer.enqueue(1, 'human', 'second') is None
+    assert buffer.stats()['rejected_full'] == 1
+    assert buffer.stats()['pending'] == 1
+
+def test_pending_for_returns_conversation_messages_in_order():
+    """Test read-your-writes only sees the requested conversation"""
+    buffer = MessageBuffer()
+    buffer.enqueue(1, 'human', 'Hi')
+    buffer.enqueue(2, 'human', 'Other')
+    buffer.enqueue(1, 'bot', 'Hello!')
+    
+    pending = buffer.pending_for(1)
+    
+    assert [row['content'] for row in pending] == ['Hi', 'Hello!']
+
+def test_add_metrics_accumulates_deltas():
+    """Test metric increments for a conversation are summed until flushed"""
+    buffer = MessageBuffer()
+    buffer.add_metrics(1, message_count=2, prompt_tokens=10)
+    buffer.add_metrics(1, message_count=2, prompt_tokens=5, completion_tokens=None)
+    
+    assert buffer._metrics[1]['message_count'] == 4
+    assert buffer._metrics[1]['prompt_tokens'] == 15
+    assert buffer._metrics[1]['completion_tokens'] == 0
+    assert buffer.stats()['pending_metric_rows'] == 1
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "buffer.db"}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        for conversation_id in (1, 2):
+            db.session.add(ConversationMetrics(conversation_id=conversation_id, organization_id=1, chatbot_id=1,
+                                               message_count=0))
+        db.session.commit()
+        yield app
+
+def test_failed_batch_only_loses_the_bad_row(app):
+    """Test a row that cannot be inserted does not take other conversations' messages or metrics with it"""
+    buffer = MessageBuffer(max_retries=1)
+    buffer.enqueue(1, 'human', 'Hi', metrics={'message_count': 1})
+    buffer.enqueue(2, 'human', None, metrics={'message_count': 1})
+    buffer.enqueue(1, 'bot', 'Hello!', metrics={'message_count': 1})
+    
+    assert buffer.flush() == 2
+    assert [message.content for message in Message.query.order_by(Message.id)] == ['Hi', 'Hello!']
+    assert buffer.stats()['pending'] == 1
+    
+    # Out of retries: the bad row is dropped and its conversation's metrics never applied
+    assert buffer.flush() == 0
+    assert buffer.stats()['pending'] == 0
+    assert buffer.stats()['dropped'] == 1
+    counts = {m.conversation_id: m.message_count for m in ConversationMetrics.query}
+    assert counts == {1: 2, 2: 0}
+
+def test_unreachable_database_keeps_every_row(app):
+    """Test flushes that cannot reach the database never count attempts or drop messages"""
+    buffer = MessageBuffer(max_retries=1, flush_interval=0.5, max_backoff=2)
+    buffer.enqueue(1, 'human', 'Hi', metrics={'message_count': 1})
+    buffer.enqueue(2, 'bot', 'Hello!', metrics={'message_count': 1})
+    buffer.add_metrics(1, prompt_tokens=5)
+    
+    def refuse(*args, **kwargs):
+        raise sqlite3.OperationalError('unable to open database file')
+    
+    db.engine.dispose()
+    event.listen(db.engine, 'do_connect', refuse)
+    try:
+        for _ in range(buffer.max_retries + 3):
+            with pytest.raises(OperationalError):
+                buffer.flush()
+            db.session.remove()
+    finally:
+        event.remove(db.engine, 'do_connect', refuse)
+    
+    stats = buffer.stats()
+    assert stats['pending'] == 2
+    assert stats['dropped'] == 0
+    assert stats['row_errors'] == 0
+    assert stats['unavailable'] == 4
+    assert stats['retry_delay'] == 2
+    
+    # Connection is back: everything is written once, with its metrics
+    assert buffer.flush() == 2
+    assert buffer.retry_delay() == 0.5
+    assert Message.query.count() == 2
+    metrics = {m.conversation_id: (m.message_count, m.prompt_tokens) for m in ConversationMetrics.query}
+    assert metrics == {1: (1, 5), 2: (1, 0)}
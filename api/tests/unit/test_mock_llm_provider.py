@@ -0,0 +1,89 @@
+import random
+import statistics
+import time
+
+import pytest
+from langchain.schema import HumanMessage, SystemMessage
+
+from services.mock_llm_provider import LatencyDistribution, MockChatModel, MockLLMError
+
+MESSAGES = [SystemMessage(content='You are a helpful assistant.'), HumanMessage(content='Where is my order?')]
+
+def samples(spec, count=2000):
+    distribution = LatencyDistribution(spec, random.Random(1))
+    return [distribution.sample() for _ in range(count)]
+
+def test_fixed_and_uniform_latency():
+    """Test fixed latency is constant and uniform latency stays within its bounds"""
+    assert set(samples('fixed:0.25', 10)) == {0.25}
+    assert set(samples('fixed', 10)) == {0}
+    
+    values = samples('uniform:0.2,0.4')
+    assert min(values) >= 0.2
+    assert max(values) <= 0.4
+
+def test_latency_distributions_match_their_parameters():
+    """Test normal, lognormal and exponential samples centre on their parameters and are never negative"""
+    assert statistics.mean(samples('normal:0.8,0.05')) == pytest.approx(0.8, abs=0.01)
+    assert statistics.median(samples('lognormal:-0.5,0.6')) == pytest.approx(0.607, rel=0.1)
+    assert statistics.mean(samples('exponential:0.7')) == pytest.approx(0.7, rel=0.1)
+    
+    assert min(samples('normal:0,1')) == 0.0
+    assert set(samples('exponential:0', 10)) == {0}
+
+def test_unknown_latency_distribution_is_rejected():
+    """Test a misspelt distribution fails at configuration time"""
+    with pytest.raises(ValueError):
+        LatencyDistribution('gaussian:1,2')
+
+def test_generate_renders_template_and_reports_usage():
+    """Test responses are filled from the last human message and carry token usage"""
+    model = MockChatModel(model_name='mock-small', response_template='[{model} #{n}] {message}',
+                          error_rate=0, timeout_rate=0, seed=1)
+    
+    result = model.generate([MESSAGES, MESSAGES])
+    
+    contents = [generation[0].message.content for generation in result.generations]
+    assert contents == ['[mock-small #1] Where is my order?', '[mock-small #2] Where is my order?']
+    usage = result.llm_output['token_usage']
+    assert usage['prompt_tokens'] > 0
+    assert usage['completion_tokens'] > 0
+    assert usage['total_tokens'] == usage['prompt_tokens'] + usage['completion_tokens']
+    assert model(MESSAGES).content == '[mock-small #3] Where is my order?'
+
+def test_stream_yields_the_response_token_by_token():
+    """Test streamed chunks reassemble into the templated response"""
+    model = MockChatModel(response_template='You said: {message}', error_rate=0, timeout_rate=0)
+    
+    chunks = list(model.stream(MESSAGES))
+    
+    assert chunks == ['You', ' said:', ' Where', ' is', ' my', ' order?']
+
+def test_generate_waits_as_long_as_streaming_would():
+    """Test a complete response takes the first-token latency plus every token's latency"""
+    model = MockChatModel(response_template='one two three four', latency='fixed:0.02', token_latency='fixed:0.01',
+                          error_rate=0, timeout_rate=0)
+    
+    started = time.monotonic()
+    model.generate([MESSAGES])
+    
+    assert time.monotonic() - started >= 0.06
+
+def test_injected_errors_and_timeouts():
+    """Test errors and timeouts are raised at their configured rates"""
+    failing = MockChatModel(error_rate=1, timeout_rate=0)
+    with pytest.raises(MockLLMError):
+        failing.generate([MESSAGES])
+    
+    hanging = MockChatModel(error_rate=0, timeout_rate=1, timeout_seconds=0)
+    with pytest.raises(TimeoutError):
+        hanging.generate([MESSAGES])
+    
+    flaky = MockChatModel(error_rate=0.3, timeout_rate=0, seed=3)
+    failures = 0
+    for _ in range(500):
+        try:
+            flaky.generate([MESSAGES])
+        except MockLLMError:
+            failures += 1
+    assert failures / 500 == pytest.approx(0.3, abs=0.06)
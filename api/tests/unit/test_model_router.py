@@ -0,0 +1,57 @@
+from flask import Flask
+
+from services.model_router import ModelRouter
+
+TIER_MODELS = {'premium': {'model': 'gpt-4', 'cheap_model': 'gpt-3.5-turbo'}}
+
+def test_simple_message_uses_cheap_model():
+    """Test short simple questions are routed to the cheap model"""
+    router = ModelRouter(subscription_tier='premium', tier_models=TIER_MODELS)
+    
+    decision = router.route('What are your opening hours?')
+    assert decision.model == router.cheap_model
+    assert decision.route == 'simple'
+
+def test_complex_message_uses_primary_model():
+    """Test questions needing reasoning are routed to the primary model"""
+    router = ModelRouter(subscription_tier='premium', tier_models=TIER_MODELS)
+    
+    decision = router.route('Can you explain the difference between your two plans? Which should I pick?')
+    assert decision.model == router.model
+    assert decision.route == 'complex'
+
+def test_organization_can_pin_model():
+    """Test an organization model setting without a cheap model disables routing"""
+    router = ModelRouter(subscription_tier='premium', llm_settings={'model': 'gpt-4'}, tier_models=TIER_MODELS)
+    
+    decision = router.route('Hi')
+    assert decision.model == 'gpt-4'
+    assert decision.route == 'pinned'
+
+def test_tiers_use_deployment_models_unless_configured():
+    """Test standard tiers follow LLM_MODEL and LLM_CHEAP_MODEL; per-tier models are opt-in"""
+    app = Flask(__name__)
+    app.config.update(LLM_MODEL='gpt-4o', LLM_CHEAP_MODEL='gpt-4o-mini')
+    
+    with app.app_context():
+        for tier in ('free', 'premium', 'enterprise', None):
+            router = ModelRouter(subscription_tier=tier)
+            assert (router.model, router.cheap_model) == ('gpt-4o', 'gpt-4o-mini')
+        
+        router = ModelRouter(subscription_tier='enterprise', tier_models={'enterprise': {'model': 'gpt-4'}})
+        assert (router.model, router.cheap_model) == ('gpt-4', 'gpt-4o-mini')
+        
+        app.config['LLM_TIER_MODELS'] = '{"premium": {"model": "gpt-4"}}'
+        router = ModelRouter(subscription_tier='premium')
+        assert (router.model, router.cheap_model) == ('gpt-4', 'gpt-4o-mini')
+
+def test_cheap_model_defaults_to_the_main_model():
+    """Test routing is off when no cheap model is configured"""
+    app = Flask(__name__)
+    app.config['LLM_MODEL'] = 'gpt-4o'
+    
+    with app.app_context():
+        router = ModelRouter(subscription_tier='free')
+    
+    assert router.cheap_model == 'gpt-4o'
+    assert router.route('Hi').route == 'default'
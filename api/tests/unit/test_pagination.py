@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pytest
+
+from utils.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    """Test a keyset cursor decodes back to the same (timestamp, id)"""
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    
+    cursor = encode_cursor(timestamp, 42)
+    
+    assert decode_cursor(cursor) == (timestamp, 42)
+    assert '=' not in cursor
+
+def test_malformed_cursor_raises_value_error():
+    """Test tampered cursors are rejected with ValueError"""
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(None, 1)[:-3])
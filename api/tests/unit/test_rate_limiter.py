@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services import rate_limiter as rate_limiter_module
+from services.rate_limiter import RateLimitExceeded, RateLimiter
+from utils.redis_store import LocalStore
+
+@pytest.fixture
+def store(monkeypatch):
+    store = LocalStore()
+    monkeypatch.setattr(rate_limiter_module, 'get_redis', lambda: store)
+    return store
+
+def test_burst_then_reject(store):
+    """Test a key gets its burst of requests and is then rejected with a retry time"""
+    limiter = RateLimiter(tiers={})
+    
+    for _ in range(10):
+        limiter.hit('message', {'sid': 'abc'})
+    
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.hit('message', {'sid': 'abc'})
+    
+    assert error.value.scope == 'sid'
+    assert 0 < error.value.retry_after <= 2
+    assert limiter.stats()['rejected'] == {'sid': 1}
+
+def test_rejected_key_is_turned_away_without_the_store(store, monkeypatch):
+    """Test repeated requests from an empty bucket are rejected in-process"""
+    limiter = RateLimiter(tiers={})
+    for _ in range(10):
+        limiter.hit('message', {'sid': 'abc'})
+    with pytest.raises(RateLimitExceeded):
+        limiter.hit('message', {'sid': 'abc'})
+    
+    monkeypatch.setattr(rate_limiter_module, 'get_redis', lambda: pytest.fail('store was used'))
+    with pytest.raises(RateLimitExceeded):
+        limiter.hit('message', {'sid': 'abc'})
+    
+    assert limiter.stats()['fast_rejected'] == 1
+
+def test_rejection_takes_no_tokens_from_other_buckets(store):
+    """Test a request blocked on one key doesn't use up its other keys"""
+    limiter = RateLimiter(tiers={})
+    for _ in range(5):
+        limiter.hit('conversation', {'visitor': 'v1', 'ip': '10.0.0.1'})
+    
+    with pytest.raises(RateLimitExceeded) as error:
+        limiter.hit('conversation', {'visitor': 'v1', 'ip': '10.0.0.1'})
+    
+    assert error.value.scope == 'visitor'
+    # The IP bucket still has its remaining burst for other visitors
+    for _ in range(5):
+        limiter.hit('conversation', {'visitor': 'v2', 'ip': '10.0.0.1'})
+
+def test_limits_for_applies_tier_then_chatbot_overrides():
+    """Test chatbot config overrides tier limits, which override the defaults"""
+    limiter = RateLimiter(tiers={'premium': {'message': {'chatbot': (6000, 1000), 'ip': (300, 50)}}})
+    chatbot = SimpleNamespace(
+        subscription_tier='premium',
+        config={'rateLimits': {'message': {'visitor': {'perMinute': 5, 'burst': 2}, 'ip': {'perMinute': 600}}}}
+    )
+    
+    limits = limiter.limits_for('message', chatbot)
+    
+    assert limits['chatbot'] == (6000, 1000)
+    assert limits['visitor'] == (5, 2)
+    assert limits['ip'] == (600, 600)
+    assert limits['sid'] == limiter.limits_for('message')['sid']
+
+def test_disabled_limiter_allows_everything(store):
+    """Test RATE_LIMITS_ENABLED=false turns the checks off"""
+    limiter = RateLimiter(enabled=False)
+    
+    for _ in range(100):
+        limiter.hit('message', {'sid': 'abc'})
@@ -0,0 +1,41 @@
+import time
+
+from utils.redis_store import LocalStore
+
+def test_local_store_set_nx_and_expiry():
+    """Test the local store honours NX and key expiry"""
+    store = LocalStore()
+    
+    assert store.set('key', 'first', nx=True)
+    assert store.set('key', 'second', nx=True) is None
+    assert store.get('key') == 'first'
+    
+    store.set('short', 'value', px=10)
+    time.sleep(0.02)
+    assert store.get('short') is None
+
+def test_local_store_pubsub():
+    """Test messages published on a channel reach subscribers"""
+    store = LocalStore()
+    pubsub = store.pubsub()
+    pubsub.subscribe('events')
+    
+    assert store.publish('events', 'hello') == 1
+    assert store.publish('other', 'ignored') == 0
+    
+    message = pubsub.get_message(timeout=1)
+    assert message['channel'] == 'events'
+    assert message['data'] == 'hello'
+
+def test_local_store_lists():
+    """Test list pushes, ranges and trims follow redis index semantics"""
+    store = LocalStore()
+    
+    assert store.rpush('window', 'a', 'b', 'c') == 3
+    assert store.rpush('window', 'd') == 4
+    assert store.lrange('window', 0, -1) == ['a', 'b', 'c', 'd']
+    assert store.lrange('window', -2, -1) == ['c', 'd']
+    
+    store.ltrim('window', -3, -1)
+    assert store.lrange('window', 0, -1) == ['b', 'c', 'd']
+    assert store.lrange('missing', 0, -1) == []
@@ -0,0 +1,36 @@
+import threading
+import time
+
+from services.single_flight import SingleFlight
+
+def test_concurrent_calls_are_coalesced():
+    """Test identical in-flight calls share a single execution"""
+    flight = SingleFlight()
+    calls = []
+    results = []
+    
+    def slow_call():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'answer'
+    
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do('same-prompt', slow_call)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert all(result == 'answer' for result, _ in results)
+    assert sum(1 for _, shared in results if shared) == 4
+    assert flight.stats() == {'in_flight': 0, 'waiting': 0, 'executed': 1, 'coalesced': 4}
+
+def test_sequential_calls_are_not_coalesced():
+    """Test calls that don't overlap each run"""
+    flight = SingleFlight()
+    
+    assert flight.do('key', lambda: 1) == (1, False)
+    assert flight.do('key', lambda: 2) == (2, False)
@@ -0,0 +1,79 @@
+import json
+import time
+
+import pytest
+
+from services.socket_events import EventBatcher, encode_batch, legacy_event, message_frame, negotiate, typing_frame
+
+def test_negotiate_falls_back_to_original_protocol_and_json():
+    """Test clients without protocol 2 keep the original events and unknown encodings get JSON"""
+    assert negotiate(None) is None
+    assert negotiate({'protocol': 1}) is None
+    assert negotiate({'protocol': 2, 'encoding': 'cbor'}) == 'json'
+
+def test_message_frame_is_smaller_than_original_events():
+    """Test one compact frame replaces typing-stopped plus the message and drops empty fields"""
+    frame = message_frame(42, 'Hello!', timestamp=1700000000000)
+    original = [
+        {'status': 'stopped'},
+        {
+            'id': 42,
+            'content': 'Hello!',
+            'sender': 'bot',
+            'timestamp': json.dumps({"$date": {"$numberLong": "1700000000000"}}),
+            'idempotency_key': None,
+            'replayed': False
+        }
+    ]
+    
+    assert frame == {'e': 'm', 'id': 42, 'c': 'Hello!', 'ts': 1700000000000}
+    assert len(json.dumps([frame])) < len(json.dumps(original)) / 2
+
+def test_encode_batch_msgpack_round_trip():
+    """Test MessagePack batches decode back to the same frames"""
+    msgpack = pytest.importorskip('msgpack')
+    frames = [typing_frame('started'), message_frame(1, 'Hi', timestamp=1)]
+    
+    payload = encode_batch(frames, 'msgpack')
+    
+    assert isinstance(payload, bytes)
+    assert msgpack.unpackb(payload) == frames
+
+def test_batcher_coalesces_frames_within_window():
+    """Test frames for a room added within the window go out in one emit"""
+    emitted = []
+    batcher = EventBatcher(lambda room, payload: emitted.append((room, payload)), window=0.05)
+    
+    batcher.add('conversation_1:json', typing_frame('started'))
+    batcher.add('conversation_1:json', message_frame(1, 'Hi', timestamp=1))
+    batcher.add('conversation_2:json', typing_frame('started'))
+    time.sleep(0.15)
+    
+    assert sorted(room for room, _ in emitted) == ['conversation_1:json', 'conversation_2:json']
+    assert [len(payload) for room, payload in emitted if room == 'conversation_1:json'] == [2]
+    assert batcher.stats()['batches'] == 2
+
+def test_batcher_flushes_full_rooms_immediately():
+    """Test a room reaching max_frames is sent without waiting for the window"""
+    emitted = []
+    batcher = EventBatcher(lambda room, payload: emitted.append(payload), window=10, max_frames=2)
+    
+    batcher.add('room', typing_frame('started'))
+    batcher.add('room', typing_frame('stopped'))
+    
+    assert emitted == [[{'e': 't', 's': 1}, {'e': 't', 's': 0}]]
+
+def test_legacy_event_keeps_original_payload_with_seq():
+    """Test frames convert back to the original events, carrying the sequence number"""
+    event, payload = legacy_event(dict(message_frame(7, 'Hi', idempotency_key='key', timestamp=5), q=3))
+    
+    assert event == 'message'
+    assert payload == {
+        'id': 7,
+        'content': 'Hi',
+        'sender': 'bot',
+        'timestamp': json.dumps({"$date": {"$numberLong": "5"}}),
+        'idempotency_key': 'key',
+        'replayed': False,
+        'seq': 3
+    }
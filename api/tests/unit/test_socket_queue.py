@@ -0,0 +1,69 @@
+import json
+import threading
+import time
+
+from services import socket_queue
+from services.socket_queue import StoreManager
+from utils.redis_store import LocalStore
+
+def test_publish_sends_json_on_channel(monkeypatch):
+    """Test emits are published as JSON on the manager's channel"""
+    store = LocalStore()
+    monkeypatch.setattr(socket_queue, 'get_redis', lambda: store)
+    pubsub = store.pubsub()
+    pubsub.subscribe('test_socketio')
+    
+    StoreManager(channel='test_socketio')._publish({'method': 'emit', 'event': 'typing', 'room': 'conversation_1'})
+    
+    message = pubsub.get_message(timeout=1)
+    assert json.loads(message['data'])['event'] == 'typing'
+
+def test_listen_yields_published_payloads(monkeypatch):
+    """Test a node's listener receives emits published by another node, binary payloads included"""
+    store = LocalStore()
+    monkeypatch.setattr(socket_queue, 'get_redis', lambda: store)
+    received = []
+    listener = StoreManager(channel='test_socketio')._listen()
+    thread = threading.Thread(target=lambda: received.append(next(listener)), daemon=True)
+    thread.start()
+    
+    # Wait for the listener to subscribe
+    for _ in range(100):
+        if store._subscribers:
+            break
+        time.sleep(0.01)
+    StoreManager(channel='test_socketio')._publish({'method': 'emit', 'event': 'batch', 'data': b'\x91\x80'})
+    thread.join(timeout=1)
+    
+    assert received[0]['event'] == 'batch'
+    assert received[0]['data'] == b'\x91\x80'
+
+def test_fanout_runs_on_every_node_with_one_publish(monkeypatch):
+    """Test a fanout runs its handler locally and on other nodes from a single published message"""
+    store = LocalStore()
+    monkeypatch.setattr(socket_queue, 'get_redis', lambda: store)
+    local, remote = StoreManager(channel='test_socketio'), StoreManager(channel='test_socketio')
+    delivered = []
+    local.on_fanout('conversation_event', lambda payload: delivered.append(('local', payload)))
+    remote.on_fanout('conversation_event', lambda payload: delivered.append(('remote', payload)))
+    
+    yielded = []
+    listener = remote._listen()
+    threading.Thread(target=lambda: yielded.extend(listener), daemon=True).start()
+    for _ in range(100):
+        if store._subscribers:
+            break
+        time.sleep(0.01)
+    
+    pubsub = store.pubsub()
+    pubsub.subscribe('test_socketio')
+    local.fanout('conversation_event', {'conversation_id': 1})
+    
+    for _ in range(100):
+        if len(delivered) == 2:
+            break
+        time.sleep(0.01)
+    assert delivered == [('local', {'conversation_id': 1}), ('remote', {'conversation_id': 1})]
+    assert pubsub.get_message(timeout=1) is not None
+    assert pubsub.get_message() is None
+    assert yielded == []
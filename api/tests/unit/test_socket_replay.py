@@ -0,0 +1,45 @@
+import pytest
+
+from services import socket_replay
+from services.socket_events import message_frame
+from services.socket_replay import ReplayBuffer
+from utils.redis_store import LocalStore
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = LocalStore()
+    monkeypatch.setattr(socket_replay, 'get_redis', lambda: store)
+    return store
+
+def test_record_numbers_frames_per_conversation():
+    """Test each conversation gets its own increasing sequence"""
+    buffer = ReplayBuffer()
+    
+    first = buffer.record(1, message_frame(10, 'a', timestamp=1))
+    second = buffer.record(1, message_frame(11, 'b', timestamp=2))
+    other = buffer.record(2, message_frame(12, 'c', timestamp=3))
+    
+    assert (first['q'], second['q'], other['q']) == (1, 2, 1)
+    assert buffer.current(1) == 2
+
+def test_since_replays_only_the_gap():
+    """Test a client that saw seq 2 gets seq 3 onwards"""
+    buffer = ReplayBuffer()
+    for number in range(5):
+        buffer.record(1, message_frame(number, f'message {number}', timestamp=number))
+    
+    missed, seq = buffer.since(1, 2)
+    
+    assert [frame['q'] for frame in missed] == [3, 4, 5]
+    assert seq == 5
+    assert buffer.since(1, 5) == ([], 5)
+
+def test_since_asks_for_resync_when_gap_left_the_buffer():
+    """Test a gap older than the buffer, or a client ahead of the server, needs a transcript reload"""
+    buffer = ReplayBuffer(size=3)
+    for number in range(6):
+        buffer.record(1, message_frame(number, 'x', timestamp=number))
+    
+    assert buffer.since(1, 1) == (None, 6)
+    assert [frame['q'] for frame in buffer.since(1, 3)[0]] == [4, 5, 6]
+    assert buffer.since(1, 9) == (None, 6)
@@ -0,0 +1,59 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from services.socket_events import system_frame
+from services.socket_replay import replay_buffer
+from services.socket_service import send_system_message, send_typing, socketio
+
+@pytest.fixture
+def server(monkeypatch):
+    """A compact client in conversation 1 and an original-protocol client in conversation 2, with emits recorded"""
+    app = Flask(__name__)
+    socketio.init_app(app, async_mode='threading')
+    emits = []
+    manager_emit = socketio.server.manager.emit
+    
+    def record(event, data, namespace=None, room=None, **kwargs):
+        emits.append((event, room))
+        return manager_emit(event, data, namespace=namespace, room=room, **kwargs)
+    monkeypatch.setattr(socketio.server.manager, 'emit', record)
+    
+    compact = socketio.test_client(app, auth={'protocol': 2, 'encoding': 'json'})
+    legacy = socketio.test_client(app)
+    compact.emit('join', {'conversation_id': 1})
+    legacy.emit('join', {'conversation_id': 2})
+    emits.clear()
+    yield SimpleNamespace(emits=emits, legacy=legacy)
+    compact.disconnect()
+    legacy.disconnect()
+
+def test_room_events_skip_rooms_without_members(server):
+    """Test each conversation event is only emitted to the rooms its clients are in"""
+    send_typing(1, 'started')
+    send_typing(2, 'started')
+    send_typing(3, 'started')
+    time.sleep(0.1)
+    
+    assert sorted(server.emits) == [('batch', 'conversation_1:json'), ('typing', 'conversation_2')]
+
+def test_compact_frames_share_one_batch(server, monkeypatch):
+    """Test typing and a system message within one window reach compact clients in one emit"""
+    monkeypatch.setattr(replay_buffer, 'record', lambda conversation_id, frame: frame)
+    send_typing(1, 'started')
+    send_system_message(1, 'Conversation ended')
+    time.sleep(0.1)
+    
+    assert server.emits == [('batch', 'conversation_1:json')]
+
+def test_rejoin_replays_missed_frames_before_joined(server):
+    """Test a rejoining client gets the frames it missed before 'joined' reports the current seq"""
+    conversation_id = f'replay-{time.monotonic_ns()}'
+    replay_buffer.record(conversation_id, system_frame('first'))
+    replay_buffer.record(conversation_id, system_frame('second'))
+    
+    server.legacy.emit('join', {'conversation_id': conversation_id, 'last_seq': 0})
+    
+    assert [event for event, room in server.emits] == ['system', 'system', 'joined']
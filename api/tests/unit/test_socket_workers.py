@@ -0,0 +1,61 @@
+import threading
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+
+from services.socket_workers import LoopLagMonitor, SocketWorkerPool
+
+app = SimpleNamespace(app_context=nullcontext)
+
+def test_submit_runs_job_and_returns_result():
+    """Test submitted work runs on the pool and its result is available from the future"""
+    pool = SocketWorkerPool(max_workers=2, max_queue=2)
+    
+    future = pool.submit(app, lambda a, b: a + b, 2, 3)
+    
+    assert future.result(timeout=1) == 5
+    assert pool.stats()['completed'] == 1
+
+def test_submit_rejects_when_saturated():
+    """Test the pool refuses work once every worker and queue slot is taken"""
+    pool = SocketWorkerPool(max_workers=1, max_queue=1)
+    release = threading.Event()
+    
+    first = pool.submit(app, release.wait, 1)
+    second = pool.submit(app, release.wait, 1)
+    
+    assert pool.submit(app, release.wait, 1) is None
+    assert pool.stats()['rejected'] == 1
+    
+    release.set()
+    first.result(timeout=1)
+    second.result(timeout=1)
+    assert pool.stats()['running'] == 0
+    assert pool.stats()['queued'] == 0
+
+def test_failed_job_frees_its_slot():
+    """Test a job that raises is counted and does not leak capacity"""
+    pool = SocketWorkerPool(max_workers=1, max_queue=0)
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    with pytest.raises(RuntimeError):
+        pool.submit(app, fail).result(timeout=1)
+    
+    assert pool.stats()['failed'] == 1
+    assert pool.submit(app, lambda: 'ok').result(timeout=1) == 'ok'
+
+def test_loop_lag_monitor_reports_percentiles():
+    """Test lag samples are reported in milliseconds and negative lag counts as zero"""
+    monitor = LoopLagMonitor(window=10)
+    assert monitor.stats() == {'samples': 0}
+    
+    for lag in (0.001, 0.002, -0.001, 0.250):
+        monitor.record(lag)
+    
+    stats = monitor.stats()
+    assert stats['samples'] == 4
+    assert stats['max_ms'] == 250
+    assert stats['p50_ms'] == 2
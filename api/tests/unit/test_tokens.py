@@ -0,0 +1,48 @@
+import pytest
+
+from utils import tokens
+from utils.tokens import count_text_tokens, count_message_tokens, tokenizer_name
+
+class UnreachableTiktoken:
+    """tiktoken without network access: loading an encoding tries to download it"""
+    def __init__(self):
+        self.loads = 0
+    
+    def encoding_for_model(self, model_name):
+        self.loads += 1
+        raise ConnectionError('cannot download cl100k_base')
+    
+    def get_encoding(self, name):
+        self.loads += 1
+        raise ConnectionError('cannot download cl100k_base')
+
+@pytest.fixture(autouse=True)
+def offline_tiktoken(monkeypatch):
+    fake = UnreachableTiktoken()
+    monkeypatch.setattr(tokens, 'tiktoken', fake)
+    monkeypatch.setattr(tokens, '_encodings', {})
+    return fake
+
+def test_count_text_tokens():
+    """Test token counting for plain text"""
+    assert count_text_tokens('') == 0
+    assert count_text_tokens(None) == 0
+    assert count_text_tokens('Hello there, how can I help you today?') > 0
+
+def test_count_message_tokens_includes_overhead():
+    """Test prompt token counting adds per-message overhead"""
+    messages = [
+        {'role': 'system', 'content': 'You are a helpful assistant.'},
+        {'role': 'user', 'content': 'Hello'}
+    ]
+    
+    content_tokens = sum(count_text_tokens(m['content']) for m in messages)
+    assert count_message_tokens(messages) > content_tokens
+
+def test_unloadable_encoding_falls_back_to_estimate(offline_tiktoken):
+    """Test a tiktoken download failure falls back to the character estimate and is not retried"""
+    assert count_text_tokens('12345678') == 2
+    assert count_text_tokens('123456789') == 3
+    assert tokenizer_name() == 'estimate'
+    
+    assert offline_tiktoken.loads == 1
@@ -90,9 +90,36 @@ export class ChatWidget {
     
     // Add welcome message
     this.addMessage({
-      content: "Hi there! 👋 How can I help you today?",
+      content: this.config.greeting || "Hi there! 👋 How can I help you today?",
       sender: "bot"
     });
+    
+    // Suggested replies; their answers are precomputed on the server
+    this.renderQuickReplies([
+      ...(this.config.openingMessages || []),
+      ...(this.config.quickReplies || [])
+    ]);
+  }
+  
+  renderQuickReplies(replies) {
+    const existing = document.getElementById('clai-chat-quick-replies');
+    if (existing) existing.remove();
+    if (!replies.length) return;
+    
+    const container = createDOM('div', {
+      className: 'clai-chat-quick-replies',
+      id: 'clai-chat-quick-replies'
+    });
+    
+    replies.forEach(reply => {
+      container.appendChild(createDOM('button', {
+        className: 'clai-chat-quick-reply',
+        innerText: reply.label,
+        onClick: () => this.sendMessage(reply.message)
+      }));
+    });
+    
+    this.elements.messageList.appendChild(container);
   }
   
   toggleChat() {
@@ -113,12 +140,19 @@ export class ChatWidget {
   sendMessage(message) {
     if (!message.trim()) return;
     
+    const firstTurn = !this.state.messages.some(m => m.sender === 'human');
+    
     // Add message to UI
     this.addMessage({
       content: message,
       sender: 'human'
     });
     
+    // Opening messages only apply to the first turn
+    if (firstTurn) {
+      this.renderQuickReplies(this.config.quickReplies || []);
+    }
+    
     // Start conversation if needed
     if (!this.state.conversationId) {
       this.startConversation(message);
@@ -164,6 +198,12 @@ export class ChatWidget {
   setupSocketListeners() {
     this.socketService.onTyping(this.handleTypingStatus);
     this.socketService.onMessage(this.handleBotMessage);
+    this.socketService.onResync(() => {
+      this.addMessage({
+        content: 'You were disconnected for a while and some messages may be missing.',
+        sender: 'bot'
+      });
+    });
   }
   
   handleTypingStatus(status) {
@@ -1,3 +1,11 @@
+// Random key so the API can recognise retries of the same message
+export const createIdempotencyKey = () => {
+  if (window.crypto && window.crypto.randomUUID) {
+    return window.crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+};
+
 export class ApiService {
   constructor(apiUrl) {
     this.apiUrl = apiUrl;
@@ -19,14 +27,33 @@ export class ApiService {
     return response.json();
   }
   
-  async sendMessage(conversationId, content) {
-    const response = await fetch(`${this.apiUrl}/api/conversations/${conversationId}/messages`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({ content })
-    });
+  async sendMessage(conversationId, content, { idempotencyKey = createIdempotencyKey(), retries = 2 } = {}) {
+    let response;
+    
+    // Retries reuse the key, so the server answers them without a second LLM call
+    for (let attempt = 0; ; attempt++) {
+      try {
+        response = await fetch(`${this.apiUrl}/api/conversations/${conversationId}/messages`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': idempotencyKey
+          },
+          body: JSON.stringify({ content })
+        });
+      } catch (error) {
+        if (attempt >= retries) throw error;
+        await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+        continue;
+      }
+      
+      // 409: the first attempt is still being answered
+      if (response.status === 409 && attempt < retries) {
+        await new Promise(resolve => setTimeout(resolve, 500 * (attempt + 1)));
+        continue;
+      }
+      break;
+    }
     
     if (!response.ok) {
       throw new Error(`Failed to send message: ${response.status}`);
@@ -1,21 +1,37 @@
 import io from 'socket.io-client';
+import { createIdempotencyKey } from './ApiService';
+
+// Compact protocol: the server batches frames into one 'batch' event per short window.
+// The widget takes JSON batches; MessagePack is there for clients that ship a decoder.
+const PROTOCOL_VERSION = 2;
 
 export class SocketService {
-  constructor(apiUrl) {
+  constructor(apiUrl, encoding = 'json') {
     this.socket = null;
     this.apiUrl = apiUrl;
+    this.encoding = encoding;
     this.connected = false;
+    this.conversationId = null;
+    this.lastSeq = null;
+    this.handlers = { message: [], typing: [], system: [], resync: [] };
     
     this.connect();
   }
   
   connect() {
     try {
-      this.socket = io(this.apiUrl);
+      this.socket = io(this.apiUrl, {
+        auth: { protocol: PROTOCOL_VERSION, encoding: this.encoding }
+      });
       
       this.socket.on('connect', () => {
         this.connected = true;
         console.log('Socket connected');
+        
+        // Rooms don't survive a reconnect; rejoin and let the server replay what we missed
+        if (this.conversationId) {
+          this.emitJoin();
+        }
       });
       
       this.socket.on('disconnect', () => {
@@ -26,40 +42,119 @@ export class SocketService {
       this.socket.on('error', (error) => {
         console.error('Socket error:', error);
       });
+      
+      // Servers without the compact protocol keep sending the original events
+      this.socket.on('message', (data) => this.dispatchSequenced('message', data));
+      this.socket.on('typing', (data) => this.dispatch('typing', data.status));
+      this.socket.on('system', (data) => this.dispatchSequenced('system', data));
+      this.socket.on('batch', (payload) => this.handleBatch(payload));
+      
+      // A first join starts from the current seq; a rejoin keeps ours so the replayed frames aren't skipped
+      this.socket.on('joined', (data) => {
+        if (this.lastSeq === null) {
+          this.lastSeq = data.seq;
+        }
+      });
+      
+      // Too much was missed to replay; carry on from the current seq and let the caller tell the visitor
+      this.socket.on('resync', (data) => {
+        this.lastSeq = data.seq;
+        this.dispatch('resync', data);
+      });
     } catch (error) {
       console.error('Failed to connect socket:', error);
     }
   }
   
   joinConversation(conversationId) {
+    if (this.conversationId !== conversationId) {
+      this.conversationId = conversationId;
+      this.lastSeq = null;
+    }
+    
     if (!this.connected) {
-      console.warn('Socket not connected, attempting to reconnect');
-      this.connect();
+      // The connect handler joins once the socket is up
+      return;
     }
     
-    this.socket.emit('join', { conversation_id: conversationId });
+    this.emitJoin();
+  }
+  
+  emitJoin() {
+    const data = { conversation_id: this.conversationId };
+    if (this.lastSeq !== null) {
+      data.last_seq = this.lastSeq;
+    }
+    this.socket.emit('join', data);
   }
   
-  sendMessage(conversationId, content) {
+  sendMessage(conversationId, content, idempotencyKey = createIdempotencyKey()) {
     if (!this.connected) {
       console.warn('Socket not connected, attempting to reconnect');
       this.connect();
     }
     
+    // Resending with the same key returns the original reply instead of asking the bot again
     this.socket.emit('message', {
       conversation_id: conversationId,
-      content: content
+      content: content,
+      idempotency_key: idempotencyKey
     });
+    
+    return idempotencyKey;
+  }
+  
+  handleBatch(frames) {
+    frames.forEach((frame) => {
+      if (frame.e === 'm') {
+        // A reply also means the bot stopped typing
+        this.dispatch('typing', 'stopped');
+        this.dispatchSequenced('message', {
+          id: frame.id,
+          content: frame.c,
+          sender: 'bot',
+          timestamp: frame.ts,
+          idempotency_key: frame.k || null,
+          replayed: Boolean(frame.r),
+          seq: frame.q
+        });
+      } else if (frame.e === 't') {
+        this.dispatch('typing', frame.s ? 'started' : 'stopped');
+      } else if (frame.e === 's') {
+        this.dispatchSequenced('system', { content: frame.c, timestamp: frame.ts, seq: frame.q });
+      }
+    });
+  }
+  
+  dispatchSequenced(event, data) {
+    // Skip events we already have (a replay can overlap what arrived live)
+    if (data.seq !== undefined && data.seq !== null) {
+      if (this.lastSeq !== null && data.seq <= this.lastSeq) {
+        return;
+      }
+      this.lastSeq = data.seq;
+    }
+    this.dispatch(event, data);
+  }
+  
+  dispatch(event, data) {
+    this.handlers[event].forEach((callback) => callback(data));
   }
   
   onMessage(callback) {
-    this.socket.on('message', callback);
+    this.handlers.message.push(callback);
   }
   
   onTyping(callback) {
-    this.socket.on('typing', (data) => {
-      callback(data.status);
-    });
+    this.handlers.typing.push(callback);
+  }
+  
+  onSystem(callback) {
+    this.handlers.system.push(callback);
+  }
+  
+  onResync(callback) {
+    this.handlers.resync.push(callback);
   }
   
   disconnect() {